@@ -1,3 +1,7 @@
+import sys
+import importlib.util
+
+
 def get_version():
     try:
         # python > 3.7
@@ -50,9 +54,54 @@ def p4p_get_version():
         pass
 
 
+def lazy_import(name):
+    """
+    Returns an optional module without executing it, or None if it is not
+    installed. The module is imported on the first access to one of its
+    attributes, so processes that never use it do not pay for importing it.
+
+    Args:
+        name (str): the name of the module.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class lazy_constant:
+    """
+    A class attribute computed on its first access and then cached on the
+    class, for the settings that need to import an optional package.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+
+    def __get__(self, instance, owner):
+        value = self.func(owner)
+        setattr(owner, self.name, value)
+        return value
+
+
 class p4pConfig:
-    Version = p4p_get_version()
-    SupportsTimestamps = p4p_get_version() >= '4.0.0' if p4p_available() else False
+    @lazy_constant
+    def Version(cls):
+        return p4p_get_version()
+
+    @lazy_constant
+    def SupportsTimestamps(cls):
+        return cls.Version >= '4.0.0' if p4p_available() else False
 
 
 class LogConfig:
@@ -69,7 +118,6 @@ class LogConfig:
 class Defaults:
     Host = 'localhost'
     GraphName = 'graph'
-    SourceType = 'psana' if psana_available() else 'random'
     SourceConfig = {
         "interval": 0.0,
         "init_time": 0.5,
@@ -84,5 +132,14 @@ class Defaults:
         },
     }
 
+    @lazy_constant
+    def SourceType(cls):
+        return 'psana' if psana_available() else 'random'
+
 
-__version__ = get_version()
+def __getattr__(name):
+    # the version is looked up in the package metadata, which is slow to import
+    if name == '__version__':
+        globals()['__version__'] = get_version()
+        return globals()['__version__']
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
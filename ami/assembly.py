@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class ImageAssembler:
+    """
+    Assembles 2d images from arrays of detector panels.
+
+    The destination of every pixel of the panels in the flattened image is
+    computed once from the pixel index arrays of the geometry, so assembling
+    an image is a single scatter of the panel data. The result is the same as
+    psana's `img_from_pixel_arrays(rows, cols, W=data)`: pixels that are not
+    covered by a panel have the background value and, where panels overlap,
+    the last pixel wins.
+
+    Args:
+        rows, cols (np.ndarray): the row and column of each pixel in the
+            image, shaped like the panel data (e.g. the ix and iy outputs of
+            the Geometry node).
+        dtype (np.dtype): the dtype of the image.
+        background (float): the value of the pixels not covered by a panel.
+        reuse (bool): assemble every image into the same buffer instead of a
+            new array, for callers that do not keep the images around.
+    """
+
+    def __init__(self, rows, cols, dtype=np.float32, background=0, reuse=False):
+        rows = np.asarray(rows).ravel()
+        cols = np.asarray(cols).ravel()
+        if rows.size != cols.size:
+            raise ValueError("rows and cols have different sizes: %d != %d" % (rows.size, cols.size))
+
+        self.shape = (int(rows.max()) + 1, int(cols.max()) + 1)
+        self.index = np.ravel_multi_index((rows.astype(np.intp), cols.astype(np.intp)), self.shape)
+        self.dtype = np.dtype(dtype)
+        self.background = background
+        self.reuse = reuse
+        self.buffer = None
+
+    @property
+    def size(self):
+        return self.index.size
+
+    def empty(self):
+        return np.full(self.shape, self.background, dtype=self.dtype)
+
+    def __call__(self, data, out=None):
+        """
+        Assembles an image.
+
+        Args:
+            data (np.ndarray): the panel data, with the same number of pixels
+                as the geometry.
+            out (np.ndarray): optional image to assemble into, which must be
+                contiguous and have the shape of the image.
+
+        Returns:
+            The assembled image.
+        """
+        if data.size != self.size:
+            raise ValueError("data has %d pixels but the geometry has %d" % (data.size, self.size))
+
+        if out is None:
+            if not self.reuse:
+                out = self.empty()
+            elif self.buffer is None:
+                out = self.buffer = self.empty()
+            else:
+                out = self.buffer
+        elif out.shape != self.shape or not out.flags.c_contiguous:
+            raise ValueError("out must be a contiguous array of shape %s" % (self.shape,))
+
+        out.reshape(-1)[self.index] = data.ravel()
+        return out
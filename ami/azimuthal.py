@@ -0,0 +1,155 @@
+import numpy as np
+
+
+def pixel_coords(shape, cx=0.0, cy=0.0, pixel_size=1.0):
+    """
+    Returns the x and y coordinates of the pixels of an image relative to a
+    center, with x along the first axis and y along the second axis.
+
+    Args:
+        shape (tuple): the shape of the image.
+        cx, cy (float): the center in pixels.
+        pixel_size (float): the size of a pixel.
+
+    Returns:
+        The x and y coordinate arrays.
+    """
+    x, y = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), indexing='ij')
+    return (x - cx)*pixel_size, (y - cy)*pixel_size
+
+
+class AzimuthalIntegrator:
+    """
+    Radial and azimuthal integration of detector images.
+
+    The radial and azimuthal bin of every pixel only depends on the geometry,
+    so the pixel-to-bin map is built once by `setup` and each image is then
+    integrated with a single `np.bincount` over the pixels that fall in a bin.
+
+    The radial unit depends on the geometry that is given: q in inverse
+    Angstroms if the detector distance and the wavelength are known, the
+    scattering angle 2theta in degrees if only the distance is known, and the
+    distance from the center in the units of the coordinates otherwise.
+
+    Args:
+        nbins (int): the number of radial bins.
+        nphi (int): the number of azimuthal bins.
+        radial_range (tuple): the range of the radial bins, by default the
+            range of the unmasked pixels.
+        phi_range (tuple): the range of the azimuthal bins in degrees.
+        distance (float): the distance from the sample to the detector, in
+            the units of the coordinates.
+        wavelength (float): the wavelength in Angstroms.
+        solid_angle (bool): correct the intensities for the solid angle of
+            each pixel, which needs the distance.
+    """
+
+    def __init__(self, nbins=100, nphi=1, radial_range=None, phi_range=(-180, 180),
+                 distance=0, wavelength=0, solid_angle=False):
+        self.nbins = nbins
+        self.nphi = nphi
+        self.radial_range = radial_range
+        self.phi_range = phi_range
+        self.distance = distance
+        self.wavelength = wavelength
+        self.solid_angle = solid_angle and distance > 0
+        self.shape = None
+        self.index = None
+        self.bins = None
+        self.counts = None
+        self.norm = None
+        self.radial_edges = None
+        self.phi_edges = None
+
+    @property
+    def radial_unit(self):
+        if self.distance > 0 and self.wavelength > 0:
+            return 'q'
+        elif self.distance > 0:
+            return '2theta'
+        return 'r'
+
+    @property
+    def radial_centers(self):
+        return 0.5*(self.radial_edges[1:] + self.radial_edges[:-1])
+
+    @property
+    def phi_centers(self):
+        return 0.5*(self.phi_edges[1:] + self.phi_edges[:-1])
+
+    def setup(self, x, y, z=None, mask=None):
+        """
+        Builds the pixel-to-bin map.
+
+        Args:
+            x, y (np.ndarray): the coordinates of each pixel relative to the
+                beam, shaped like the data.
+            z (np.ndarray): optional offsets of each pixel along the beam.
+            mask (np.ndarray): optional mask shaped like the data, pixels
+                where it is zero are excluded.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        r = np.hypot(x, y)
+        phi = np.degrees(np.arctan2(y, x))
+
+        if self.distance > 0:
+            dist = self.distance if z is None else self.distance + np.asarray(z, dtype=np.float64)
+            tth = np.arctan2(r, dist)
+            if self.wavelength > 0:
+                radial = 4*np.pi*np.sin(tth/2)/self.wavelength
+            else:
+                radial = np.degrees(tth)
+        else:
+            tth = None
+            radial = r
+
+        valid = np.ones(radial.shape, dtype=bool) if mask is None else (np.asarray(mask) != 0)
+        valid = valid.ravel()
+        radial = radial.ravel()
+        phi = phi.ravel()
+
+        rmin, rmax = self.radial_range if self.radial_range else (radial[valid].min(), radial[valid].max())
+        if rmax <= rmin:
+            rmax = rmin + 1
+        pmin, pmax = self.phi_range
+        self.radial_edges = np.linspace(rmin, rmax, self.nbins + 1)
+        self.phi_edges = np.linspace(pmin, pmax, self.nphi + 1)
+
+        # the upper edges are included in the last bins
+        ir = np.minimum(np.floor((radial - rmin)/(rmax - rmin)*self.nbins).astype(np.intp), self.nbins - 1)
+        ip = np.minimum(np.floor((phi - pmin)/(pmax - pmin)*self.nphi).astype(np.intp), self.nphi - 1)
+        valid &= (radial >= rmin) & (radial <= rmax) & (phi >= pmin) & (phi <= pmax)
+
+        self.index = np.flatnonzero(valid)
+        self.bins = ir[self.index]*self.nphi + ip[self.index]
+        self.counts = np.bincount(self.bins, minlength=self.nbins*self.nphi).reshape(self.nbins, self.nphi)
+        if self.solid_angle:
+            self.norm = 1/np.cos(tth.ravel()[self.index])**3
+        else:
+            self.norm = None
+        self.shape = x.shape
+
+    def integrate(self, data):
+        """
+        Integrates an image.
+
+        Args:
+            data (np.ndarray): the image, shaped like the coordinates.
+
+        Returns:
+            The radial profile and the cake image, the mean intensity in each
+            radial bin and in each (radial, azimuthal) bin.
+        """
+        if data.shape != self.shape:
+            raise ValueError("data shape %s does not match the geometry shape %s" % (data.shape, self.shape))
+
+        values = data.ravel()[self.index]
+        if self.norm is not None:
+            values = values*self.norm
+        sums = np.bincount(self.bins, weights=values, minlength=self.nbins*self.nphi).reshape(self.nbins, self.nphi)
+
+        cake = np.divide(sums, self.counts, out=np.zeros(sums.shape), where=self.counts > 0)
+        counts = self.counts.sum(axis=1)
+        profile = np.divide(sums.sum(axis=1), counts, out=np.zeros(self.nbins), where=counts > 0)
+        return profile, cake
@@ -14,7 +14,8 @@ from ami.client import flowchart, legacy
 logger = logging.getLogger(__name__)
 
 
-GraphMgrAddress = collections.namedtuple('GraphMgrAddress', ['name', 'comm', 'view', 'info', 'export'])
+GraphMgrAddress = collections.namedtuple('GraphMgrAddress', ['name', 'comm', 'view', 'info', 'export', 'view_pub'],
+                                         defaults=[None])
 
 
 def check_dir(pathname):
@@ -28,8 +29,8 @@ def check_dir(pathname):
 def run_client(graph_name, comm_addr, info_addr, view_addr, export_addr, load,
                use_legacy=True, prometheus_dir=None, prometheus_port=None, hutch='',
                use_opengl=False, use_numba=False,
-               configure=False, save_dir=None):
-    graphmgr_addr = GraphMgrAddress(graph_name, comm_addr, view_addr, info_addr, export_addr)
+               configure=False, save_dir=None, view_pub_addr=None):
+    graphmgr_addr = GraphMgrAddress(graph_name, comm_addr, view_addr, info_addr, export_addr, view_pub_addr)
     if use_legacy:
         return legacy.run_client(graphmgr_addr, load, save_dir)
     else:
@@ -150,6 +151,12 @@ def main():
         action='store_true'
     )
 
+    parser.add_argument(
+        '--poll-views',
+        help='request plot data from the manager each heartbeat instead of subscribing to it',
+        action='store_true'
+    )
+
     args = parser.parse_args()
 
     log_handlers = [logging.StreamHandler()]
@@ -167,6 +174,7 @@ def main():
                 comm_addr = "ipc://%s/comm" % ipc_list[0]
                 info_addr = "ipc://%s/info" % ipc_list[0]
                 view_addr = "ipc://%s/view" % ipc_list[0]
+                view_pub_addr = "ipc://%s/view_pub" % ipc_list[0]
                 export_addr = "ipc://%s/export" % ipc_list[0]
             else:
                 prompt = "Found %d ipc file descriptors:\n" % len(ipc_list)
@@ -178,6 +186,7 @@ def main():
                     comm_addr = "ipc://%s/comm" % ipc_list[int(choice)]
                     info_addr = "ipc://%s/info" % ipc_list[int(choice)]
                     view_addr = "ipc://%s/view" % ipc_list[int(choice)]
+                    view_pub_addr = "ipc://%s/view_pub" % ipc_list[int(choice)]
                     export_addr = "ipc://%s/export" % ipc_list[int(choice)]
                 except ValueError:
                     logger.critical("Invalid option '%s' chosen!", choice)
@@ -192,18 +201,20 @@ def main():
         comm_addr = "ipc://%s/comm" % args.ipc_dir
         info_addr = "ipc://%s/info" % args.ipc_dir
         view_addr = "ipc://%s/view" % args.ipc_dir
+        view_pub_addr = "ipc://%s/view_pub" % args.ipc_dir
         export_addr = "ipc://%s/export" % args.ipc_dir
     else:
         comm_addr = "tcp://%s:%d" % (args.host, args.port + Ports.Comm)
         info_addr = "tcp://%s:%d" % (args.host, args.port + Ports.Info)
         view_addr = "tcp://%s:%d" % (args.host, args.port + Ports.View)
+        view_pub_addr = "tcp://%s:%d" % (args.host, args.port + Ports.ViewPub)
         export_addr = "tcp://%s:%d" % (args.host, args.port + Ports.Export)
 
     try:
         return run_client(args.graph_name, comm_addr, info_addr, view_addr, export_addr, args.load,
                           args.gui_mode, args.prometheus_dir, args.prometheus_port, args.hutch,
                           args.use_opengl, args.use_numba,
-                          False, args.save_dir)
+                          False, args.save_dir, None if args.poll_views else view_pub_addr)
     except KeyboardInterrupt:
         logger.info("Client killed by user...")
         return 0
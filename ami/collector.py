@@ -114,6 +114,42 @@ class GraphCollector(Node, Collector):
         self.store.destroy(name)
         self.report("purge", name)
 
+    def complete(self, name, heartbeat, start, prune=True):
+        times, size = (None, None)
+        try:
+            if prune:
+                # prune entries older than the current heartbeat
+                pruned_times, pruned_size = self.store.prune(name, self.node, heartbeat, drop=True)
+
+                if pruned_size:
+                    self.event_counter.labels(self.hutch, 'Pruned Heartbeat', self.name).inc()
+                    self.event_size.labels(self.hutch, self.name).set(pruned_size)
+
+            # complete the current heartbeat
+            times, size = self.store.complete(name, heartbeat, self.node)
+
+            # times = self.store.complete(name, heartbeat, self.node)
+            # self.report_times(times, name, heartbeat)
+
+            self.event_counter.labels(self.hutch, 'Heartbeat', self.name).inc()
+            self.heartbeat_time[heartbeat.identity] += time.time() - start
+            heartbeat_time = self.heartbeat_time.pop(heartbeat.identity, 0)
+            self.event_time.labels(self.hutch, 'Heartbeat', self.name).set(heartbeat_time)
+            self.event_size.labels(self.hutch, self.name).set(size)
+
+            if self.store.graph(name):
+                for node, warning in self.store.graph(name).warnings().items():
+                    warning.graph_name = name
+                    self.report("warning", warning)
+
+        except Exception as e:
+            e.graph_name = name
+            logger.exception("%s: Failure encountered while executing graph %s:", self.name, name)
+            self.report("error", e)
+            logger.error("%s: Purging graph (%s v%d)", self.name, name, self.store.version(name))
+            self.store.destroy(name)
+            self.report("purge", name)
+
     def process_msg(self, msg):
         if msg.mtype == MsgTypes.Transition:
             self.transitions.update(msg.payload.ttype, self.eb_id(msg.identity), msg.payload.payload)
@@ -136,41 +172,17 @@ class GraphCollector(Node, Collector):
             self.event_latency.labels(self.hutch, self.sender % msg.identity,
                                       self.name).set(latency.total_seconds())
             datagram_start = time.time()
-            self.store.update(msg.name, msg.heartbeat, self.eb_id(msg.identity), msg.version, msg.payload)
+            for heartbeat, version in msg.shed:
+                # the sender shed its contribution, so the heartbeat is built from the ones of the others
+                self.store.shed(msg.name, heartbeat, self.eb_id(msg.identity), version)
+                if self.store.ready(msg.name, heartbeat):
+                    # the heartbeats after it are still pending, so nothing is pruned
+                    self.complete(msg.name, heartbeat, datagram_start, prune=False)
+
+            self.store.update(msg.name, msg.heartbeat, self.eb_id(msg.identity), msg.version, msg.payload,
+                              msg.trace)
             if msg.heartbeat.prompt or self.store.ready(msg.name, msg.heartbeat):
-                times, size = (None, None)
-                try:
-                    # prune entries older than the current heartbeat
-                    pruned_times, pruned_size = self.store.prune(msg.name, self.node, msg.heartbeat, drop=True)
-
-                    if pruned_size:
-                        self.event_counter.labels(self.hutch, 'Pruned Heartbeat', self.name).inc()
-                        self.event_size.labels(self.hutch, self.name).set(pruned_size)
-
-                    # complete the current heartbeat
-                    times, size = self.store.complete(msg.name, msg.heartbeat, self.node)
-
-                    # times = self.store.complete(msg.name, msg.heartbeat, self.node)
-                    # self.report_times(times, msg.name, msg.heartbeat)
-
-                    self.event_counter.labels(self.hutch, 'Heartbeat', self.name).inc()
-                    self.heartbeat_time[msg.heartbeat.identity] += time.time() - datagram_start
-                    heartbeat_time = self.heartbeat_time.pop(msg.heartbeat.identity, 0)
-                    self.event_time.labels(self.hutch, 'Heartbeat', self.name).set(heartbeat_time)
-                    self.event_size.labels(self.hutch, self.name).set(size)
-
-                    if self.store.graph(msg.name):
-                        for node, warning in self.store.graph(msg.name).warnings().items():
-                            warning.graph_name = msg.name
-                            self.report("warning", warning)
-
-                except Exception as e:
-                    e.graph_name = msg.name
-                    logger.exception("%s: Failure encountered while executing graph %s:", self.name, msg.name)
-                    self.report("error", e)
-                    logger.error("%s: Purging graph (%s v%d)", self.name, msg.name, self.store.version(msg.name))
-                    self.store.destroy(msg.name)
-                    self.report("purge", msg.name)
+                self.complete(msg.name, msg.heartbeat, datagram_start)
             else:
                 # prune older entries from the event builder
                 pruned_times, pruned_size = self.store.prune(msg.name, self.node)
@@ -356,6 +368,20 @@ def main(color, upstream_port, downstream_port):
         help='Use the psana "supervisor" model to load calib constants on one core only.'
     )
 
+    worker_subparser.add_argument(
+        '--start-method',
+        choices=mp.get_all_start_methods(),
+        help='how the workers are started, forkserver starts them from a process that has already imported '
+             'the analysis modules (default: the platform default)'
+    )
+
+    worker_subparser.add_argument(
+        '--preload',
+        action='append',
+        default=[],
+        help='an extra module imported by the forkserver before starting the processes (can be repeated)'
+    )
+
     args = parser.parse_args()
 
     # if an address for the downstream collector is not specified just use the manager address
@@ -384,6 +410,8 @@ def main(color, upstream_port, downstream_port):
                 local_collector_addr = "tcp://localhost:%d" % (args.port + upstream_port)
                 export_addr = "tcp://%s:%d" % (args.host, args.port + Ports.Export)
                 flags, src_cfg = parse_args(args)
+                if args.start_method is not None:
+                    mp.use_start_method(args.start_method, mp.PRELOAD + args.preload)
                 src_cfg = list(src_cfg) # Make mutable
                 if args.use_supervisor and "supervisor=" not in src_cfg[1]:
                     src_cfg[1] = f"{src_cfg[1]},supervisor=1"
@@ -1,4 +1,5 @@
 import abc
+import bisect
 import socket
 import os
 import sys
@@ -9,7 +10,10 @@ import json
 import asyncio
 import logging
 import argparse
+import collections
 import functools
+import heapq
+import threading
 import numpy as np
 import zmq.asyncio
 import prometheus_client as pc
@@ -17,7 +21,7 @@ import amitypes as at
 import ami.graph_nodes as gn
 from ami.graphkit_wrapper import Graph
 from ami.data import MsgTypes, Message, Transition, CollectorMessage, Datagram, Serializer, Deserializer, \
-    Heartbeat
+    Heartbeat, Stages
 from enum import IntEnum
 
 
@@ -31,6 +35,33 @@ class Colors:
     GlobalCollector = "globalCollector"
 
 
+class Backpressure:
+    """
+    What a worker does with the contribution of a graph to a heartbeat when
+    the collectors are behind and sending it would block.
+    """
+    Block = "block"  # wait until it is sent, which stalls every graph of the worker
+    Drop = "drop"  # drop the contribution
+    Coalesce = "coalesce"  # keep accumulating and send it with the next heartbeat
+    Policies = [Block, Drop, Coalesce]
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Parses a policy given as POLICY for every graph or GRAPH=POLICY for one
+        graph, for use as an argparse type.
+
+        Returns:
+            A tuple of the name of the graph, None for every graph, and the
+            policy.
+        """
+        name, _, policy = value.rpartition('=')
+        if policy not in cls.Policies:
+            raise argparse.ArgumentTypeError("invalid backpressure policy '%s' (choose from %s)" %
+                                             (policy, ', '.join(cls.Policies)))
+        return name or None, policy
+
+
 class Ports(IntEnum):
     Comm = 0
     Graph = 1
@@ -42,7 +73,8 @@ class Ports(IntEnum):
     Info = 7
     View = 8
     Sync = 9
-    NumPorts = 10
+    ViewPub = 10
+    NumPorts = 11
     PortsPerPlatform = 50
     PlatformMax = 1023
     BasePort = 5555
@@ -176,7 +208,9 @@ class Store:
 
     The data is store internally as Datagram objects. When new data is inserted
     for a key its type is checked to see if it matches the type of previous
-    value (if any).
+    value (if any). The class and number of dimensions of the last value put
+    for each key are cached with its Datagram, so that a value of the same
+    kind is stored without computing its type again.
 
     Args:
         version (int): The current version id of the store. Defaults to zero.
@@ -186,6 +220,7 @@ class Store:
         self.version = version
         self._store = {}
         self._plots = {}
+        self._signatures = {}
 
     def __bool__(self):
         """
@@ -348,15 +383,26 @@ class Store:
             data (object): the data to associate with the entry
         """
         if data is not None:
+            # the type of the data only depends on its class and number of dimensions
+            signature = type(data)
+            if isinstance(data, np.ndarray):
+                signature = (signature, data.ndim)
+            cached = self._signatures.get(name)
+            if cached is not None and cached[0] == signature:
+                cached[1].data = data
+                return
+
             datatype = self.get_type(data)
             if name in self._store:
-                if not datatype == self._store[name].dtype:
+                dgram = self._store[name]
+                if not datatype == dgram.dtype:
                     logger.warning("type of new result (%s) differs from existing."
-                                    " (%s)" % (datatype, self._store[name].dtype))
-                self._store[name].dtype = datatype
-                self._store[name].data = data
+                                   " (%s)" % (datatype, dgram.dtype))
+                dgram.dtype = datatype
+                dgram.data = data
             else:
-                self._store[name] = Datagram(name, datatype, data)
+                dgram = self._store[name] = Datagram(name, datatype, data)
+            self._signatures[name] = (signature, dgram)
 
     @property
     def plots(self):
@@ -371,6 +417,437 @@ class Store:
         """
         self._store = {}
         self._plots = {}
+        self._signatures = {}
+
+
+class ViewOptions(collections.namedtuple('ViewOptions', ['shape', 'rate'], defaults=[None, None])):
+    """Options of a subscription to the view of an entry in a feature store.
+
+    The options are appended to the view topic after a '|' and let a client
+    that renders the view on screen request a reduced version of it, e.g.
+    'view:graph:cspad|shape=512x512,rate=5'.
+
+    Args:
+        shape (tuple): the maximum shape of array views. Larger arrays are
+            binned down by integer factors until they fit.
+        rate (float): the maximum rate in Hz at which the view is sent.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        options = []
+        if self.shape is not None:
+            options.append("shape=%s" % "x".join(str(s) for s in self.shape))
+        if self.rate is not None:
+            options.append("rate=%g" % self.rate)
+        return ",".join(options)
+
+    @classmethod
+    def parse(cls, options):
+        """
+        Class method for parsing the options string of a view topic.
+
+        Args:
+            options (str): the options string, e.g. 'shape=512x512,rate=5'.
+
+        Returns:
+            The parsed ViewOptions or None if the string is empty.
+
+        Raises:
+            ValueError: if the options string is malformed.
+        """
+        if not options:
+            return None
+
+        values = {}
+        for option in options.split(','):
+            key, _, value = option.partition('=')
+            if key == 'shape':
+                values['shape'] = tuple(int(s) for s in value.split('x'))
+            elif key == 'rate':
+                values['rate'] = float(value)
+            else:
+                raise ValueError("unknown view option: %s" % key)
+
+        return cls(**values)
+
+    @property
+    def interval(self):
+        """
+        Returns the minimum time in seconds between two sends of the view or
+        zero if the rate is not limited.
+        """
+        if self.rate:
+            return 1.0 / self.rate
+        else:
+            return 0.0
+
+    def factors(self, data):
+        """
+        Returns the integer factors by which each axis of an array is binned so
+        that it fits the maximum shape of the options.
+
+        Args:
+            data (object): the data of the view.
+
+        Returns:
+            The tuple of binning factors, or None if the data is not an array
+            with the same number of dimensions as the maximum shape or if it
+            already fits.
+        """
+        if self.shape is None or not isinstance(data, np.ndarray) or data.ndim != len(self.shape):
+            return None
+
+        factors = tuple(-(-size // max(max_size, 1)) for size, max_size in zip(data.shape, self.shape))
+        if any(factor > 1 for factor in factors):
+            return factors
+        else:
+            return None
+
+    def downsample(self, data):
+        """
+        Bins an array down so that it fits the maximum shape of the options.
+        The bins are averaged, and partial bins at the end of an axis are
+        averaged over the pixels they contain.
+
+        Args:
+            data (object): the data of the view.
+
+        Returns:
+            The binned array, or the data unchanged if it does not need to be
+            binned (see factors).
+        """
+        factors = self.factors(data)
+        if factors is None:
+            return data
+
+        dtype = np.result_type(data.dtype, np.float32)
+        for axis, factor in enumerate(factors):
+            if factor > 1:
+                size = data.shape[axis]
+                bins = np.arange(0, size, factor)
+                counts = np.diff(np.append(bins, size))
+                counts = counts.reshape([-1 if i == axis else 1 for i in range(data.ndim)])
+                data = np.add.reduceat(data, bins, axis=axis, dtype=dtype) / counts.astype(dtype)
+
+        return data
+
+
+def view_topic(graph, name, options=None):
+    """
+    Returns the topic of the view of an entry in a feature store.
+
+    Args:
+        graph (str): the name of the graph.
+        name (str): the name of the entry in the feature store.
+        options (ViewOptions): optional options of the view subscription.
+
+    Returns:
+        The view topic string.
+    """
+    topic = "view:%s:%s" % (graph, name)
+    if options:
+        options = str(options)
+        if options:
+            topic += "|" + options
+    return topic
+
+
+class ViewCache:
+    """Class for caching the serialized views of entries in a feature store.
+
+    Serializing a large entry (e.g. a detector image) for each client that
+    requests to view it is expensive, so the serialized frames are kept per
+    graph and entry name, and are reused until the entry is invalidated by an
+    update of the store. Reduced views of an entry (see ViewOptions) are
+    cached separately and invalidated together with the entry. When the size
+    of the cached frames exceeds the maximum size the least recently used
+    entries are evicted.
+
+    Args:
+        maxsize (int): The maximum size of the cache in bytes. A size of zero
+            disables the cache. Defaults to zero.
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache = collections.OrderedDict()  # {(graph, name): (frames, size)}
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    @property
+    def hit_rate(self):
+        """
+        Returns the fraction of lookups in the cache that were hits.
+
+        Returns:
+            The hit rate of the cache or zero if there have been no lookups.
+        """
+        lookups = self.hits + self.misses
+        if lookups:
+            return self.hits / lookups
+        else:
+            return 0.0
+
+    def get(self, graph, name, options=None):
+        """
+        Retrieves the cached serialized frames of an entry and marks the entry
+        as the most recently used one.
+
+        Args:
+            graph (str): the name of the graph the entry belongs to.
+            name (str): the name of the entry.
+            options (ViewOptions): optional options of a reduced view.
+
+        Returns:
+            The list of serialized frames if the entry is cached, otherwise
+            None.
+        """
+        key = self._key(graph, name, options)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key][0]
+        else:
+            self.misses += 1
+            return None
+
+    def put(self, graph, name, frames, size, options=None):
+        """
+        Adds the serialized frames of an entry to the cache, evicting the least
+        recently used entries if the maximum size of the cache is exceeded.
+        Frames larger than the maximum size of the cache are not cached.
+
+        Args:
+            graph (str): the name of the graph the entry belongs to.
+            name (str): the name of the entry.
+            frames (list): the serialized frames of the entry.
+            size (int): the size of the serialized frames in bytes.
+            options (ViewOptions): optional options of a reduced view.
+
+        Returns:
+            The number of entries evicted from the cache.
+        """
+        evicted = 0
+        key = self._key(graph, name, options)
+        self._discard(key)
+        if size <= self.maxsize:
+            self._cache[key] = (frames, size)
+            self.size += size
+            while self.size > self.maxsize:
+                self._discard(next(iter(self._cache)))
+                evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def invalidate(self, graph, names=None):
+        """
+        Removes the cached entries of a graph, including their reduced views.
+        If no names are specified then all the entries of the graph are
+        removed.
+
+        Args:
+            graph (str): the name of the graph whose entries are removed.
+            names (iterable): optional names of the entries to remove.
+        """
+        if names is not None:
+            names = set(names)
+        for key in [key for key in self._cache if key[0] == graph and (names is None or key[1] in names)]:
+            self._discard(key)
+
+    def clear(self):
+        """
+        Clears all the entries currently in the cache.
+        """
+        self._cache.clear()
+        self.size = 0
+
+    @staticmethod
+    def _key(graph, name, options=None):
+        if options is None:
+            return (graph, name)
+        else:
+            return (graph, name, options)
+
+    def _discard(self, key):
+        if key in self._cache:
+            frames, size = self._cache.pop(key)
+            self.size -= size
+
+
+class HeartbeatTracer:
+    """Class for keeping the traces of the slowest heartbeats of each graph.
+
+    The trace of a heartbeat records the time it passed each of the pipeline
+    Stages. The heartbeats are ranked by their total latency, from the first
+    event in the source to the last recorded stage, and only the slowest ones
+    are kept. The class is thread-safe, so that traces can be added from the
+    thread serving views while being dumped from the manager.
+
+    Args:
+        depth (int): The number of heartbeats to keep per graph. Defaults to
+            32.
+    """
+
+    def __init__(self, depth=32):
+        self.depth = depth
+        self._lock = threading.Lock()
+        self._count = 0
+        self._traces = {}  # {graph : [(total, count, record)]}
+
+    def add(self, graph, heartbeat, trace):
+        """
+        Adds the trace of a heartbeat of a graph.
+
+        Args:
+            graph (str): the name of the graph.
+            heartbeat (Heartbeat): the heartbeat the trace belongs to.
+            trace (dict): the time the heartbeat passed each stage.
+
+        Returns:
+            The dictionary of stage latencies of the heartbeat, including its
+            total latency under 'total'.
+        """
+        latencies = Stages.latencies(trace)
+        stages = [stage for stage in Stages.Order if stage in trace]
+        latencies['total'] = trace[stages[-1]] - trace[stages[0]] if stages else 0.0
+        record = {'heartbeat': heartbeat.identity,
+                  'timestamp': heartbeat.timestamp,
+                  'trace': dict(trace),
+                  'latencies': latencies}
+        with self._lock:
+            # the insertion count breaks ties between heartbeats with the same latency
+            self._count += 1
+            item = (latencies['total'], self._count, record)
+            traces = self._traces.setdefault(graph, [])
+            if len(traces) < self.depth:
+                heapq.heappush(traces, item)
+            elif item > traces[0]:
+                heapq.heapreplace(traces, item)
+
+        return latencies
+
+    def slowest(self, graph, count=None):
+        """
+        Returns the traces of the slowest heartbeats of a graph.
+
+        Args:
+            graph (str): the name of the graph.
+            count (int): optional maximum number of heartbeats to return.
+
+        Returns:
+            A list of dictionaries with the heartbeat identity, timestamp,
+            trace and stage latencies, ordered from the slowest heartbeat.
+        """
+        with self._lock:
+            traces = sorted(self._traces.get(graph, []), reverse=True)
+        return [record for total, order, record in traces[:count]]
+
+    def clear(self, graph=None):
+        """
+        Removes the traces of a graph, or of all graphs if none is specified.
+
+        Args:
+            graph (str): optional name of the graph.
+        """
+        with self._lock:
+            if graph is None:
+                self._traces.clear()
+            else:
+                self._traces.pop(graph, None)
+
+
+class EventTimes:
+    """Class for summarizing the execution times of the events of a heartbeat.
+
+    The time taken by each event is counted in a histogram with fixed,
+    logarithmic bins, so that the cost of recording an event and the size of
+    the summary sent at the end of the heartbeat do not depend on the number
+    of events.
+
+    Args:
+        edges (list): The bin edges in seconds, by default 5 bins per decade
+            from 1 us to 100 s. Times outside of them go in the first and
+            last bins.
+    """
+
+    Edges = list(np.logspace(-6, 2, 8*5 + 1))
+
+    def __init__(self, edges=None):
+        self.edges = self.Edges if edges is None else list(edges)
+        self.counts = [0]*(len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.first = None
+        self.last = None
+
+    def add(self, start, stop):
+        """
+        Records the execution of an event.
+
+        Args:
+            start (float): the time the event started.
+            stop (float): the time the event finished.
+        """
+        elapsed = stop - start
+        self.counts[bisect.bisect(self.edges, elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if self.first is None:
+            self.first = start
+        self.last = stop
+
+    def summary(self):
+        """
+        Returns a dictionary with the number of events, the start of the first
+        and the end of the last event, the total and maximum time taken and
+        the histogram counts (see `quantile` to interpret them).
+        """
+        return {'count': self.count, 'first': self.first, 'last': self.last,
+                'total': self.total, 'max': self.max, 'counts': self.counts}
+
+    @classmethod
+    def quantile(cls, summary, q, edges=None):
+        """
+        Returns an estimate of a quantile of the event times from a summary,
+        the upper edge of the bin it falls in.
+
+        Args:
+            summary (dict): a summary returned by `summary`.
+            q (float): the quantile, between 0 and 1.
+            edges (list): the bin edges used for the summary.
+        """
+        edges = cls.Edges if edges is None else list(edges)
+        if not summary['count']:
+            return None
+        target = q*summary['count']
+        cumulative = 0
+        for idx, count in enumerate(summary['counts']):
+            cumulative += count
+            if cumulative >= target and count:
+                return edges[idx] if idx < len(edges) else summary['max']
+        return summary['max']
+
+    @staticmethod
+    def rate(summary):
+        """
+        Returns the number of events per second of a summary.
+        """
+        if summary['count'] and summary['last'] > summary['first']:
+            return summary['count']/(summary['last'] - summary['first'])
+        return 0.0
 
 
 class ZmqHandler:
@@ -385,19 +862,19 @@ class ZmqHandler:
         self.collector.connect(addr)
         self.serializer = Serializer()
 
-    def send(self, msg):
+    def send(self, msg, flags=0):
         msg = self.serializer(msg)
-        self.collector.send_multipart(msg, copy=False)
+        self.collector.send_multipart(msg, copy=False, flags=flags)
         return self.serializer.sizeof(msg)
 
     def message(self, mtype, identity, payload):
         msg = Message(mtype=mtype, identity=identity, payload=payload)
         return self.send(msg)
 
-    def collector_message(self, identity, heartbeat, name, version, payload):
+    def collector_message(self, identity, heartbeat, name, version, payload, trace=None, flags=0, shed=None):
         msg = CollectorMessage(mtype=MsgTypes.Datagram, identity=identity, heartbeat=heartbeat,
-                               name=name, version=version, payload=payload)
-        return self.send(msg)
+                               name=name, version=version, payload=payload, trace=trace or {}, shed=shed or [])
+        return self.send(msg, flags)
 
 
 class ResultStore(ZmqHandler):
@@ -406,11 +883,25 @@ class ResultStore(ZmqHandler):
     from a single process and has the ability to send them
     to another (via zeromq). The sending end point is typically
     a Collector object.
+
+    The backpressure policy of each graph (see Backpressure) is looked up by
+    the name of the graph, falling back to the policy under None and then to
+    blocking. The contributions of a graph whose policy doesn't block are
+    sent without blocking, and if the collector is not keeping up they are
+    dropped or kept in the store for the next heartbeat. The heartbeats of the
+    shed contributions are sent with the next contribution of the graph, so
+    that the collector builds them from the contributions of the others.
     """
 
-    def __init__(self, addr, ctx=None, hwm=None):
+    def __init__(self, addr, ctx=None, hwm=None, backpressure=None):
         super().__init__(addr, ctx, hwm)
         self.stores = {}
+        self.backpressure = backpressure or {}
+        self.shed = collections.Counter()
+        # the graphs whose contribution to the last heartbeat is kept for the next one
+        self.coalesced = set()
+        # the heartbeats and versions of the shed contributions of each graph
+        self.unsent = {}
 
     def __bool__(self):
         if self.stores:
@@ -429,16 +920,46 @@ class ResultStore(ZmqHandler):
 
     def remove(self, name):
         del self.stores[name]
+        self.coalesced.discard(name)
+        self.unsent.pop(name, None)
 
     def update(self, name, updates):
         self.stores[name].update(updates)
 
-    def collect(self, identity, heartbeat):
+    def policy(self, name):
+        return self.backpressure.get(name, self.backpressure.get(None, Backpressure.Block))
+
+    def collect(self, identity, heartbeat, trace=None, names=None):
         size = 0
-        for name, store in self.stores.items():
-            size += self.collector_message(identity, heartbeat, name, store.version, store.namespace)
+        for name in (self.stores if names is None else names):
+            store = self.stores[name]
+            self.coalesced.discard(name)
+            policy = self.policy(name)
+            shed = self.unsent.pop(name, [])
+            if policy == Backpressure.Block:
+                size += self.collector_message(identity, heartbeat, name, store.version, store.namespace, trace,
+                                               shed=shed)
+                continue
+
+            try:
+                size += self.collector_message(identity, heartbeat, name, store.version, store.namespace, trace,
+                                               flags=zmq.NOBLOCK, shed=shed)
+            except zmq.Again:
+                self.unsent[name] = shed + [(heartbeat, store.version)]
+                self.shed[name] += 1
+                if policy == Backpressure.Coalesce:
+                    self.coalesced.add(name)
         return size
 
+    def shed_counts(self):
+        """
+        Returns a dictionary of the number of contributions of each graph which
+        were dropped or coalesced since the last call.
+        """
+        counts = dict(self.shed)
+        self.shed.clear()
+        return counts
+
     def version(self, name):
         return self.stores[name].version
 
@@ -446,8 +967,10 @@ class ResultStore(ZmqHandler):
         if name is not None:
             self.stores[name].clear()
         else:
-            for store in self.stores.values():
-                store.clear()
+            # the coalesced contributions are kept until they are sent
+            for name, store in self.stores.items():
+                if name not in self.coalesced:
+                    store.clear()
 
 
 class ContributionBuilder(abc.ABC):
@@ -505,6 +1028,7 @@ class GraphBuilder(ContributionBuilder):
         self.pending_graphs = {}
         self.version = None
         self.completion = completion
+        self.traces = {}  # {eb_key : trace}
 
     def _init(self, name):
         if self.graph is None:
@@ -610,17 +1134,31 @@ class GraphBuilder(ContributionBuilder):
         else:
             self.pending[eb_key].clear()
 
-        size = self.completion(eb_key, identity, self.pending[eb_key], drop)
+        size = self.completion(eb_key, identity, self.pending[eb_key], drop, self.traces.pop(eb_key, {}))
 
         if self.graph:
             self.graph.heartbeat_finished()
 
         return times, size
 
-    def _update(self, eb_key, eb_id, ver_key, data):
+    def _pending(self, eb_key, ver_key):
         if eb_key not in self.pending:
             self.pending[eb_key] = Store(version=ver_key)
             self.contribs[eb_key] = 0
+            self.traces[eb_key] = {}
+
+    def shed(self, eb_key, eb_id, ver_key):
+        """
+        Counts the contribution of eb_id to eb_key as received without data,
+        since its sender shed it.
+        """
+        self._pending(eb_key, ver_key)
+        self.mark(eb_key, eb_id)
+
+    def _update(self, eb_key, eb_id, ver_key, data, trace=None):
+        self._pending(eb_key, ver_key)
+        if trace:
+            Stages.merge(self.traces[eb_key], trace)
         if eb_key > self.latest:
             self.latest = eb_key
         if ver_key != self.pending[eb_key].version:
@@ -718,14 +1256,21 @@ class EventBuilder(ZmqHandler):
     def complete(self, name, eb_key, identity, drop=False):
         return self.builders[name].complete(eb_key, identity, drop)
 
-    def completion(self, name, eb_key, identity, payload, drop):
+    def completion(self, name, eb_key, identity, payload, drop, trace=None):
         if not drop:
-            return self.collector_message(identity, eb_key, name, payload.version, payload.namespace)
+            if trace is not None:
+                trace[self.color] = time.time()
+            return self.collector_message(identity, eb_key, name, payload.version, payload.namespace, trace)
+
+    def update(self, name, eb_key, eb_id, ver_key, data, trace=None):
+        if name not in self.builders:
+            self.create(name)
+        self.builders[name].update(eb_key, eb_id, ver_key, data, trace)
 
-    def update(self, name, eb_key, eb_id, ver_key, data):
+    def shed(self, name, eb_key, eb_id, ver_key):
         if name not in self.builders:
             self.create(name)
-        self.builders[name].update(eb_key, eb_id, ver_key, data)
+        self.builders[name].shed(eb_key, eb_id, ver_key)
 
     def contribs(self, name):
         return self.builders[name].contribs
@@ -1524,6 +2069,18 @@ class CommHandler(abc.ABC):
         """
         return self._request('get_heartbeat')
 
+    @property
+    def traces(self):
+        """
+        Fetches the traces of the slowest recent heartbeats of the graph.
+
+        Returns:
+            A list of dictionaries with the heartbeat identity, timestamp, the
+            time the heartbeat passed each pipeline stage and the latency of
+            each stage, ordered from the slowest heartbeat.
+        """
+        return self._request('get_traces')
+
     @property
     def graph(self):
         """
@@ -9,7 +9,8 @@ import datetime
 
 from traitlets.config.loader import Config
 from ami import LogConfig, Defaults
-from ami.comm import Ports
+from ami.comm import Ports, GraphCommHandler
+from ami.data import Stages
 
 
 logger = logging.getLogger(__name__)
@@ -33,6 +34,16 @@ def run_console(name, addr, load):
                                                  InteractiveShellApp={'exec_lines': exec_lines}))
 
 
+def dump_traces(name, addr, count):
+    comm = GraphCommHandler(name, addr)
+    stages = Stages.Order[1:] + ('total',)
+    print(("%16s" * (len(stages) + 1)) % (('heartbeat',) + stages))
+    for record in comm.traces[:count]:
+        latencies = record['latencies']
+        print("%16d" % record['heartbeat'] +
+              "".join("%16.4f" % latencies[stage] if stage in latencies else "%16s" % "-" for stage in stages))
+
+
 def main():
     parser = argparse.ArgumentParser(description='AMII Shell Client')
 
@@ -78,6 +89,13 @@ def main():
         help='saved AMII configuration to load'
     )
 
+    parser.add_argument(
+        '--traces',
+        type=int,
+        metavar='N',
+        help='print the stage latencies in seconds of the N slowest recent heartbeats and exit'
+    )
+
     parser.add_argument(
         '--log-level',
         default=LogConfig.Level,
@@ -130,6 +148,8 @@ def main():
         addr = "tcp://%s:%d" % (args.host, args.port + Ports.Comm)
 
     try:
+        if args.traces is not None:
+            return dump_traces(args.graph_name, addr, args.traces)
         return run_console(args.graph_name, addr, args.load)
     except KeyboardInterrupt:
         logger.info("Client killed by user...")
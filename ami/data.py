@@ -11,22 +11,18 @@ import inspect
 import logging
 import datetime
 import pickle
-try:
-    import h5py
-except ImportError:
-    h5py = None
-try:
-    import warnings
-    warnings.simplefilter(action='ignore', category=FutureWarning)
-    import pyarrow as pa
-except ImportError:
-    pa = None
+import warnings
 import numpy as np
 import amitypes as at
 from enum import Enum
 from dataclasses import dataclass, asdict, field
-import prometheus_client as pc
-from ami import psana, psana_uses_epics_epoch
+from ami import lazy_import, psana_uses_epics_epoch
+
+
+# the optional data formats are only imported by the sources and serializers using them
+h5py = lazy_import('h5py')
+warnings.simplefilter(action='ignore', category=FutureWarning)
+pa = lazy_import('pyarrow')
 
 
 logger = logging.getLogger(__name__)
@@ -117,6 +113,66 @@ class Heartbeat:
         return cls(**data)
 
 
+class Stages:
+    """
+    The stages of the pipeline whose times are recorded in the trace of a
+    heartbeat, in the order the heartbeat passes through them.
+    """
+    Source = "source"
+    Worker = "worker"
+    LocalCollector = "localCollector"
+    GlobalCollector = "globalCollector"
+    Manager = "manager"
+    View = "view"
+
+    Order = (Source, Worker, LocalCollector, GlobalCollector, Manager, View)
+
+    @staticmethod
+    def merge(trace, other):
+        """
+        Merges the trace of another contribution to the same heartbeat into a
+        trace. The source time is the earliest of the two and the times of the
+        other stages are the latest, so the merged trace follows the slowest
+        contribution.
+
+        Args:
+            trace (dict): the trace to update.
+            other (dict): the trace of the other contribution.
+
+        Returns:
+            The updated trace.
+        """
+        for stage, stamp in other.items():
+            if stage not in trace:
+                trace[stage] = stamp
+            elif stage == Stages.Source:
+                trace[stage] = min(trace[stage], stamp)
+            else:
+                trace[stage] = max(trace[stage], stamp)
+        return trace
+
+    @staticmethod
+    def latencies(trace):
+        """
+        Computes the time spent between each stage of a trace and the previous
+        stage present in the trace.
+
+        Args:
+            trace (dict): the trace of a heartbeat.
+
+        Returns:
+            A dictionary of the latency in seconds of each stage.
+        """
+        latencies = {}
+        previous = None
+        for stage in Stages.Order:
+            if stage in trace:
+                if previous is not None:
+                    latencies[stage] = trace[stage] - trace[previous]
+                previous = stage
+        return latencies
+
+
 @dataclass
 class Datagram:
     name: str
@@ -169,10 +225,17 @@ class CollectorMessage(Message):
         name (str): name
 
         version (int): version
+
+        trace (dict): unix time the heartbeat passed each of the Stages
+
+        shed (list): the heartbeats and versions of the contributions the sender
+            shed since its last one
     """
     heartbeat: Heartbeat = Heartbeat()
     name: str = ""
     version: int = 0
+    trace: dict = field(default_factory=dict)
+    shed: list = field(default_factory=list)
 
     def _serialize(self):
         return self.__dict__
@@ -343,6 +406,45 @@ class TimestampConverter:
         return raw_ts, int(timestamp * self.heartbeat), unix_ts
 
 
+class Lazy:
+    """
+    A value of an event that is only read from the source when a graph node
+    uses it (see the 'lazy' source configuration option), so events dropped
+    by a filter never pay for the expensive reads. The value is read at most
+    once, however many nodes and graphs use it.
+
+    Args:
+        func (function): the function reading the value.
+        args: the arguments of the function.
+    """
+
+    __slots__ = ('func', 'args', 'value')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self.value = None
+
+    def __repr__(self):
+        return "Lazy(%s)" % ("unread" if self.func is not None else repr(self.value))
+
+    def __call__(self):
+        if self.func is not None:
+            self.value = self.func(*self.args)
+            # drop the references to the event
+            self.func = None
+            self.args = None
+        return self.value
+
+
+def resolve(value):
+    """
+    Returns the value of a lazy event value, other values are returned
+    unchanged.
+    """
+    return value() if type(value) is Lazy else value
+
+
 @dataclass
 class RequestedData:
     def __init__(self, names=None, kws={}):
@@ -434,29 +536,69 @@ class Source(abc.ABC):
             'bound': int,
             'repeat': lambda s: s if isinstance(s, bool) else s.lower() == 'true',
             'counting': lambda s: s if isinstance(s, bool) else s.lower() == 'true',
+            'lazy': lambda s: s if isinstance(s, bool) else s.lower() == 'true',
             'files': lambda n: n if isinstance(n, list) else [os.path.expanduser(f) for f in n.split(',')],
             'config': lambda c: c if isinstance(c, dict) else os.path.expanduser(c),
         }
+        # config keys the source reads again as it goes, which can be changed without recreating it
+        self._reconfigurable_keys = {'interval', 'repeat'}
+        self._convert_config(self.config, self.flags)
+
+    def _convert_config(self, config, flags):
+        """
+        Corrects the types of the special keys of a configuration dictionary,
+        applies the flags to it and sets its type if it was not passed.
+        """
         # Correct the types of special keys in the dictionary that might have
         # been passed as strings (can happen when specifying config on the
         # command line.
-        for key, value in self.config.items():
+        for key, value in config.items():
             if key in self._cfgkey_types:
-                self.config[key] = self._cfgkey_types[key](value)
+                config[key] = self._cfgkey_types[key](value)
         # Apply flags to the config dictionary
-        for flag, value in self.flags.items():
+        for flag, value in flags.items():
             # if there is type info for a flag cast before adding it
             if flag in self._cfgkey_types:
-                self.config[flag] = self._cfgkey_types[flag](value)
+                config[flag] = self._cfgkey_types[flag](value)
             else:
-                self.config[flag] = value
+                config[flag] = value
         # If 'type' has not been passed in the config dictionary then set it
-        if 'type' not in self.config:
+        if 'type' not in config:
             base_name = __class__.__name__
             type_name = type(self).__name__
             if type_name.endswith(base_name):
                 type_name = type_name[:-len(base_name)]
-            self.config['type'] = type_name.lower()
+            config['type'] = type_name.lower()
+
+    def reconfigure(self, src_cfg, flags=None):
+        """
+        Applies a new source configuration to the running source if it only
+        changes keys which the source reads as it goes (e.g. the interval),
+        so the open files and detectors of the source are kept.
+
+        Args:
+            src_cfg (dict): The new source configuration
+
+            flags (dict): Flags to apply to the new configuration
+
+        Returns:
+            True if the configuration was applied, False if the source needs to
+            be recreated for it.
+        """
+        config = dict(src_cfg)
+        self._convert_config(config, flags or {})
+        for key in self._reconfigurable_keys:
+            config.pop(key, None)
+        current = {k: v for k, v in self.config.items() if k not in self._reconfigurable_keys}
+        if config != current:
+            return False
+
+        for key in self._reconfigurable_keys:
+            if key in src_cfg:
+                self.config[key] = self._cfgkey_types[key](src_cfg[key])
+            else:
+                self.config.pop(key, None)
+        return True
 
     @property
     def interval(self):
@@ -715,25 +857,33 @@ class Source(abc.ABC):
         """
         logger.debug(f"Requested_data before: {self.requested_data}")
         logger.debug(f"Requested_data: {requested_data}")
+        # the requests are built aside and swapped in at the end, since the events may be read in another thread
         if not is_kws_update:
             self.requested_names = requested_data # includes things like timestamp, source, ...
-            self.requested_data = RequestedData() # will weed out timestamp, source, ...
-            self.requested_special = {}
+            requested = RequestedData() # will weed out timestamp, source, ...
+            requested_special = {}
+        else:
+            requested = RequestedData()
+            requested.update(self.requested_data)
+            requested_special = {name: dict(sub_names) for name, sub_names in self.requested_special.items()}
 
         for name, req in zip(requested_data.names, requested_data):
             if name in self.special_names:
                 sub_name, info = self.special_names[name]
-                if sub_name not in self.requested_special:
-                    self.requested_special[sub_name] = {}
-                self.requested_special[sub_name][name] = info
+                if sub_name not in requested_special:
+                    requested_special[sub_name] = {}
+                requested_special[sub_name][name] = info
             elif name not in self._base_names:
                 if name in self.names:
-                    self.requested_data.update(req)
+                    requested.update(req)
                     if is_kws_update: # ugly way to clear kwargs
-                        if name not in requested_data.kwargs and name in self.requested_data.kwargs:
-                            self.requested_data.kwargs.pop(name)
+                        if name not in requested_data.kwargs and name in requested.kwargs:
+                            requested.kwargs.pop(name)
                 else:
                     logger.debug("DataSrc: requested source \'%s\' is not available", name)
+
+        self.requested_data = requested
+        self.requested_special = requested_special
         logger.debug(f"Requested_data after: {self.requested_data}\n")
 
     @abc.abstractmethod
@@ -848,6 +998,14 @@ class HierarchicalDataSource(Source):
     def counting_mode(self):
         return self.config.get('counting', True)
 
+    @property
+    def lazy_mode(self):
+        """
+        In lazy mode the expensive data of an event is read only when a graph
+        node uses it (see `Lazy`).
+        """
+        return self.config.get('lazy', False)
+
     @property
     def repeat(self):
         if self.loop_count and not self.repeat_mode:
@@ -957,8 +1115,11 @@ class PsanaSource(HierarchicalDataSource):
         self.evt_attrs = {
             'keepraw': int,
         }
+        # importing psana is slow, so it is only done by the processes reading from it
+        from ami import psana
         if psana is None:
             raise NotImplementedError("psana is not available!")
+        self.psana = psana
 
     def _timestamp(self, evt):
         return self.ts_converter(evt.timestamp, epics_epoch=self.epics_epoch)
@@ -979,7 +1140,7 @@ class PsanaSource(HierarchicalDataSource):
             if key in ps_kwargs:
                 ps_kwargs[key] = func(ps_kwargs[key])
 
-        return psana.DataSource(**ps_kwargs)
+        return self.psana.DataSource(**ps_kwargs)
 
     @property
     def repeat_mode(self):
@@ -1014,9 +1175,9 @@ class PsanaSource(HierarchicalDataSource):
 
     def _update_evt_attrs(self):
         for attr_name, attr_type in self.evt_attrs.items():
-            if hasattr(psana.event.Event, attr_name):
+            if hasattr(self.psana.event.Event, attr_name):
                 self.data_types[attr_name] = attr_type
-                self.special_types[attr_name] = getattr(psana.event.Event, attr_name)
+                self.special_types[attr_name] = getattr(self.psana.event.Event, attr_name)
 
     def _update_special_attrs(self, detname, det_interface):
         for attr, attr_type in self.special_attrs.items():
@@ -1218,15 +1379,11 @@ class PsanaSource(HierarchicalDataSource):
                     obj = self.detectors[detname].det
                     for token in namesplit[1:]:
                         obj = getattr(obj, token)
-                    if name in self.requested_data.kwargs:
-                        logger.debug(f'Use kwargs here: {self.requested_data.kwargs[name]}')
-                        try:
-                            event[name] = obj(evt, **self.requested_data.kwargs[name])
-                        except TypeError:
-                            print(f'Bad kwargs passed to {obj}.\nIgnoring custom kwargs.')
-                            event[name] = obj(evt)  # default back to not using kwargs
+                    kwargs = self.requested_data.kwargs.get(name)
+                    if self.lazy_mode:
+                        event[name] = Lazy(self._read, obj, evt, kwargs)
                     else:
-                        event[name] = obj(evt)
+                        event[name] = self._read(obj, evt, kwargs)
 
         for name, sub_names in self.requested_special.items():
             namesplit = name.split(':')
@@ -1246,6 +1403,15 @@ class PsanaSource(HierarchicalDataSource):
 
         return event
 
+    def _read(self, obj, evt, kwargs=None):
+        if kwargs is not None:
+            logger.debug(f'Use kwargs here: {kwargs}')
+            try:
+                return obj(evt, **kwargs)
+            except TypeError:
+                print(f'Bad kwargs passed to {obj}.\nIgnoring custom kwargs.')
+        return obj(evt)  # default back to not using kwargs
+
     def _cleanup(self):
         # clear the references to the detector interface
         self.detectors.clear()
@@ -0,0 +1,175 @@
+import numpy as np
+import sympy
+
+
+ufuncs = {
+    sympy.sin: np.sin,
+    sympy.cos: np.cos,
+    sympy.tan: np.tan,
+    sympy.asin: np.arcsin,
+    sympy.acos: np.arccos,
+    sympy.atan: np.arctan,
+    sympy.sinh: np.sinh,
+    sympy.cosh: np.cosh,
+    sympy.tanh: np.tanh,
+    sympy.exp: np.exp,
+    sympy.log: np.log,
+    sympy.Abs: np.abs,
+    sympy.sign: np.sign,
+    sympy.floor: np.floor,
+    sympy.ceiling: np.ceil,
+}
+
+
+class FusedExpression:
+    """
+    Evaluates an arithmetic expression of arrays with preallocated temporaries.
+
+    The expression is compiled once into a sequence of numpy ufunc calls, where
+    the result of each sub-expression is written into a temporary array that
+    is reused for the next events (and by the later steps of the same event
+    once its value has been used). Evaluating `(a - b) / (a + b)` on images
+    therefore allocates only the result, instead of an array per operation
+    like the function returned by `sympy.lambdify`. The result is a new array
+    for every call, since the nodes downstream may keep it.
+
+    When the arrays all have the same shape the expression is evaluated on
+    blocks of elements in turn, with temporaries small enough to stay in the
+    cache between the steps.
+
+    Expressions using functions without a matching ufunc, or complex numbers,
+    are not supported and raise NotImplementedError.
+
+    Args:
+        args (list): the names of the arguments.
+        expr (str): the expression.
+        blocksize (int): the number of elements evaluated at a time.
+    """
+
+    def __init__(self, args, expr, blocksize=16384):
+        self.symbols = [sympy.Symbol(arg) for arg in args]
+        self.expr = sympy.sympify(expr, locals={arg: sym for arg, sym in zip(args, self.symbols)})
+        self.program = []
+        self.ntemps = 0
+        self.free = []
+        self.result = self._emit(self.expr)
+        self.free = None
+        self.blocksize = blocksize
+        self.key = None
+        self.temps = []
+
+    def _temp(self, *operands):
+        # a temporary operand has no other use, so its value can be overwritten by the result
+        temps = [op for op in operands if op[0] == 'tmp']
+        if temps:
+            self.free.extend(temps[1:])
+            return temps[0]
+        elif self.free:
+            return self.free.pop()
+        self.ntemps += 1
+        return ('tmp', self.ntemps - 1)
+
+    def _op(self, ufunc, *operands):
+        out = self._temp(*operands)
+        self.program.append((ufunc, operands, out[1]))
+        return out
+
+    def _reduce(self, ufunc, operands):
+        result = operands[0]
+        for operand in operands[1:]:
+            result = self._op(ufunc, result, operand)
+        return result
+
+    def _emit(self, expr):
+        if expr.is_Symbol:
+            return ('arg', self.symbols.index(expr))
+        elif expr.is_number:
+            try:
+                return ('const', float(expr))
+            except TypeError:
+                raise NotImplementedError("unsupported constant: %s" % expr)
+        elif expr.is_Add:
+            const, terms = expr.as_coeff_add()
+            added = []
+            subtracted = []
+            for term in terms:
+                coeff, rest = term.as_coeff_Mul()
+                if coeff == -1:
+                    subtracted.append(self._emit(rest))
+                else:
+                    added.append(self._emit(term))
+            if const:
+                added.append(('const', float(const)))
+            if not added:
+                added.append(('const', 0.0))
+            result = self._reduce(np.add, added)
+            for operand in subtracted:
+                result = self._op(np.subtract, result, operand)
+            return result
+        elif expr.is_Mul:
+            const, factors = expr.as_coeff_mul()
+            numerator = []
+            denominator = []
+            for factor in factors:
+                if factor.is_Pow and factor.exp.is_number and factor.exp < 0:
+                    denominator.append(self._emit(factor.base**-factor.exp))
+                else:
+                    numerator.append(self._emit(factor))
+            if const != 1 or not numerator:
+                numerator.append(('const', float(const)))
+            result = self._reduce(np.multiply, numerator)
+            for operand in denominator:
+                result = self._op(np.divide, result, operand)
+            return result
+        elif expr.is_Pow:
+            base = self._emit(expr.base)
+            if expr.exp == 2:
+                return self._op(np.square, base)
+            elif expr.exp == sympy.Rational(1, 2):
+                return self._op(np.sqrt, base)
+            elif expr.exp == -1:
+                return self._op(np.divide, ('const', 1.0), base)
+            return self._op(np.power, base, self._emit(expr.exp))
+        elif expr.func in ufuncs and len(expr.args) == 1:
+            return self._op(ufuncs[expr.func], self._emit(expr.args[0]))
+
+        raise NotImplementedError("unsupported operation: %s" % expr.func)
+
+    def _temps(self, shape, dtype):
+        if self.key != (shape, dtype):
+            self.key = (shape, dtype)
+            self.temps = [np.empty(shape, dtype=dtype) for _ in range(self.ntemps)]
+        return self.temps
+
+    def _run(self, args, temps, out):
+        last = len(self.program) - 1
+        for idx, (ufunc, operands, dest) in enumerate(self.program):
+            values = [args[value] if kind == 'arg' else temps[value] if kind == 'tmp' else value
+                      for kind, value in operands]
+            ufunc(*values, out=out if idx == last else temps[dest])
+
+    def __call__(self, *args):
+        if self.result[0] != 'tmp':
+            return args[self.result[1]] if self.result[0] == 'arg' else self.result[1]
+
+        shape = np.broadcast_shapes(*(np.shape(arg) for arg in args))
+        dtype = np.result_type(np.float64, *args)
+        out = np.empty(shape, dtype=dtype)
+
+        if any(np.ndim(arg) and np.shape(arg) != shape for arg in args):
+            # arguments of different shapes are broadcast by the ufuncs
+            self._run(args, self._temps(shape, dtype), out)
+            return out
+
+        # evaluate the whole expression block by block, so the temporaries stay in cache
+        flat = [np.ravel(arg) if np.ndim(arg) else arg for arg in args]
+        result = out.reshape(-1)
+        size = result.size
+        temps = self._temps((min(self.blocksize, size),), dtype)
+        for start in range(0, size, self.blocksize):
+            stop = min(start + self.blocksize, size)
+            block = [arg[start:stop] if np.ndim(arg) else arg for arg in flat]
+            if temps and stop - start < len(temps[0]):
+                temps = [temp[:stop - start] for temp in temps]
+            self._run(block, temps, result[start:stop])
+        return out
@@ -16,7 +16,7 @@ from ami.flowchart.Node import Node, NodeGraphicsItem, find_nearest
 from ami.flowchart.NodeLibrary import SourceLibrary
 from ami.flowchart.SourceConfiguration import SourceConfiguration
 from ami.flowchart.TypeEncoder import TypeEncoder
-from ami.comm import AsyncGraphCommHandler, GraphCommHandler
+from ami.comm import AsyncGraphCommHandler, GraphCommHandler, EventTimes
 from ami.client import flowchart_messages as fcMsgs
 try:
     from qtconsole.rich_jupyter_widget import RichJupyterWidget
@@ -601,9 +601,8 @@ class Flowchart(Node):
 
                 if ctrl.graph_name not in msg:
                     continue
-                time_per_event = msg[ctrl.graph_name]
                 worker = int(re.search(r'(\d)+', source).group())
-                events_per_second[worker] = len(time_per_event)/(time_per_event[-1][1] - time_per_event[0][0])
+                events_per_second[worker] = EventTimes.rate(msg[ctrl.graph_name])
                 total_events[worker] = msg['num_events']
 
                 if all(events_per_second):
@@ -829,6 +828,7 @@ class FlowchartCtrlWidget(QtWidgets.QWidget):
             node.changed = False
 
         self.metadata = await self.graphCommHandler.metadata
+        self.report_eliminated()
         self.ui.setPendingClear()
         version = str(await self.graphCommHandler.graphVersion)
         state = self.chart.saveState()
@@ -836,6 +836,31 @@ class FlowchartCtrlWidget(QtWidgets.QWidget):
         self.graph_info.labels(self.chart.hutch, self.graph_name).info({'graph': state, 'version': version})
         self.graph_version.labels(self.chart.hutch, self.graph_name).set(version)
 
+    def report_eliminated(self):
+        """
+        Report the nodes the graph compiler merged with an identical node or
+        left out because their outputs are not used.
+        """
+        if not self.metadata:
+            return
+
+        pruned = set()
+        merged = set()
+        for name, meta in self.metadata.items():
+            parent = meta.get('parent')
+            if meta.get('pruned'):
+                pruned.add(parent)
+            elif 'merged_with' in meta:
+                original = self.metadata.get(meta['merged_with'], {}).get('parent')
+                if parent and original and parent != original:
+                    merged.add(f"{parent} (same as {original})")
+
+        pruned.discard(None)
+        if pruned:
+            self.chartWidget.updateStatus(f"Not running unused {', '.join(sorted(pruned))}")
+        if merged:
+            self.chartWidget.updateStatus(f"Sharing results of {', '.join(sorted(merged))}")
+
     def openClicked(self):
         startDir = self.chart.filePath
         if startDir is None:
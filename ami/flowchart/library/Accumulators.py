@@ -116,36 +116,7 @@ class RollingBuffer(CtrlNode):
 
 try:
     from ami.flowchart.library.PythonEditorWidget import PythonEditorWidget
-    import tempfile
-    import importlib
-
-    class AccumulatorProc(object):
-
-        def __init__(self, text):
-            self.text = text
-            self.file = None
-            self.mod = None
-
-        def load(self):
-            self.file = tempfile.NamedTemporaryFile(mode='w', suffix='.py')
-            self.file.write(self.text)
-            self.file.flush()
-            spec = importlib.util.spec_from_file_location("module.name", self.file.name)
-            self.mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(self.mod)
-            self.accumulator = self.mod.Accumulator()
-
-        def __call__(self, res, *rest):
-            if self.file is None:
-                self.load()
-
-            return self.accumulator.reduction(res, *rest)
-
-        def res_factory(self, *args):
-            if self.file is None:
-                self.load()
-
-            return self.accumulator.reset(*args)
+    from ami.ops.accumulators import AccumulatorProc, ReduceByKeyProc
 
     class Accumulator(CtrlNode):
         """
@@ -196,28 +167,6 @@ class Accumulator():
                                   res_factory=proc.res_factory, reduction=proc)
             return node
 
-    class ReduceByKeyProc(object):
-
-        def __init__(self, text):
-            self.text = text
-            self.file = None
-            self.mod = None
-
-        def load(self):
-            self.file = tempfile.NamedTemporaryFile(mode='w', suffix='.py')
-            self.file.write(self.text)
-            self.file.flush()
-            spec = importlib.util.spec_from_file_location("module.name", self.file.name)
-            self.mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(self.mod)
-            self.reducebykey = self.mod.ReduceByKey()
-
-        def __call__(self, res, *rest):
-            if self.file is None:
-                self.load()
-
-            return self.reducebykey.reduction(res, *rest)
-
     class ReduceByKey(CtrlNode):
         """
         ReduceByKey
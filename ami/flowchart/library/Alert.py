@@ -2,7 +2,9 @@ from qtpy import QtWidgets, QtCore
 from amitypes import Array1d
 from ami.flowchart.library.common import CtrlNode
 from ami.flowchart.library.DisplayWidgets import AsyncFetcher
+import ami.ops.alert as ops
 import ami.graph_nodes as gn
+import functools
 
 
 class DialogWidget(QtWidgets.QWidget):
@@ -76,7 +78,7 @@ class ArrayThreshold(CtrlNode):
 
         nodes = [gn.Map(name=self.name()+"_operation",
                         inputs=inputs, outputs=map_outputs, **kwargs,
-                        func=lambda arr: len(arr[arr > threshold]) > count),
+                        func=functools.partial(ops.exceeds, threshold, count)),
                  gn.PickN(name=self.name()+"_pickN", inputs=map_outputs, outputs=outputs, **kwargs)]
 
         return nodes
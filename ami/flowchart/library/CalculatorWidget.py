@@ -40,6 +40,7 @@
 #
 #############################################################################
 
+import re
 from qtpy import QtWidgets, QtCore
 from ami.flowchart.library.common import generateUi
 
@@ -62,7 +63,7 @@ class CalculatorWidget(QtWidgets.QWidget):
     NumDigitButtons = 10
     sigStateChanged = QtCore.Signal(object, object, object)
 
-    def __init__(self, terms, parent=None, operation=""):
+    def __init__(self, terms, parent=None, operation="", fused=False):
         super().__init__(parent)
         self.terms = terms
 
@@ -71,6 +72,11 @@ class CalculatorWidget(QtWidgets.QWidget):
         self.display.setAlignment(QtCore.Qt.AlignRight)
         self.display.textChanged.connect(self.stateChanged)
 
+        self.fused = QtWidgets.QCheckBox("Fused", parent=self)
+        self.fused.setToolTip("Evaluate the expression reusing temporary arrays between events")
+        self.fused.setChecked(fused)
+        self.fused.toggled.connect(self.fusedChanged)
+
         self.digitButtons = []
 
         for i in range(CalculatorWidget.NumDigitButtons):
@@ -103,6 +109,7 @@ class CalculatorWidget(QtWidgets.QWidget):
         # mainLayout.setSizeConstraint(QtWidgets.QLayout.SetFixedSize)
 
         mainLayout.addWidget(self.display, 0, 0, 1, 7)
+        mainLayout.addWidget(self.fused, 1, 0, 1, 2)
         mainLayout.addWidget(self.backspaceButton, 1, 2)
         mainLayout.addWidget(self.clearButton, 1, 3)
 
@@ -158,6 +165,9 @@ class CalculatorWidget(QtWidgets.QWidget):
     def stateChanged(self, text):
         self.sigStateChanged.emit("operation", None, text)
 
+    def fusedChanged(self, checked):
+        self.sigStateChanged.emit("fused", None, checked)
+
     def digitClicked(self):
         clickedButton = self.sender()
         digitValue = int(clickedButton.text())
@@ -196,10 +206,11 @@ class CalculatorWidget(QtWidgets.QWidget):
         return button
 
     def saveState(self):
-        return {'operation': self.display.text()}
+        return {'operation': self.display.text(), 'fused': self.fused.isChecked()}
 
     def restoreState(self, state):
         self.display.setText(state['operation'])
+        self.fused.setChecked(state.get('fused', False))
 
 
 class FilterWidget(QtWidgets.QWidget):
@@ -398,12 +409,20 @@ def gen_filter_func(values, inputs, outputs):
 
     cond = sanitize_name(values['If']['condition'], space=False)
 
+    # the inputs are passed on without reading lazy source values (see ami.data.Lazy),
+    # except for the ones the conditions depend on
+    conditions = [sanitize_name(c['condition'], space=False) for k, c in values.items() if k != 'Else']
+    used = set(re.findall(r'\w+', ' '.join(conditions)))
+    resolved = ''.join("\t%s = resolve(%s)\n" % (i, i) for i in inputs if i in used)
+
     filter_func = """
+from ami.data import resolve
+
 def func(*args, **kwargs):
 \t(%s,) = args
-\tif %s:
+%s\tif %s:
 \t\treturn %s
-""" % (', '.join(inputs), cond,
+""" % (', '.join(inputs), resolved, cond,
        ', '.join(map(lambda x: sanitize_name(values['If'].get(x)),
                      outputs)))
 
@@ -434,6 +453,17 @@ def func(*args, **kwargs):
     return filter_func
 
 
+def gen_predicate_func(values, inputs):
+    cond = sanitize_name(values['If']['condition'], space=False)
+
+    predicate_func = """
+def func(%s):
+\treturn bool(%s)
+""" % (', '.join(inputs), cond)
+
+    return predicate_func
+
+
 def sanitize_name(name, space=True):
     if name:
         return name.translate(sanitizer_space if space else sanitizer)
@@ -4,6 +4,7 @@ from ami.flowchart.library.DisplayWidgets import ScalarWidget, ScatterWidget, Wa
 from ami.flowchart.library.common import CtrlNode
 from amitypes import Array1d, Array2d, MultiChannelWaveform
 from typing import Any
+import ami.ops.common as common
 import ami.graph_nodes as gn
 
 
@@ -212,7 +213,7 @@ class ScatterPlot(CtrlNode):
                                   inputs=inputs, outputs=buffer_output, **kwargs),
                  gn.Map(name=self.name()+"_operation",
                         inputs=buffer_output, outputs=outputs,
-                        func=lambda a: zip(*a),
+                        func=common.unzip,
                         **kwargs)]
         return nodes
 
@@ -250,7 +251,7 @@ class ScalarPlot(CtrlNode):
             node = [gn.RollingBuffer(name=self.name()+"_buffer", N=self.values['Num Points'],
                                      inputs=inputs, outputs=buffer_output, **kwargs),
                     gn.Map(name=self.name()+"_operation", inputs=buffer_output, outputs=outputs,
-                           func=lambda a: zip(*a), **kwargs)]
+                           func=common.unzip, **kwargs)]
         else:
             node = gn.RollingBuffer(name=self.name(), N=self.values['Num Points'],
                                     inputs=inputs, outputs=outputs, **kwargs)
@@ -322,7 +323,7 @@ class TimePlot(CtrlNode):
         nodes = [gn.RollingBuffer(name=self.name()+"_buffer", N=self.values['Num Points'],
                                   inputs=inputs, outputs=buffer_output, **kwargs),
                  gn.Map(name=self.name()+"_operation", inputs=buffer_output, outputs=outputs,
-                        func=lambda a: zip(*a), **kwargs)]
+                        func=common.unzip, **kwargs)]
         return nodes
 
     def plotMetadata(self, topics, terms, **kwargs):
@@ -14,7 +14,7 @@ from qtpy import QtGui, QtWidgets, QtCore
 from networkfox import modifiers
 from ami import LogConfig
 from ami.data import Deserializer, Heartbeat
-from ami.comm import ZMQ_TOPIC_DELIM
+from ami.comm import ViewOptions, view_topic, ZMQ_TOPIC_DELIM
 from ami.flowchart.library.WidgetGroup import generateUi
 from ami.flowchart.library.Editors import TraceEditor, HistEditor, \
     LineEditor, CircleEditor, RectEditor, camera, pixmapFromBase64, STYLE
@@ -30,9 +30,15 @@ class AsyncFetcher(QtCore.QThread):
 
     sig = QtCore.Signal()
 
-    def __init__(self, topics, terms, addr, parent=None, ratelimit=None):
+    def __init__(self, topics, terms, addr, parent=None, ratelimit=None, max_shape=None, max_rate=None):
         super(__class__, self).__init__(parent)
         self.addr = addr
+        # ask the manager for binned arrays and a limited update rate if the widget can't render more
+        if max_shape is None and max_rate is None:
+            self.options = None
+        else:
+            self.options = ViewOptions(shape=max_shape, rate=max_rate)
+        self.shapes = {}  # Original shape of binned views
         self.running = True
         self.ctx = zmq.Context()
         self.poller = zmq.Poller()
@@ -40,6 +46,7 @@ class AsyncFetcher(QtCore.QThread):
         self.timestamps = {}  # Heartbeats for each view_sub
         self.reply_queue = queue.Queue()
         self.heartbeat_timestamp = 0
+        self.heartbeat_sent = 0
         self.deserializer = Deserializer()
         self.update_topics(topics, terms)
 
@@ -48,11 +55,21 @@ class AsyncFetcher(QtCore.QThread):
         self.poller.register(self.recv_interrupt, zmq.POLLIN)
         self.send_interrupt = self.ctx.socket(zmq.REQ)
         self.send_interrupt.connect("inproc://fetcher_interrupt")
-        self.export = self.ctx.socket(zmq.SUB)
-        self.export.connect(addr.export)
-        self.export.setsockopt_string(zmq.SUBSCRIBE, "heartbeat")
-        self.view = self.ctx.socket(zmq.REQ)
-        self.view.connect(addr.view)
+        # if the manager publishes views subscribe to them, otherwise poll for them on each heartbeat
+        self.push = getattr(addr, 'view_pub', None) is not None
+        if self.push:
+            self.export = None
+            self.view = self.ctx.socket(zmq.SUB)
+            for sub_topic in self.view_subs:
+                self.view.setsockopt_string(zmq.SUBSCRIBE, sub_topic + ZMQ_TOPIC_DELIM)
+            self.view.connect(addr.view_pub)
+            self.poller.register(self.view, zmq.POLLIN)
+        else:
+            self.export = self.ctx.socket(zmq.SUB)
+            self.export.connect(addr.export)
+            self.export.setsockopt_string(zmq.SUBSCRIBE, "heartbeat")
+            self.view = self.ctx.socket(zmq.REQ)
+            self.view.connect(addr.view)
 
         if parent is not None:
             if ratelimit is None:
@@ -66,6 +83,13 @@ class AsyncFetcher(QtCore.QThread):
     def ready(self):
         return not self.reply_queue.empty()
 
+    def shape(self, name):
+        """
+        Returns the original shape of a view that the manager binned down, or
+        None if the view was sent at full resolution.
+        """
+        return self.shapes.get(self.topics.get(name))
+
     @property
     def reply(self):
         try:
@@ -84,15 +108,73 @@ class AsyncFetcher(QtCore.QThread):
 
         for term, name in terms.items():
             topic = topics[name]
-            sub_topic = "view:%s:%s" % (self.addr.name, topic)
+            sub_topic = view_topic(self.addr.name, topic, self.options)
             self.view_subs[sub_topic] = topic
             self.timestamps[topic] = Heartbeat()
             self.sub_views[topic] = sub_topic
 
+    def recv_view(self):
+        topic = self.view.recv_string()
+        topic = topic.rstrip('\0')
+        heartbeat = self.view.recv_pyobj()
+        reply = self.view.recv_serialized(self.deserializer, copy=False)
+
+        view_sub = self.view_subs[topic]
+
+        # binned views are sent with the original shape of the data
+        if type(heartbeat) is tuple:
+            heartbeat, self.shapes[view_sub] = heartbeat
+        else:
+            self.shapes.pop(view_sub, None)
+
+        if heartbeat is None or self.timestamps[view_sub] >= heartbeat:
+            return
+
+        self.data[view_sub] = reply
+        self.timestamps[view_sub] = heartbeat
+        # check if the data is ready
+        heartbeats = set(self.timestamps.values())  # this will remove duplicates. Happens for multi-inputs plots
+        num_heartbeats = len(heartbeats)
+        res = {}
+
+        if self.data.keys() == self.subs and num_heartbeats == 1:
+            for name, topic in self.topics.items():
+                res[name] = self.data[topic]
+
+        elif self.optional.issuperset(self.data.keys()):
+            for name, topic in self.topics.items():
+                if topic in self.data:
+                    res[name] = self.data[topic]
+
+        if res:
+            heartbeat = heartbeats.pop()
+            # put results on the reply queue
+            self.reply_queue.put((heartbeat.timestamp, res))
+            # send a signal that data is ready
+            self.sig.emit()
+
     def run(self):
+        if self.push:
+            self.run_push()
+        else:
+            self.run_poll()
+
+    def run_push(self):
+
+        while self.running:
+            for sock, flag in self.poller.poll():
+                if flag != zmq.POLLIN:
+                    continue
+
+                if sock is self.view:
+                    self.recv_view()
+                elif sock is self.recv_interrupt and self.recv_interrupt.recv_pyobj():
+                    return
+
+    def run_poll(self):
 
         while self.running:
-            topic = self.export.recv_string()
+            self.export.recv_string()  # topic
             graph = self.export.recv_string()
             heartbeat = self.export.recv_pyobj()
 
@@ -104,42 +186,17 @@ class AsyncFetcher(QtCore.QThread):
 
             self.heartbeat_timestamp = heartbeat.timestamp
 
+            # skip the heartbeats that come faster than the widget can render them
+            now = time.time()
+            if self.options is not None and now - self.heartbeat_sent < self.options.interval:
+                continue
+
+            self.heartbeat_sent = now
+
             for term, name in self.terms.items():
                 req = self.sub_views[self.topics[name]]
                 self.view.send_string(req, flags=zmq.NOBLOCK)
-
-                topic = self.view.recv_string()
-                topic = topic.rstrip('\0')
-                heartbeat = self.view.recv_pyobj()
-                reply = self.view.recv_serialized(self.deserializer, copy=False)
-
-                view_sub = self.view_subs[topic]
-
-                if heartbeat is None or self.timestamps[view_sub] >= heartbeat:
-                    continue
-
-                self.data[view_sub] = reply
-                self.timestamps[view_sub] = heartbeat
-                # check if the data is ready
-                heartbeats = set(self.timestamps.values())  # this will remove duplicates. Happens for multi-inputs plots
-                num_heartbeats = len(heartbeats)
-                res = {}
-
-                if self.data.keys() == self.subs and num_heartbeats == 1:
-                    for name, topic in self.topics.items():
-                        res[name] = self.data[topic]
-
-                elif self.optional.issuperset(self.data.keys()):
-                    for name, topic in self.topics.items():
-                        if topic in self.data:
-                            res[name] = self.data[topic]
-
-                if res:
-                    heartbeat = heartbeats.pop()
-                    # put results on the reply queue
-                    self.reply_queue.put((heartbeat.timestamp, res))
-                    # send a signal that data is ready
-                    self.sig.emit()
+                self.recv_view()
 
             try:
                 if self.recv_interrupt.recv_pyobj(flags=zmq.NOBLOCK):
@@ -153,7 +210,8 @@ class AsyncFetcher(QtCore.QThread):
         self.send_interrupt.send_pyobj(True)
         self.wait()
         self.poller.unregister(self.recv_interrupt)
-        self.export.close()
+        if self.export is not None:
+            self.export.close()
         self.view.close()
         self.ctx.destroy()
 
@@ -172,7 +230,9 @@ class PlotWidget(QtWidgets.QWidget):
 
         self.fetcher = None
         if addr:
-            self.fetcher = AsyncFetcher(topics, terms, addr, parent=self)
+            self.fetcher = AsyncFetcher(topics, terms, addr, parent=self,
+                                        max_shape=kwargs.get('max_shape', None),
+                                        max_rate=kwargs.get('max_rate', None))
             self.fetcher.start()
 
         self.layout = QtWidgets.QGridLayout()
@@ -587,6 +647,12 @@ class ImageWidget(PlotWidget):
                       ('Auto Levels', 'check', {'group': 'Histogram', 'checked': True}),
                       ('Log Scale', 'check', {'group': 'Histogram', 'checked': False})]
 
+        # there is no point in sending images with more pixels than the screen or faster than they are painted
+        screen = QtGui.QGuiApplication.primaryScreen()
+        if screen is not None:
+            kwargs.setdefault('max_shape', (screen.size().height(), screen.size().width()))
+        kwargs.setdefault('max_rate', 10)
+
         display = kwargs.pop("display", True)
         if display:
             uiTemplate.append(('Lock Aspect Ratio', 'check', {'group': 'Display', 'checked': True}))
@@ -603,6 +669,7 @@ class ImageWidget(PlotWidget):
         self.auto_levels = False
         self.ratio = 1 # Update if we happen to have detectors that do not have square pixels
         self.lock = True
+        self.scale = (1.0, 1.0)  # size of the displayed pixels (rows, columns) when the image is binned
 
         self.view = self.plot_view.getViewBox()
 
@@ -633,11 +700,11 @@ class ImageWidget(PlotWidget):
         pos = self.view.mapSceneToView(pos)
         if self.imageItem.image is not None:
             shape = self.imageItem.image.shape
-            i = int(pos.y())  # image is row-major
-            j = int(pos.x())  # image is row-major
+            i = int(pos.y() / self.scale[0])  # image is row-major
+            j = int(pos.x() / self.scale[1])  # image is row-major
             if 0 <= i < shape[0] and 0 <= j < shape[1]:
                 z = self.imageItem.image[i, j]
-                self.pixel_value.setText(f"x={j}, y={i}, z={z:.5g}")
+                self.pixel_value.setText(f"x={int(pos.x())}, y={int(pos.y())}, z={z:.5g}")
 
     def apply_clicked(self):
         if 'Display' in self.plot_attrs:
@@ -669,15 +736,25 @@ class ImageWidget(PlotWidget):
 
     def data_updated(self, data):
         for k, v in data.items():
+            scale = (1.0, 1.0)
+            shape = self.fetcher.shape(k) if self.fetcher else None
+            if shape is not None:
+                scale = (shape[0] / v.shape[0], shape[1] / v.shape[1])
             if self.flip:
                 v = np.flip(v)
             if self.log_scale_histogram:
                 v = np.log10(v)
             if self.rotate != 0:
                 v = np.rot90(v, self.rotate)
+                if self.rotate % 2:
+                    scale = scale[::-1]
 
             if v.any():
                 self.imageItem.setImage(v, autoLevels=self.auto_levels)
+                # stretch binned images back over the original pixel coordinates
+                if scale != self.scale:
+                    self.scale = scale
+                    self.imageItem.setTransform(QtGui.QTransform.fromScale(scale[1], scale[0]))
 
     def saveState(self):
         state = super().saveState()
@@ -708,6 +785,7 @@ class PixelDetWidget(ImageWidget):
         if ev.button() == QtCore.Qt.LeftButton:
             if self.imageItem.image is not None:
                 shape = self.imageItem.image.shape
+                shape = (shape[0] * self.scale[0], shape[1] * self.scale[1])
                 pos = self.view.mapSceneToView(ev.pos())
                 if 0 <= pos.x() <= shape[0] and 0 <= pos.y() <= shape[1]:
                     ev.accept()
@@ -759,6 +837,8 @@ class HistogramWidget(PlotWidget):
 class Histogram2DWidget(ImageWidget):
 
     def __init__(self, topics=None, terms=None, addr=None, parent=None, **kwargs):
+        # averaging bins would turn the counts into something else, so only the rate is limited
+        kwargs.setdefault('max_shape', None)
         super().__init__(topics, terms, addr, parent, display=False, axis=True, **kwargs)
 
         self.xbins = None
@@ -774,8 +854,8 @@ class Histogram2DWidget(ImageWidget):
         if self.imageItem.image is not None:
             shape = self.imageItem.image.shape
 
-            if 0 <= pos.x() <= shape[0] and \
-               0 <= pos.y() <= shape[1]:
+            if 0 <= pos.x() < shape[0] and \
+               0 <= pos.y() < shape[1]:
                 idxx = int(pos.x())
                 idxy = int(pos.y())
                 x = self.xbins[idxx]
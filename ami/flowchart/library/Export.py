@@ -2,11 +2,9 @@ from typing import Union, Any
 from qtpy import QtCore, QtWidgets
 from amitypes import Array1d, Array2d
 from ami.comm import GraphCommHandler
-from ami.data import TimestampConverter
 from ami.flowchart.library.common import CtrlNode
+from ami.ops.export import McastProc
 import ami.graph_nodes as gn
-import socket
-import struct
 import ipaddress
 
 
@@ -73,7 +71,7 @@ class ZMQWidget(QtWidgets.QLabel):
         topic_label = ""
 
         if addr:
-            topic_label = f"Address: {addr.view}\n"
+            topic_label = f"Address: {addr.view_pub or addr.view}\n"
 
         if terms:
             for term, name in terms.items():
@@ -104,35 +102,6 @@ class ZMQ(CtrlNode):
         return super().display(topics, terms, addr, win, ZMQWidget, **kwargs)
 
 
-class McastProc():
-    def __init__(self, grp, port):
-        self.mcast_grp_port = (grp, int(port))
-        self._socket = None
-        self.ts_converter = None
-
-    def __del__(self):
-        if self._socket is not None:
-            self._socket.close()
-            self._socket = None
-
-    def __call__(self, values):
-        if self._socket is None:
-            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-            self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 8)
-            self.ts_converter = TimestampConverter()
-
-        version = 0
-        validMask = 0
-
-        for data, eventid in sorted(values, key=lambda v: v[1]):
-            timestamp, pulseId = self.ts_converter.decode(eventid)
-            header = struct.pack('QQII', timestamp, pulseId, version, validMask)
-
-            self._socket.sendmsg((header, data), (), 0, self.mcast_grp_port)
-
-        return []
-
-
 class UDPMcast(CtrlNode):
 
     """
@@ -167,28 +136,8 @@ class UDPMcast(CtrlNode):
 
 
 try:
-    import caproto
-    import caproto.threading.client as ct
-
-    class CaputProc():
-
-        def __init__(self, **kwargs):
-            self.pvname = kwargs['pvname']
-            self.ctx = None
-            self.pv = None
-            self.wait = kwargs['wait']
-            self.timeout = kwargs['timeout']
-
-        def __call__(self, values):
-            if self.ctx is None:
-                self.ctx = ct.Context()
-                self.pv = self.ctx.get_pvs(self.pvname)[0]
-            try:
-                for value in sorted(values, key=lambda v: v[1]):
-                    self.pv.write(value, wait=self.wait, timeout=self.timeout)
-            except caproto._utils.CaprotoTimeoutError as e:
-                raise gn.AMIWarning(e)
-
+    import caproto  # noqa: F401
+    from ami.ops.export import CaputProc
 
     class Caput(CtrlNode):
 
@@ -223,25 +172,8 @@ except ImportError as e:
     print(e)
 
 try:
-    import p4p.client.thread as pct
-
-    class PvputProc():
-
-        def __init__(self, **kwargs):
-            self.pvname = kwargs['pvname']
-            self.ctx = None
-            self.wait = kwargs['wait']
-            self.timeout = kwargs['timeout']
-
-        def __call__(self, values):
-            if self.ctx is None:
-                self.ctx = pct.Context('pva')
-            try:
-                for value in sorted(values, key=lambda v: v[1]):
-                    self.ctx.put(self.pvname, value, wait=self.wait, timeout=self.timeout)
-            except TimeoutError:
-                raise gn.AMIWarning("pvput timeout error")
-
+    import p4p.client.thread  # noqa: F401
+    from ami.ops.export import PvputProc
 
     class Pvput(CtrlNode):
 
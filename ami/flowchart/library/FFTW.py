@@ -1,25 +1,10 @@
 from amitypes import Array1d, Array2d
 from ami.flowchart.Node import Node
+from ami.ops.fftw import FFTProc
 import ami.graph_nodes as gn
 import pyfftw
 
 
-class FFTProc():
-
-    def __init__(self, builder):
-        self.builder = builder
-        self.input_ = None
-        self.fft = None
-
-    def __call__(self, arr):
-        if self.fft is None:
-            self.input_ = pyfftw.empty_aligned(arr.shape, dtype=arr.dtype)
-            self.fft = self.builder(self.input_)
-
-        self.input_[:] = arr
-        return self.fft()
-
-
 class FFT(Node):
 
     """pyfftw.builders.fft"""
@@ -2,8 +2,11 @@ from typing import Union
 from amitypes import Array, Array1d, Array2d, Array3d
 from ami.flowchart.library.common import CtrlNode, GroupedNode
 from ami.flowchart.Node import Node
+import ami.ops.common as common
+import ami.ops.numpy as ops
 import ami.graph_nodes as gn
 import numpy as np
+import functools
 import os
 
 
@@ -22,7 +25,7 @@ class Sum(Node):
         })
 
     def to_operation(self, **kwargs):
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=lambda a: np.sum(a, dtype=np.float64))
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=ops.array_sum)
 
 
 class Binning(CtrlNode):
@@ -70,22 +73,14 @@ class Binning(CtrlNode):
         if not self.values['auto range']:
             range = (self.values['range min'], self.values['range max'])
 
-        def bin(arr, weights=None):
-            counts, bins = np.histogram(arr, bins=nbins, range=range, density=density, weights=weights)
-            return bins, counts
-
-        def reduction(res, *rest):
-            res[0] = rest[0]  # bins
-            res[1] = res[1] + rest[1]  # counts
-            return res
-
         node = [gn.Map(name=self.name()+"_map",
-                       inputs=inputs, outputs=map_outputs, func=bin, **kwargs),
+                       inputs=inputs, outputs=map_outputs,
+                       func=functools.partial(ops.histogram, nbins, range, density), **kwargs),
                 gn.Accumulator(name=self.name()+"_accumulated", inputs=map_outputs, outputs=accum_outputs,
-                               res_factory=lambda: [None, 0], reduction=reduction, **kwargs),
+                               res_factory=ops.histogram_res, reduction=ops.histogram_reduction, **kwargs),
                 gn.Map(name=self.name()+"_unzip",
                        inputs=accum_outputs, outputs=outputs,
-                       func=lambda count, bins_counts: (bins_counts[0], bins_counts[1]), **kwargs)]
+                       func=ops.unzip_histogram, **kwargs)]
         return node
 
 
@@ -138,30 +133,18 @@ class Binning2D(CtrlNode):
         density = self.values['density']
 
         if self.x_type == float and self.y_type == float:
-            def bin(x, y):
-                counts, xbins, ybins = np.histogram2d([x], [y], bins=[nxbins, nybins],
-                                                      range=[[xmin, xmax], [ymin, ymax]], density=density)
-                return xbins, ybins, counts
+            histogram2d = ops.histogram2d_scalar
         else:
-            def bin(x, y):
-                counts, xbins, ybins = np.histogram2d(x, y, bins=[nxbins, nybins],
-                                                      range=[[xmin, xmax], [ymin, ymax]], density=density)
-                return xbins, ybins, counts
-
-        def reduction(res, *rest):
-            res[0] = rest[0]  # xbins
-            res[1] = rest[1]  # ybins
-            res[2] = res[2] + rest[2]  # counts
-            return res
+            histogram2d = ops.histogram2d
+        bin = functools.partial(histogram2d, nxbins, nybins, [[xmin, xmax], [ymin, ymax]], density)
 
         node = [gn.Map(name=self.name()+"_map",
                        inputs=inputs, outputs=map_outputs, func=bin, **kwargs),
                 gn.Accumulator(name=self.name()+"_accumulated", inputs=map_outputs, outputs=accum_outputs,
-                               res_factory=lambda: [None, None, 0], reduction=reduction, **kwargs),
+                               res_factory=ops.histogram2d_res, reduction=ops.histogram2d_reduction, **kwargs),
                 gn.Map(name=self.name()+"_unzip",
                        inputs=accum_outputs, outputs=outputs,
-                       func=lambda count, bins_counts: (bins_counts[0], bins_counts[1], bins_counts[2]),
-                       **kwargs)]
+                       func=ops.unzip_histogram, **kwargs)]
         return node
 
 
@@ -183,16 +166,7 @@ class Split(CtrlNode):
         axis = self.values['axis']
         sections = len(kwargs['outputs'])
 
-        if axis == 0:
-            def split(arr):
-                splits = np.split(arr, sections, axis=axis)
-                return list(map(lambda a: a[0, :], splits))
-        elif axis == 1:
-            def split(arr):
-                splits = np.split(arr, sections, axis=axis)
-                return list(map(lambda a: a[:, 0], splits))
-
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=split)
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=functools.partial(ops.split, sections, axis))
 
 
 class Stack1d(CtrlNode):
@@ -214,10 +188,10 @@ class Stack1d(CtrlNode):
 
         if len(self.inputs()) > 1:
             node = gn.Map(name=self.name()+"_operation", **kwargs,
-                          func=lambda *arr: np.stack(arr, axis=axis))
+                          func=functools.partial(ops.stack, axis))
         else:
             node = gn.Map(name=self.name()+"_operation", **kwargs,
-                          func=lambda arr: np.stack(arr, axis=axis))
+                          func=functools.partial(np.stack, axis=axis))
 
         return node
 
@@ -241,10 +215,10 @@ class Stack2d(CtrlNode):
 
         if len(self.inputs()) > 1:
             node = gn.Map(name=self.name()+"_operation", **kwargs,
-                          func=lambda *arr: np.stack(arr, axis=axis))
+                          func=functools.partial(ops.stack, axis))
         else:
             node = gn.Map(name=self.name()+"_operation", **kwargs,
-                          func=lambda arr: np.stack(arr, axis=axis))
+                          func=functools.partial(np.stack, axis=axis))
 
         return node
 
@@ -266,12 +240,9 @@ class Projection(GroupedNode):
     def to_operation(self, **kwargs):
         axis = self.values['axis']
 
-        if len(kwargs['inputs']) == 1:
-            def func(arr):
-                return np.sum(arr, axis=axis)
-        else:
-            def func(*arr):
-                return list(map(lambda a: np.sum(a, axis=axis), arr))
+        func = functools.partial(np.sum, axis=axis)
+        if len(kwargs['inputs']) > 1:
+            func = functools.partial(common.apply_each, func)
 
         node = gn.Map(name=self.name()+"_operation", **kwargs, func=func)
         return node
@@ -298,12 +269,9 @@ class Take(GroupedNode):
         index = self.values['index']
         mode = self.values['mode']
 
-        if len(kwargs['inputs']) == 1:
-            def func(arr):
-                return np.take(arr, index, axis=axis, mode=mode)
-        else:
-            def func(*arr):
-                return list(map(lambda a: np.take(a, index, axis=axis, mode=mode), arr))
+        func = functools.partial(np.take, indices=index, axis=axis, mode=mode)
+        if len(kwargs['inputs']) > 1:
+            func = functools.partial(common.apply_each, func)
 
         return gn.Map(name=self.name()+"_operation", **kwargs, func=func)
 
@@ -343,10 +311,8 @@ class Polynomial(CtrlNode):
         c2 = self.values['c2']
         coeffs = [c0, c1, c2]
 
-        def poly(x):
-            return np.polynomial.polynomial.polyval(x, coeffs)
-
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=poly)
+        return gn.Map(name=self.name()+"_operation", **kwargs,
+                      func=functools.partial(np.polynomial.polynomial.polyval, c=coeffs))
 
 
 class Average(GroupedNode):
@@ -366,12 +332,9 @@ class Average(GroupedNode):
     def to_operation(self, **kwargs):
         axis = self.values['axis']
 
-        if len(kwargs['inputs']) == 1:
-            def func(arr):
-                return np.average(arr, axis=axis)
-        else:
-            def func(*arr):
-                return list(map(lambda a: np.average(a, axis=axis), arr))
+        func = functools.partial(np.average, axis=axis)
+        if len(kwargs['inputs']) > 1:
+            func = functools.partial(common.apply_each, func)
 
         return gn.Map(name=self.name()+"_operation", **kwargs, func=func)
 
@@ -390,12 +353,9 @@ class RMS(GroupedNode):
                          allowAddInput=True)
 
     def to_operation(self, **kwargs):
-        if len(kwargs['inputs']) == 1:
-            def func(arr):
-                return np.sqrt(np.mean(np.square(arr)))
-        else:
-            def func(*arr):
-                return list(map(lambda a: np.sqrt(np.mean(np.square(a))), arr))
+        func = ops.rms
+        if len(kwargs['inputs']) > 1:
+            func = functools.partial(common.apply_each, func)
 
         return gn.Map(name=self.name()+"_operation", **kwargs, func=func)
 
@@ -416,17 +376,12 @@ class TimeMeanRMS0D(CtrlNode):
                          global_op=True)
 
     def to_operation(self, inputs, outputs, **kwargs):
-        def func(arr):
-            mean = np.mean(arr)
-            rms = np.sqrt(np.mean(np.square(arr)))
-            return mean, rms
-
         accumulated_outputs = [self.name()+'_accumulated_events']
 
         nodes = [gn.PickN(name=self.name()+'_picked', N=self.values['N'],
                           inputs=inputs, outputs=accumulated_outputs, **kwargs),
                  gn.Map(name=self.name()+'_operation', inputs=accumulated_outputs, outputs=outputs,
-                        func=func, **kwargs)]
+                        func=ops.mean_rms, **kwargs)]
 
         return nodes
 
@@ -447,18 +402,12 @@ class TimeMeanRMS1D(CtrlNode):
                          global_op=True)
 
     def to_operation(self, inputs, outputs, **kwargs):
-        def func(arr):
-            mean = np.mean(arr, axis=0)
-            sq = list(map(np.square, arr.astype(np.float32)))
-            rms = np.sqrt(np.mean(sq, axis=0))
-            return mean, rms
-
         accumulated_outputs = [self.name()+'_accumulated_events']
 
         nodes = [gn.PickN(name=self.name()+'_picked', N=self.values['N'],
                           inputs=inputs, outputs=accumulated_outputs, **kwargs),
                  gn.Map(name=self.name()+'_operation', inputs=accumulated_outputs, outputs=outputs,
-                        func=func, **kwargs)]
+                        func=ops.mean_rms_events, **kwargs)]
 
         return nodes
 
@@ -479,18 +428,12 @@ class TimeMeanRMS2D(CtrlNode):
                          global_op=True)
 
     def to_operation(self, inputs, outputs, **kwargs):
-        def func(arr):
-            mean = np.mean(arr, axis=0)
-            sq = list(map(np.square, arr.astype(np.float32)))
-            rms = np.sqrt(np.mean(sq, axis=0))
-            return mean, rms
-
         accumulated_outputs = [self.name()+'_accumulated_events']
 
         nodes = [gn.PickN(name=self.name()+'_picked', N=self.values['N'],
                           inputs=inputs, outputs=accumulated_outputs, **kwargs),
                  gn.Map(name=self.name()+'_operation', inputs=accumulated_outputs, outputs=outputs,
-                        func=func, **kwargs)]
+                        func=ops.mean_rms_events, **kwargs)]
 
         return nodes
 
@@ -509,14 +452,7 @@ class HistMeanRMS(Node):
                                           'Stdev': {'io': 'out', 'ttype': float}})
 
     def to_operation(self, **kwargs):
-        def func(arr):
-            centers = np.arange(len(arr))
-            mean = np.average(centers, 0, arr)
-            var = np.average((centers-mean)**2, 0, arr)
-            std = np.sqrt(var)
-            return mean, std
-
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=func)
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=ops.hist_mean_rms)
 
 
 class Average0D(CtrlNode):
@@ -537,27 +473,20 @@ class Average0D(CtrlNode):
     def to_operation(self, inputs, outputs, **kwargs):
         accumulated_outputs = [self.name()+'_accumulated_counts', self.name()+'_accumulated_sum']
 
-        def avg(count, value):
-            return value/count
-
         if self.values['infinite']:
-            def reduction(res, *rest):
-                res += np.sum(rest, axis=0)
-                return res
-
             nodes = [gn.Accumulator(name=self.name()+"_accumulated",
                                     inputs=inputs, outputs=accumulated_outputs,
-                                    reduction=reduction, **kwargs),
+                                    reduction=common.accumulate_sum, **kwargs),
                      gn.Map(name=self.name()+"_map",
                             inputs=accumulated_outputs, outputs=outputs,
-                            func=avg, **kwargs)]
+                            func=common.average, **kwargs)]
         else:
             nodes = [gn.SumN(name=self.name()+"_accumulated",
                              inputs=inputs, outputs=accumulated_outputs,
                              N=self.values['N'], **kwargs),
                      gn.Map(name=self.name()+"_map",
                             inputs=accumulated_outputs, outputs=outputs,
-                            func=avg, **kwargs)]
+                            func=common.average, **kwargs)]
 
         return nodes
 
@@ -580,20 +509,13 @@ class Average1D(CtrlNode):
     def to_operation(self, inputs, outputs, **kwargs):
         accumulated_outputs = [self.name()+'_accumulated_counts', self.name()+'_accumulated_sum']
 
-        def avg(count, value):
-            return value/count
-
         if self.values['infinite']:
-            def reduction(res, *rest):
-                res += np.sum(rest, axis=0)
-                return res
-
             nodes = [gn.Accumulator(name=self.name()+"_accumulated",
                                     inputs=inputs, outputs=accumulated_outputs,
-                                    reduction=reduction, **kwargs),
+                                    reduction=common.accumulate_sum, **kwargs),
                      gn.Map(name=self.name()+"_map",
                             inputs=accumulated_outputs, outputs=outputs,
-                            func=avg, **kwargs)]
+                            func=common.average, **kwargs)]
 
         else:
             nodes = [gn.SumN(name=self.name()+"_accumulated",
@@ -601,7 +523,7 @@ class Average1D(CtrlNode):
                              N=self.values['N'], **kwargs),
                      gn.Map(name=self.name()+"_map",
                             inputs=accumulated_outputs, outputs=outputs,
-                            func=avg, **kwargs)]
+                            func=common.average, **kwargs)]
 
         return nodes
 
@@ -624,27 +546,20 @@ class Average2D(CtrlNode):
     def to_operation(self, inputs, outputs, **kwargs):
         accumulated_outputs = [self.name()+'_accumulated_counts', self.name()+'_accumulated_sum']
 
-        def avg(count, value):
-            return value/count
-
         if self.values['infinite']:
-            def reduction(res, *rest):
-                res += np.sum(rest, axis=0)
-                return res
-
             nodes = [gn.Accumulator(name=self.name()+"_accumulated",
                                     inputs=inputs, outputs=accumulated_outputs,
-                                    reduction=reduction, **kwargs),
+                                    reduction=common.accumulate_sum, **kwargs),
                      gn.Map(name=self.name()+"_map",
                             inputs=accumulated_outputs, outputs=outputs,
-                            func=avg, **kwargs)]
+                            func=common.average, **kwargs)]
         else:
             nodes = [gn.SumN(name=self.name()+"_accumulated",
                              inputs=inputs, outputs=accumulated_outputs,
                              N=self.values['N'], **kwargs),
                      gn.Map(name=self.name()+"_map",
                             inputs=accumulated_outputs, outputs=outputs,
-                            func=avg, **kwargs)]
+                            func=common.average, **kwargs)]
 
         return nodes
 
@@ -667,4 +582,5 @@ class LoadReference1D(CtrlNode):
         assert (os.path.exists(self.values['path']))
         assert (path.endswith('.csv'))
         arr = np.genfromtxt(path, delimiter=',', usecols=(0, 1), skip_header=1)
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=lambda: (arr[:, 0], arr[:, 1]))
+        return gn.Map(name=self.name()+"_operation", **kwargs,
+                      func=functools.partial(common.constant, (arr[:, 0], arr[:, 1])))
@@ -2,14 +2,18 @@ from typing import Union, Any
 from qtpy import QtCore, QtWidgets
 from amitypes import Array1d, Array2d, Array3d
 from ami.flowchart.library.common import CtrlNode, GroupedNode, generateUi
-from ami.flowchart.library.CalculatorWidget import CalculatorWidget, FilterWidget, gen_filter_func, sanitize_name
+from ami.flowchart.library.CalculatorWidget import CalculatorWidget, FilterWidget, gen_filter_func, \
+    gen_predicate_func, sanitize_name
+from ami.ops.editor import PythonEditorProc
+import ami.ops.common as common
+import ami.ops.operators as ops
 import ami.graph_nodes as gn
 import numpy as np
-import itertools
+import functools
+import re
 import collections
 
 
-
 class ConstantWidget(QtWidgets.QWidget):
 
     sigStateChanged = QtCore.Signal(object, object, object)
@@ -137,7 +141,7 @@ class Constant(CtrlNode):
            output = np.ones((args['m'], args['n']))
         elif fct == 'np.full':
            output = np.full((args['m'], args['n']), args['value'])
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=lambda: output)
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=functools.partial(common.constant, output))
 
 
 class Identity(GroupedNode):
@@ -154,7 +158,7 @@ class Identity(GroupedNode):
                          allowAddInput=True)
 
     def to_operation(self, **kwargs):
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=lambda *args: args)
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=common.identity)
 
 
 class MeanVsScan(CtrlNode):
@@ -208,59 +212,31 @@ class MeanVsScan(CtrlNode):
         reduce_outputs = [self.name()+'_reduce_count']
         mean_outputs = [self.name()+'_mean_outputs']
 
-        def values_array(*value_inputs):
-            return np.asarray(value_inputs)
-
-        def bin_func(k, v):
-            return np.digitize(k, bins), (v, 1)
-
-        def mean(d):
-            res = {bins[i]: [0]*n_values for i in range(0, bins.size)}
-            for k, v in d.items():
-                try:
-                    res[bins[k]] = v[0]/v[1]
-                except IndexError:
-                    pass
-            keys, values = zip(*sorted(res.items()))
-            return np.array(keys), np.array(values)
-        
-        def distribute_outputs(args):
-            """
-            Distribute the binned array elements to the corresponding outputs.
-
-            Inputs:
-                args[0]: bins
-                args[1]: mean_values (array_bin1, array_bin2, array_bin3, ...)
-            """
-            bins = args[0]
-            mean_values = np.atleast_2d(args[1].transpose())
-            return tuple([bins]) + tuple(mean_values)
-
         gnodes = [
             gn.Map(name=self.name()+'_array',
                    inputs = value_inputs,
                    outputs = value_array_outputs,
-                   func = values_array,
+                   func = common.values_array,
                    **kwargs),
             gn.Map(name = self.name()+'_map',
                    inputs = [inputs['Bin']] + value_array_outputs,
                    outputs = map_outputs,
-                   func = bin_func, 
+                   func = functools.partial(ops.digitize_count, bins),
                    **kwargs),
             gn.ReduceByKey(name = self.name()+'_reduce',
                            inputs = map_outputs,
                            outputs = reduce_outputs,
-                           reduction = lambda cv, v: (cv[0]+v[0], cv[1]+v[1]),
+                           reduction = ops.sum_counts,
                            **kwargs),
             gn.Map(name=self.name()+'_mean',
                    inputs = reduce_outputs,
                    outputs = mean_outputs,
-                   func = mean,
+                   func = functools.partial(ops.binned_means, bins, n_values),
                    **kwargs),
             gn.Map(name = self.name()+'_distribute_outputs',
                    inputs = mean_outputs,
                    outputs = outputs,
-                   func = distribute_outputs,
+                   func = ops.distribute_outputs,
                    **kwargs)
         ]
         return gnodes
@@ -273,53 +249,31 @@ class MeanVsScan(CtrlNode):
         reduce_outputs = [self.name()+'_reduce_count']
         mean_outputs = [self.name()+'_mean_outputs']
 
-        def values_array(*value_inputs):
-            return np.asarray(value_inputs)
-
-        def mean(d):
-            res = {}
-            for k, v in d.items():
-                res[k] = v[0]/v[1]
-            keys, values = zip(*sorted(res.items()))
-            return np.array(keys), np.array(values)
-
-        def distribute_outputs(args):
-            """
-            Distribute the binned array elements to the corresponding outputs.
-
-            Inputs:
-                args[0]: bins
-                args[1]: mean_values (array_bin1, array_bin2, array_bin3, ...)
-            """
-            bins = args[0]
-            mean_values = np.atleast_2d(args[1].transpose())
-            return tuple([bins]) + tuple(mean_values)
-
         gnodes = [
             gn.Map(name=self.name()+'_array',
                    inputs=value_inputs,
                    outputs=value_array_outputs,
-                   func=values_array,
+                   func=common.values_array,
                    **kwargs),
             gn.Map(name=self.name()+'_map',
                    inputs=value_array_outputs,
                    outputs=map_outputs,
-                   func=lambda a: (a, 1),
+                   func=ops.count,
                    **kwargs),
             gn.ReduceByKey(name=self.name()+'_reduce',
                            inputs=[inputs['Bin']] + map_outputs,
                            outputs=reduce_outputs,
-                           reduction=lambda cv, v: (cv[0]+v[0], cv[1]+v[1]),
+                           reduction=ops.sum_counts,
                            **kwargs),
             gn.Map(name=self.name()+'_mean',
                    inputs=reduce_outputs,
                    outputs=mean_outputs,
-                   func=mean,
+                   func=ops.means,
                    **kwargs),
             gn.Map(name=self.name()+'_distribute_outputs',
                    inputs=mean_outputs,
                    outputs=outputs,
-                   func=distribute_outputs,
+                   func=ops.distribute_outputs,
                    **kwargs)
         ]
         return gnodes
@@ -357,54 +311,26 @@ class MeanWaveformVsScan(CtrlNode):
             map_outputs = [self.name()+'_bin', self.name()+'_map_count']
             reduce_outputs = [self.name()+'_reduce_count']
 
-            def func(k, v):
-                return np.digitize(k, bins), (v, 1)
-
-            def mean(d):
-                res = {}
-                for k, v in d.items():
-                    try:
-                        res[bins[k]] = v[0]/v[1]
-                    except IndexError:
-                        pass
-
-                missing_keys = set(bins).difference(res.keys())
-                k, v = d.popitem()
-                for k in missing_keys:
-                    res[k] = np.zeros(v[0].shape)
-
-                keys, values = zip(*sorted(res.items()))
-                stack = np.stack(values, axis=1)
-                return np.arange(0, stack.shape[0]), np.array(keys), stack
-
             nodes = [
                 gn.Map(name=self.name()+'_map', inputs=inputs, outputs=map_outputs,
-                       func=func, **kwargs),
+                       func=functools.partial(ops.digitize_count, bins), **kwargs),
                 gn.ReduceByKey(name=self.name()+'_reduce',
                                inputs=map_outputs, outputs=reduce_outputs,
-                               reduction=lambda cv, v: (cv[0]+v[0], cv[1]+v[1]), **kwargs),
-                gn.Map(name=self.name()+'_mean', inputs=reduce_outputs, outputs=outputs, func=mean,
-                       **kwargs)
+                               reduction=ops.sum_counts, **kwargs),
+                gn.Map(name=self.name()+'_mean', inputs=reduce_outputs, outputs=outputs,
+                       func=functools.partial(ops.binned_mean_waveforms, bins), **kwargs)
             ]
         else:
             map_outputs = [self.name()+'_map_count']
             reduce_outputs = [self.name()+'_reduce_count']
 
-            def mean(d):
-                res = {}
-                for k, v in d.items():
-                    res[k] = v[0]/v[1]
-                keys, values = zip(*sorted(res.items()))
-                stack = np.stack(values, axis=1)
-                return np.arange(0, stack.shape[0]), np.array(keys), stack
-
             nodes = [
                 gn.Map(name=self.name()+'_map', inputs=[inputs['Value']], outputs=map_outputs,
-                       func=lambda a: (a, 1), **kwargs),
+                       func=ops.count, **kwargs),
                 gn.ReduceByKey(name=self.name()+'_reduce',
                                inputs=[inputs['Bin']]+map_outputs, outputs=reduce_outputs,
-                               reduction=lambda cv, v: (cv[0]+v[0], cv[1]+v[1]), **kwargs),
-                gn.Map(name=self.name()+'_mean', inputs=reduce_outputs, outputs=outputs, func=mean,
+                               reduction=ops.sum_counts, **kwargs),
+                gn.Map(name=self.name()+'_mean', inputs=reduce_outputs, outputs=outputs, func=ops.mean_waveforms,
                        **kwargs)
             ]
 
@@ -439,10 +365,6 @@ class StatsVsScan(CtrlNode):
     def to_operation(self, inputs, outputs, **kwargs):
         outputs = self.output_vars()
 
-        def reduction(cv, v):
-            cv.extend(v)
-            return cv
-
         if self.values['binned']:
             bins = np.histogram_bin_edges(np.arange(self.values['min'], self.values['max']),
                                           bins=self.values['bins'],
@@ -450,52 +372,27 @@ class StatsVsScan(CtrlNode):
             map_outputs = [self.name()+'_bin', self.name()+'_map_count']
             reduce_outputs = [self.name()+'_reduce_count']
 
-            def func(k, v):
-                return np.digitize(k, bins), [v]
-
-            def stats(d):
-                res = {bins[i]: (0, 0, 0) for i in range(0, bins.size)}
-                for k, v in d.items():
-                    try:
-                        stddev = np.std(v)
-                        res[bins[k]] = (np.mean(v), stddev, stddev/np.sqrt(len(v)))
-                    except IndexError:
-                        pass
-
-                keys, values = zip(*sorted(res.items()))
-                mean, stddev, error = zip(*values)
-                return np.array(keys), np.array(mean), np.array(stddev), np.array(error)
-
             nodes = [
                 gn.Map(name=self.name()+'_map', inputs=inputs, outputs=map_outputs,
-                       func=func, **kwargs),
+                       func=functools.partial(ops.digitize_list, bins), **kwargs),
                 gn.ReduceByKey(name=self.name()+'_reduce',
                                inputs=map_outputs, outputs=reduce_outputs,
-                               reduction=reduction, **kwargs),
-                gn.Map(name=self.name()+'_stats', inputs=reduce_outputs, outputs=outputs, func=stats,
-                       **kwargs)
+                               reduction=ops.extend, **kwargs),
+                gn.Map(name=self.name()+'_stats', inputs=reduce_outputs, outputs=outputs,
+                       func=functools.partial(ops.binned_stats, bins), **kwargs)
             ]
         else:
             map_outputs = [self.name()+'_map_count']
             reduce_outputs = [self.name()+'_reduce_count']
 
-            def stats(d):
-                res = {}
-                for k, v in d.items():
-                    stddev = np.std(v)
-                    res[k] = (np.mean(v), stddev, stddev/np.sqrt(len(v)))
-                keys, values = zip(*sorted(res.items()))
-                mean, stddev, error = zip(*values)
-                return np.array(keys), np.array(mean), np.array(stddev), np.array(error)
-
             nodes = [
                 gn.Map(name=self.name()+'_map', inputs=[inputs['Value']], outputs=map_outputs,
-                       func=lambda a: [a], **kwargs),
+                       func=ops.listify, **kwargs),
                 gn.ReduceByKey(name=self.name()+'_reduce',
                                inputs=[inputs['Bin']]+map_outputs, outputs=reduce_outputs,
-                               reduction=reduction,
+                               reduction=ops.extend,
                                **kwargs),
-                gn.Map(name=self.name()+'_stats', inputs=reduce_outputs, outputs=outputs, func=stats,
+                gn.Map(name=self.name()+'_stats', inputs=reduce_outputs, outputs=outputs, func=ops.stats,
                        **kwargs)
             ]
 
@@ -528,37 +425,12 @@ class Combinations(CtrlNode):
     def to_operation(self, **kwargs):
         length = self.values['length']
 
-        def func(*args):
-            r = list(map(np.array, zip(*itertools.combinations(*args, length))))
-            if r:
-                return r
-            else:
-                return [np.array([])]*length
-
-        return gn.Map(name=self.name()+"_operation", func=func, **kwargs)
+        return gn.Map(name=self.name()+"_operation", func=functools.partial(ops.combinations, length), **kwargs)
 
 
 try:
-    import sympy
-
-    class CalcProc():
-
-        def __init__(self, params):
-            self.params = params
-            self.func = None
-
-        def __call__(self, *args, **kwargs):
-            # note: args get passed in order of input terminals on node from top to bottom
-            # sympy symbols need to be defined in same order for this to work correctly
-            if self.func is None:
-                self.func = sympy.lambdify(**self.params, modules=["numpy", "scipy"])
-
-            args = list(args)
-            for idx, arg in enumerate(args):
-                if type(arg) is np.ndarray:
-                    args[idx] = arg.astype(np.float64, copy=False)
-
-            return self.func(*args, **kwargs)
+    import sympy  # noqa: F401
+    from ami.ops.operators import CalcProc
 
     class Calculator(CtrlNode):
         """
@@ -574,14 +446,14 @@ try:
                                         'Out': {'io': 'out', 'ttype': Any}},
                              allowAddInput=True)
 
-            self.values = {'operation': ''}
+            self.values = {'operation': '', 'fused': False}
 
         def isChanged(self, restore_ctrl, restore_widget):
             return restore_widget
 
         def display(self, topics, terms, addr, win, **kwargs):
             if self.widget is None:
-                self.widget = CalculatorWidget(terms, win, self.values['operation'])
+                self.widget = CalculatorWidget(terms, win, self.values['operation'], self.values.get('fused', False))
                 self.widget.sigStateChanged.connect(self.state_changed)
 
             return self.widget
@@ -599,14 +471,29 @@ try:
             params = {'args': args[::-1],
                       'expr': expr}
 
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=CalcProc(params))
+            # convert the inputs in separate pure nodes, so that an input feeding several calculators is only
+            # converted once per event (optional inputs are left to CalcProc)
+            outputs = kwargs.pop('outputs')
+            inputs = []
+            nodes = []
+            for arg in kwargs.pop('inputs').values():
+                if type(arg) is str:
+                    converted = self.name()+"_"+sanitize_name(arg)+"_float64"
+                    nodes.append(gn.Map(name=converted+"_operation", inputs=[arg], outputs=[converted],
+                                        func=gn.AsType(np.float64), pure=True, **kwargs))
+                    arg = converted
+                inputs.append(arg)
+
+            nodes.append(gn.Map(name=self.name()+"_operation", inputs=inputs, outputs=outputs, **kwargs,
+                                func=CalcProc(params, self.values.get('fused', False)), pure=True))
+            return nodes
 
 except ImportError as e:
     print(e)
 
 
 try:
-    from ami.flowchart.library.PythonEditorWidget import PythonEditorWidget, PythonEditorProc
+    from ami.flowchart.library.PythonEditorWidget import PythonEditorWidget
 
     class PythonEditor(CtrlNode):
         """
@@ -754,14 +641,22 @@ class EventProcessor():
 
         def to_operation(self, **kwargs):
             values = self.values
-            inputs = list(self.input_vars().values())
+            names = list(self.input_vars().values())
+            inputs = list(map(sanitize_name, names))
             outputs = list(self.output_vars())
 
-            for idx, inp in enumerate(inputs):
-                inputs[idx] = sanitize_name(inp)
+            branch = values.get('If', {})
+            if len(values) == 1 and all(branch.get(output) in names for output in outputs):
+                # a single condition passing inputs on is a predicate, which skips everything depending on it at once
+                used = set(re.findall(r'\w+', sanitize_name(branch['condition'], space=False)))
+                condition_needs = [name for inp, name in zip(inputs, names) if inp in used]
+                func = gen_predicate_func(values, [inp for inp in inputs if inp in used])
+                kwargs['inputs'] = [branch[output] for output in outputs]
+                return gn.Predicate(name=self.name()+"_operation", condition_needs=condition_needs, **kwargs,
+                                    func=PythonEditorProc(func))
 
             func = gen_filter_func(values, inputs, outputs)
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=PythonEditorProc(func))
+            return gn.Map(name=self.name()+"_operation", **kwargs, func=PythonEditorProc(func), lazy=True)
 
 except ImportError as e:
     print(e)
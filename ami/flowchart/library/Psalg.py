@@ -2,10 +2,14 @@ from qtpy import QtWidgets
 from amitypes import DataSource, Detector, Array1d, Array2d, Array3d
 from ami.flowchart.Node import Node, NodeGraphicsItem
 from ami.flowchart.Units import ureg
-from ami.flowchart.library.common import CtrlNode
+from ami.flowchart.library.common import CtrlNode, SAMPLING_TEMPLATE, sampling
 from ami.flowchart.library.Editors import ChannelEditor
+from ami.ops.psalg import ImageAssemblyProc
+import ami.ops.psalg as ops
+import ami.ops.common as common
 import ami.graph_nodes as gn
 import numpy as np
+import functools
 
 try:
     import logging
@@ -15,7 +19,7 @@ except ImportError as e:
     print(e)
 
 try:
-    import constFracDiscrim as cfd
+    import constFracDiscrim  # noqa: F401
 
     class CFD(CtrlNode):
 
@@ -47,10 +51,9 @@ try:
             threshold = self.values['threshold']
             fraction = self.values['fraction']
 
-            def cfd_func(waveform):
-                return cfd.cfd(sampleInterval, horpos, gain, offset, waveform, delay, walk, threshold, fraction)
-
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=cfd_func)
+            return gn.Map(name=self.name()+"_operation", **kwargs,
+                          func=functools.partial(ops.constant_fraction, sampleInterval, horpos, gain, offset,
+                                                 delay, walk, threshold, fraction))
 
 except ImportError as e:
     print(e)
@@ -99,31 +102,10 @@ try:
             cfdpars['paramsCFD'] = paramsCFD
             wfpeaks = psWFPeaks.WFPeaks(**cfdpars)
 
-            def peakFinder(wts, wfs):
-                peaks = wfpeaks(wfs, wts)
-                return peaks
-
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=peakFinder)
-
-    import psana.hexanode.DLDProcessor as psfDLD
-
-    class DLDProc():
-
-        def __init__(self, **params):
-            self.params = params
-            self.proc = None
+            return gn.Map(name=self.name()+"_operation", **kwargs, func=functools.partial(ops.find_peaks, wfpeaks))
 
-        def __call__(self, nev, nhits, pktsec, calib):
-            if self.params['consts'] != calib:
-                self.params['consts'] = calib
-                self.proc = psfDLD.DLDProcessor(**self.params)
-
-            r = self.proc.xyrt_list(nev, nhits, pktsec)
-            if r:
-                x, y, r, t = zip(*r)
-                return (np.array(x), np.array(y), np.array(r), np.array(t))
-            else:
-                return (np.array([]), np.array([]), np.array([]), np.array([]))
+    import psana.hexanode.DLDProcessor  # noqa: F401
+    from ami.ops.psalg import DLDProc
 
     class Hexanode(CtrlNode):
 
@@ -134,7 +116,7 @@ try:
         nodeName = "Hexanode"
         uiTemplate = [('num chans', 'combo', {'values': ["5", "7"]}),
                       ('num hits', 'intSpin', {'value': 16, 'min': 1}),
-                      ('verbose', 'check', {'checked': False})]
+                      ('verbose', 'check', {'checked': False})] + SAMPLING_TEMPLATE
 
         def __init__(self, name):
             super().__init__(name, terminals={'Event Number': {'io': 'in', 'ttype': float},
@@ -152,7 +134,8 @@ try:
                        'verbose': self.values['verbose'],
                        'consts': None}
 
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=DLDProc(**dldpars))
+            return gn.Map(name=self.name()+"_operation", **kwargs, func=DLDProc(**dldpars),
+                          sampling=sampling(self.values))
 
     import psana.hexanode.HitFinder as psfHitFinder
 
@@ -183,48 +166,14 @@ try:
         def to_operation(self, **kwargs):
             HF = psfHitFinder.HitFinder(self.values)
 
-            def func(nhits, pktsec):
-                HF.FindHits(pktsec[4, :nhits[4]],
-                            pktsec[0, :nhits[0]],
-                            pktsec[1, :nhits[1]],
-                            pktsec[2, :nhits[2]],
-                            pktsec[3, :nhits[3]])
-                return HF.GetXYT()
-
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=func)
+            return gn.Map(name=self.name()+"_operation", **kwargs, func=functools.partial(ops.find_hits, HF))
 
 except ImportError as e:
     print(e)
 
 try:
-    import psana.xtcav.LasingOnCharacterization as psLOC
-
-    class LOCProc():
-
-        def __init__(self, **params):
-            self.params = params
-            self.proc = None
-            self.dets = None
-            self.src_key = 0
-
-        def __call__(self, src, cam, pars):
-            time = None
-            power = None
-            agreement = None
-            pulse = None
-
-            if self.proc is None or self.src_key != src.key:
-                if src.cfg['type'] == 'psana':
-                    self.src_key = src.key
-                    self.dets = psLOC.setDetectors(src.run, camera=cam.det, xtcavpars=pars.det)
-                    self.proc = psLOC.LasingOnCharacterization(self.params, src.run, self.dets)
-                else:
-                    raise NotImplementedError("XTCAVLasingOn does not support the %s source type!" % src.cfg['type'])
-
-            if self.proc.processEvent(src.evt):
-                time, power, agreement, pulse = self.proc.resultsProcessImage()
-
-            return time, power, agreement, pulse
+    import psana.xtcav.LasingOnCharacterization  # noqa: F401
+    from ami.ops.psalg import LOCProc
 
     class XTCAVLasingOn(CtrlNode):
 
@@ -239,7 +188,7 @@ try:
                       ('roi fraction', 'doubleSpin', {'value': 0.001, 'min': 0, 'max': 1}),
                       ('island split method',  'combo', {'values': ["scipyLabel", "contourLabel"]}),
                       ('island split par1', 'doubleSpin', {'value': 3.0}),
-                      ('island split par2', 'doubleSpin', {'value': 5.0})]
+                      ('island split par2', 'doubleSpin', {'value': 5.0})] + SAMPLING_TEMPLATE
 
         def __init__(self, name):
             super().__init__(name, terminals={'src': {'io': 'in', 'ttype': DataSource},
@@ -259,13 +208,15 @@ try:
                        'island_split_par1': self.values['island split par1'],
                        'island_split_par2': self.values['island split par2']}
 
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=LOCProc(**locpars))
+            return gn.Map(name=self.name()+"_operation", **kwargs, func=LOCProc(**locpars),
+                          sampling=sampling(self.values))
 
 except ImportError as e:
     print(e)
 
 try:
-    from numba import jit
+    import numba  # noqa: F401
+    from ami.ops.psalg import PeakFinder1DProc
 
     class PeakFinder1D(CtrlNode):
 
@@ -286,56 +237,15 @@ try:
             threshold_lo = self.values['threshold lo']
             threshold_hi = self.values['threshold hi']
 
-            @jit(nopython=True)
-            def peakfinder1d(waveform):
-                centroids = []
-                widths = []
-
-                for i in range(1, waveform.shape[0]-1):
-                    if waveform[i] < threshold_hi:
-                        continue
-
-                    weighted_sum = 0
-                    weights = 0
-
-                    left = i - 1
-                    right = i + 1
-
-                    peak = waveform[i]
-
-                    left_found = False
-                    while threshold_lo < waveform[left] <= peak:
-                        left_found = True
-                        weighted_sum += waveform[left]*left
-                        weights += waveform[left]
-                        left -= 1
-                        if left < 0:
-                            break
-
-                    right_found = False
-                    while threshold_lo < waveform[right] <= peak:
-                        right_found = True
-                        weighted_sum += waveform[right]*right
-                        weights += waveform[right]
-                        right += 1
-                        if right > waveform.shape[0] - 1:
-                            break
-
-                    if left_found and right_found:
-                        weighted_sum += peak*i
-                        weights += peak
-                        centroids.append(weighted_sum/weights)
-                        widths.append(right-left-1)
-
-                return np.array(centroids), np.array(widths)
-
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=peakfinder1d)
+            return gn.Map(name=self.name()+"_operation", **kwargs,
+                          func=PeakFinder1DProc(threshold_lo, threshold_hi))
 
 except ImportError as e:
     print(e)
 
 try:
-    from psalg_ext import peak_finder_algos
+    from psalg_ext import peak_finder_algos  # noqa: F401
+    from ami.ops.psalg import PeakfinderAlgos
 
     peak_attrs = ['seg', 'row', 'col', 'npix', 'amp_max', 'amp_tot',
                   'row_cgrav', 'col_cgrav', 'row_sigma', 'col_sigma',
@@ -364,28 +274,6 @@ try:
             self.node.addTerminal(action.attr, io='out', ttype=Array1d, removable=True)
             self.buildMenu(reset=True)
 
-    class PeakfinderAlgos():
-
-        def __init__(self, constructor_params={}, call_params={}, outputs=[]):
-            self.constructor_params = constructor_params
-            self.call_params = call_params
-            self.outputs = outputs
-            self.proc = None
-
-        def __call__(self, img):
-            if self.proc is None:
-                self.proc = peak_finder_algos(pbits=0)
-                self.proc.set_peak_selection_parameters(**self.constructor_params)
-
-            mask = np.ones(img.shape, dtype=np.uint16)
-            peaks = self.proc.peak_finder_v4r3_d2(img, mask, **self.call_params)
-
-            outputs = []
-            for output in self.outputs:
-                outputs.append(np.array(list(map(lambda peak: getattr(peak, output), peaks))))
-
-            return outputs
-
     class PeakFinderV4R3(CtrlNode):
 
         """
@@ -403,7 +291,7 @@ try:
                       ('thr high', 'doubleSpin', {'value': 100}),
                       ('rank', 'doubleSpin', {'value': 2}),
                       ('r0', 'doubleSpin', {'value': 4}),
-                      ('dr', 'doubleSpin', {'value': 0.05})]
+                      ('dr', 'doubleSpin', {'value': 0.05})] + SAMPLING_TEMPLATE
 
         def __init__(self, name):
             super().__init__(name, terminals={'Image': {'io': 'in', 'ttype': Array2d},
@@ -433,7 +321,8 @@ try:
                            'dr': self.values['dr']}
 
             node = gn.Map(name=self.name()+"_operation", **kwargs,
-                          func=PeakfinderAlgos(constructor_params, call_params, list(self.outputs().keys())))
+                          func=PeakfinderAlgos(constructor_params, call_params, list(self.outputs().keys())),
+                          sampling=sampling(self.values))
 
             return node
 
@@ -442,27 +331,8 @@ except ImportError as e:
 
 
 try:
-    from psana.pyalgos.generic import edgefinder
-
-    class EdgeFinderProc():
-
-        def __init__(self, calibconsts={}):
-            self.calibconsts = calibconsts
-            self.proc = None
-
-        def __call__(self, image, iir, calib):
-
-            if self.calibconsts.keys() != calib.keys():
-                self.calibconsts = calib
-                self.proc = edgefinder.EdgeFinder(self.calibconsts)
-            elif all(np.array_equal(self.calibconsts[key], calib[key]) for key in calib):
-                self.calibconsts = calib
-                self.proc = edgefinder.EdgeFinder(self.calibconsts)
-
-            r = self.proc(image, iir)
-            if r:
-                return r.edge, r.fwhm, r.amplitude, r.amplitude_next, r.ref_amplitude
-            return np.nan, np.nan, np.nan, np.nan, np.nan
+    from psana.pyalgos.generic import edgefinder  # noqa: F401
+    from ami.ops.psalg import EdgeFinderProc
 
     class EdgeFinder(Node):
 
@@ -490,41 +360,10 @@ except ImportError as e:
 
 
 try:
-    from psana.detector.mask_algos import MaskAlgos
+    from psana.detector.mask_algos import MaskAlgos  # noqa: F401
     from psana.detector.NDArrUtils import info_ndarr
     from psana.pscalib.calib.NDArrIO import load_txt
-
-    class MaskProd():
-
-        def __init__(self, **kwa):
-            logger.info('MaskProd.__init__ kwa: %s' % str(kwa))
-            self.calibconsts = kwa.pop('calibconsts', {})
-            self.kwa = kwa
-            self.mask = None  # np.nan
-
-        def __call__(self, calib):
-            """ call frequency ~1Hz
-            """
-            logger.debug('MaskProd.__call__ : %s' % self.__call__.__doc__.rstrip())
-
-            if self.calibconsts.keys() != calib.keys():
-                self.calibconsts = calib
-
-                logger.info('MaskProd.__call__: calibconsts.keys(): %s' % str(self.calibconsts.keys()))
-                data_and_meta = self.calibconsts.get('pixel_status', None)
-                self.data, self.meta = (np.nan, None) if data_and_meta is None else data_and_meta
-                logger.debug('pixel_status meta: %s' % str(self.meta))
-                logger.debug('pixel_status data: %s' % str(self.data))
-
-                o = MaskAlgos(self.calibconsts)
-                logger.info('MaskProd.__call__: create mask_comb with pars: %s' % str(self.kwa))
-                self.mask = o.mask_comb(**self.kwa)
-                logger.debug(info_ndarr(self.mask, 'mask_comb:'))
-
-            return (None, None) if self.mask is None else\
-                   (self.mask, None) if self.mask.ndim == 2 else\
-                   (None, self.mask) if self.mask.ndim == 3 else\
-                   (None, None)
+    from ami.ops.psalg import MaskProd
 
     class Mask(CtrlNode):
         """ psana Mask """
@@ -617,89 +456,16 @@ try:
             logger.debug('to_operation - at click on Apply')
             pars = {'calibconsts': {}}
             pars.update(self.dict_mask_pars_from_values())
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=MaskProd(**pars))
+            proc = gn.RunCache(MaskProd(**pars))
+            return gn.Map(name=self.name()+"_operation", **kwargs, func=proc, begin_run=proc.begin_run)
 
 except ImportError as e:
     print(e)
 
 
 try:
-    from psana.pscalib.geometry.GeometryAccess import GeometryAccess, img_from_pixel_arrays
-    import os
-
-    class GeometryProd():
-
-        def __init__(self, **kwa):
-            logger.info('GeometryProd.__init__ kwa: %s' % str(kwa))
-            self.calibconsts = kwa.pop('calibconsts', {})
-            self.kwa = kwa
-            self.geofname = None
-            self.resp = (None, None, None)
-
-        def __call__(self, calib, arr3d=None):  # mask2d=None):
-            """ called frequency ~1 Hz
-            """
-            logger.debug('GeometryProd.kwa: %s' % str(self.kwa))
-
-            self.do_load_geo = 0
-
-            geofname = self.kwa.get('geofname', '')
-            if geofname and (geofname != self.geofname):
-                self.geofname = geofname
-                if os.path.exists(geofname):
-                    self.do_load_geo = 1
-                    logger.info('GeometryProd.__call__ load geometry from file "%s"' % geofname)
-
-            elif self.calibconsts.keys() != calib.keys():
-                self.calibconsts = calib
-                self.do_load_geo = 2
-
-                logger.info('GeometryProd.__call__: calibconsts.keys(): %s' % str(self.calibconsts.keys()))
-                data_and_meta = self.calibconsts.get('geometry', None)
-                self.data, self.meta = (None, None) if data_and_meta is None else data_and_meta
-                logger.info('geometry meta: %s' % str(self.meta))
-                logger.info('geometry data: %s' % str(self.data))
-                logger.info('GeometryProd.kwa: %s' % str(self.kwa))
-
-            if self.do_load_geo > 0:  # =0 - do not load, =1 - from file, =2 - from DB
-                o = GeometryAccess()
-                if self.do_load_geo == 1:
-                    o.load_pars_from_file(self.geofname)
-                if self.do_load_geo == 2:
-                    o.load_pars_from_str(self.data)
-                x, y, z = o.get_pixel_coords()
-                ix, iy = o.get_pixel_coord_indexes()
-                shape3d = o.shape3d()
-                # logger.info(info_ndarr(shape3d, 'shape3d:'))
-                x.shape = shape3d
-                y.shape = shape3d
-                z.shape = shape3d
-                ix.shape = shape3d
-                iy.shape = shape3d
-
-                logger.info('\n  %s\n  %s\n  %s\n  %s' %
-                            (info_ndarr(ix, 'ix:'),
-                             info_ndarr(iy, 'iy:'),
-                             info_ndarr(x,  ' x:'),
-                             info_ndarr(y,  ' y:')))
-
-                img = None if arr3d is None else\
-                    img_from_pixel_arrays(ix.ravel(), iy.ravel(), W=arr3d.ravel())  # dtype=np.float32, vbase=0
-
-                # mask3d = None
-                # if mask2d is not None:
-                #    mask3d = convert_mask2d_to_ndarray(mask2d, ix, iy)
-                #    if mask3d is not None:
-                #        mask3d.shape = shape3d
-
-                # logger.info(info_ndarr(arr3d, 'input arr3d:'))
-                # logger.info(info_ndarr(mask2d, 'input mask2d:'))
-                # logger.info(info_ndarr(mask3d, 'output mask3d:'))
-
-                self.resp = ([ix, iy], [x, y, z], img)  # mask3d)
-                self.do_load_geo = 0
-
-            return self.resp
+    from psana.pscalib.geometry.GeometryAccess import GeometryAccess  # noqa: F401
+    from ami.ops.psalg import GeometryProd
 
     class Geometry(CtrlNode):
         """ psana Geometry - uses geometry constants to generate arrays of pixel coordinates etc."""
@@ -745,40 +511,16 @@ try:
             logger.info('Geometry.to_operation - at click on Apply')
             pars = {'calibconsts': {}}
             pars.update(self.dict_geometry_pars_from_values())
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=GeometryProd(**pars))
+            proc = GeometryProd(**pars)
+            return gn.Map(name=self.name()+"_operation", **kwargs, func=proc, begin_run=proc.begin_run)
 
 except ImportError as e:
     print(e)
 
 
 try:
-    from psana.pscalib.geometry.GeometryAccess import convert_mask2d_to_ndarray
-
-    class Mask3dFrom2dProd():
-
-        def __init__(self, **kwa):
-            logger.info('Mask3dFrom2dProd.__init__ kwa: %s' % str(kwa))
-            self.kwa = kwa
-
-        def __call__(self, inds_xy, mask2d):
-            """ called frequency ~1 Hz
-            """
-            iy, ix = inds_xy
-
-            logger.info('Mask3dFrom2dProd\n  %s\n  %s\n  %s' %
-                        (info_ndarr(ix, 'ix:'),
-                         info_ndarr(iy, 'iy:'),
-                         info_ndarr(mask2d, 'input mask2d:')))
-
-            mask3d = None
-            if mask2d is not None:
-                mask3d = convert_mask2d_to_ndarray(mask2d, ix, iy)
-                if mask3d is not None:
-                    mask3d.shape = ix.shape
-
-            logger.info(info_ndarr(mask3d, 'output mask3d:'))
-
-            return mask3d
+    from psana.pscalib.geometry.GeometryAccess import convert_mask2d_to_ndarray  # noqa: F401
+    from ami.ops.psalg import Mask3dFrom2dProd
 
     class Mask3dFrom2d(CtrlNode):
         """ psana Mask3dFrom2d - converts mask2d (as image) to mask3d array shaped as data"""
@@ -800,43 +542,40 @@ try:
         def to_operation(self, **kwargs):
             logger.info('Mask3dFrom2d.to_operation - at click on Apply')
             pars = {}
-            return gn.Map(name=self.name()+"_operation", **kwargs, func=Mask3dFrom2dProd(**pars))
+            proc = gn.RunCache(Mask3dFrom2dProd(**pars))
+            return gn.Map(name=self.name()+"_operation", **kwargs, func=proc, begin_run=proc.begin_run)
 
 except ImportError as e:
     print(e)
 
 
-try:
-    from ami.pyalgos.NDArrUtils import reshape_to_2d, arr_rot_n90  # info_ndarr
-    from ami.pyalgos.PSUtils import table_nxn_epix10ka_from_ndarr, table_nxm_jungfrau_from_ndarr
+class ImageAssembly(CtrlNode):
 
-    class TableFromArr3dProd():
+    """
+    Assembles an image from a 3d array of panels using the pixel indices from
+    the Geometry node. The destination of each pixel is computed once per run
+    and geometry, so each event is a single scatter into the image.
+    """
 
-        def __init__(self, **kwa):
-            logger.info('TableFromArr3dProd.__init__ kwa: %s' % str(kwa))
-            self.kwa = kwa
+    nodeName = "ImageAssembly"
+    uiTemplate = [('reuse buffer', 'check', {'checked': False,
+                                             'tip': "Assemble every event into the same image, only safe if no "
+                                                    "downstream node keeps images across events."})]
 
-        def __call__(self, arr3d):
-            """ call frequency ~1Hz
-            """
-            logger.info('TableFromArr3dProd.__call__ : %s' % self.__call__.__doc__.rstrip())
-            logger.info(info_ndarr(arr3d, 'input arr3d:'))
-            assert isinstance(arr3d, np.ndarray)
-            assert len(arr3d.shape) >= 3
-            # jungfrau shape (N, 512, 1024)
-            # epix10ka/epixhr shape (N, 352, 384)/(N, 288, 384)
-            arr2d = table_nxm_jungfrau_from_ndarr(arr3d) if (len(arr3d) % 512*1024) == 0 else\
-                table_nxn_epix10ka_from_ndarr(arr3d) if (len(arr3d) % 384) == 0 else\
-                reshape_to_2d(np.array(arr3d))
-            logger.info(info_ndarr(arr2d, 'output 2-d table:'))
-            logger.info('**kwa: %s' % str(self.kwa))
-            transpose = self.kwa.get('transpose', False)
-            ang_n90 = int(self.kwa.get('rot_n90', 90))
-            if transpose:
-                arr2d = arr2d.T
-            if ang_n90 != 0:
-                arr2d = arr_rot_n90(arr2d, rot_ang_n90=ang_n90)
-            return arr2d
+    def __init__(self, name):
+        super().__init__(name, terminals={'inds_xy': {'io': 'in', 'ttype': list},
+                                          'arr3d': {'io': 'in', 'ttype': Array3d},
+                                          'image': {'io': 'out', 'ttype': Array2d}})
+
+    def to_operation(self, **kwargs):
+        proc = ImageAssemblyProc(self.values['reuse buffer'])
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=proc, begin_run=proc.begin_run)
+
+
+try:
+    from ami.pyalgos.NDArrUtils import reshape_to_2d, arr_rot_n90  # noqa: F401
+    from ami.pyalgos.PSUtils import table_nxn_epix10ka_from_ndarr, table_nxm_jungfrau_from_ndarr  # noqa: F401
+    from ami.ops.psalg import TableFromArr3dProd
 
     class TableFromArr3d(CtrlNode):
         """ psana TableFromArr3d - converts n-d array (n>=3) for detector data to 2-d table of segments."""
@@ -870,33 +609,7 @@ except ImportError as e:
 try:
     # from psana.pyalgos.generic.NDArrUtils import info_ndarr, reshape_to_2d, arr_rot_n90
     # from psana.pyalgos.generic.PSUtils import table_nxn_epix10ka_from_ndarr, table_nxm_jungfrau_from_ndarr
-
-    class TestQtPickleProd():
-
-        def __init__(self, **kwa):
-            logger.info('TestQtPickleProdProd.__init__ kwa: %s' % str(kwa))
-            self.kwa = kwa
-
-        def __call__(self, arr3d):
-            """ call frequency ~1Hz
-            """
-            logger.info(info_ndarr(arr3d, 'TestQtPickleProd.__call__ input arr3d:'))
-            assert isinstance(arr3d, np.ndarray)
-            assert len(arr3d.shape) >= 3
-            # jungfrau shape (N, 512, 1024)
-            # epix10ka/epixhr shape (N, 352, 384)/(N, 288, 384)
-            arr2d = table_nxm_jungfrau_from_ndarr(arr3d) if (len(arr3d) % 512*1024) == 0 else\
-                table_nxn_epix10ka_from_ndarr(arr3d) if (len(arr3d) % 384) == 0 else\
-                reshape_to_2d(np.array(arr3d))
-            logger.info(info_ndarr(arr2d, 'output 2-d table:'))
-            logger.info('**kwa: %s' % str(self.kwa))
-            transpose = self.kwa.get('transpose', False)
-            ang_n90 = int(self.kwa.get('rot_n90', 90))
-            if transpose:
-                arr2d = arr2d.T
-            if ang_n90 != 0:
-                arr2d = arr_rot_n90(arr2d, rot_ang_n90=ang_n90)
-            return arr2d
+    from ami.ops.psalg import TestQtPickleProd
 
     class TestQtPickle(CtrlNode):
         """ psana TestQtPickle - converts n-d array (n>=3) for detector data to 2-d table of segments."""
@@ -944,25 +657,18 @@ class ThresholdingHitFinder(CtrlNode):
         summed_outputs = [self.name()+"_count", self.name()+"_sum"]
 
         threshold = self.values['Threshold']
-
-        def threshold_img(img):
-            return np.where(img >= threshold, 1, 0)
+        threshold_img = functools.partial(ops.threshold_img, threshold)
 
         if self.values['infinite']:
-
-            def reduction(res, *rest):
-                res += np.sum(rest, axis=0)
-                return res
-
             nodes = [gn.Map(name=self.name()+"_map",
                             inputs=inputs, outputs=mapped_outputs,
                             func=threshold_img, **kwargs),
                      gn.Accumulator(name=self.name()+"_accumulated",
                                     inputs=mapped_outputs, outputs=summed_outputs,
-                                    reduction=reduction, **kwargs),
+                                    reduction=common.accumulate_sum, **kwargs),
                      gn.Map(name=self.name()+"_unzip",
                             inputs=summed_outputs, outputs=outputs,
-                            func=lambda count, s: s, **kwargs)]
+                            func=common.drop_count, **kwargs)]
         else:
             nodes = [gn.Map(name=self.name()+"_map",
                             inputs=inputs, outputs=mapped_outputs,
@@ -972,6 +678,6 @@ class ThresholdingHitFinder(CtrlNode):
                              N=self.values['N'], **kwargs),
                      gn.Map(name=self.name()+"_unzip",
                             inputs=summed_outputs, outputs=outputs,
-                            func=lambda count, s: s, **kwargs)]
+                            func=common.drop_count, **kwargs)]
 
         return nodes
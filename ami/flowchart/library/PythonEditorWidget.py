@@ -11,71 +11,8 @@ try:
     HAS_PYQODE = qtpy.API == "pyqt5"
 except ImportError:
     HAS_PYQODE = False
-import tempfile
-import importlib
 
 
-class PythonEditorProc(object):
-
-    def __init__(self, text):
-        self.text = text
-        self.file = None
-        self.mod = None
-
-    def load(self):
-        self.file = tempfile.NamedTemporaryFile(mode='w', suffix='.py')
-        self.file.write(self.text)
-        self.file.flush()
-        spec = importlib.util.spec_from_file_location("module.name", self.file.name)
-        self.mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(self.mod)
-
-        if hasattr(self.mod, 'EventProcessor'):
-            self.proc = self.mod.EventProcessor()
-            self.func = self.proc.on_event
-        else:
-            self.proc = None
-            self.func = self.mod.func
-
-    def __call__(self, *args, **kwargs):
-        if self.file is None:
-            self.load()
-
-        return self.func(*args, **kwargs)
-
-    def __del__(self):
-        if self.file:
-            del self.mod
-            self.file.close()
-
-    def begin_run(self):
-        if self.file is None:
-            self.load()
-
-        if self.proc:
-            return self.proc.begin_run()
-
-    def end_run(self):
-        if self.file is None:
-            self.load()
-
-        if self.proc:
-            return self.proc.end_run()
-
-    def begin_step(self, step):
-        if self.file is None:
-            self.load()
-
-        if self.proc:
-            return self.proc.begin_step(step)
-
-    def end_step(self, step):
-        if self.file is None:
-            self.load()
-
-        if self.proc:
-            return self.proc.end_step(step)
-
 if HAS_PYQODE:
     class MyPythonCodeEdit(widgets.PyCodeEditBase):
         def __init__(self, parent=None):
@@ -2,10 +2,13 @@
 from ami.flowchart.library.DisplayWidgets import ImageWidget,\
         WaveformWidget, PixelDetWidget, ScatterWidget
 from ami.flowchart.library.common import CtrlNode
-from amitypes import Array2d, Array1d
-from typing import Any
+from amitypes import Array2d, Array1d, Array3d
+from typing import Any, Union
+from ami.roi import parse_rois
+from ami.ops.roi import Roi2DProc, MultiRoiProc, AzimuthalIntegrationProc
+import ami.ops.roi as ops
 import ami.graph_nodes as gn
-import numpy as np
+import functools
 import pyqtgraph as pg
 from pyqtgraph import functions as fn
 
@@ -13,59 +16,9 @@ try:
     import logging
     logger = logging.getLogger(__name__)
     import ami.flowchart.library.UtilsROI as ur
-    from ami.pyalgos.NDArrUtils import info_ndarr
+    from ami.ops.roi import PolarHistogram
     QPen, QBrush, QColor = ur.QPen, ur.QBrush, ur.QColor
 
-    class PolarHistogram():
-
-        def __init__(self, *args):
-            logger.info('in PolarHistogram.__init__')
-            self.args = args
-            self.hpolar = None
-
-        def __call__(self, img, mask=None):
-            logger.debug('in PolarHistogram.__call__ %s' % info_ndarr(img, 'image'))
-            cx, cy, ro, ri, ao, ai, nr, na = self.args
-            if self.hpolar is None:
-                logger.info('update hpolar with cx:%.1f, cy:%.1f, ro:%d, ri:%d, ao:%.1f, ai:%.1f, nr:%d, na:%d' %
-                            (cx, cy, ro, ri, ao, ai, nr, na))
-                hp = self.hpolar = ur.polar_histogram(img.shape, mask, cx, cy, ro, ri, ao, ao+ai, nr, na)
-                logger.info(info_ndarr(hp.obj_radbins().bincenters(), '\n  rad bin centers')
-                          + info_ndarr(hp.obj_phibins().bincenters(), '\n  ang bin centers'))
-                            #hp.info_attrs()
-
-            hp = self.hpolar
-            orbins = hp.obj_radbins()
-            oabins = hp.obj_phibins()
-            ra2d = hp.bin_avrg_rad_phi(img, do_transp=True)
-            rproj = np.sum(ra2d, axis=1)/oabins.nbins()  # normalized per pixel
-            aproj = np.sum(ra2d, axis=0)/orbins.nbins()
-
-            ranpix = hp.bin_number_of_pixels()[:-1]  # remove the last out of ROI bin
-            ranpix.shape = (oabins.nbins(), orbins.nbins())
-            ranpix = np.transpose(ranpix)
-
-            logger.debug(info_ndarr(ra2d, '\n  ra2d')
-                         + info_ndarr(ranpix, '\n  ranpix')
-                         + info_ndarr(orbins.bincenters(), '\n  orbins')
-                         + info_ndarr(oabins.bincenters(), '\n  oabins')
-                         + info_ndarr(rproj, '\n  radial  projection')
-                         + info_ndarr(aproj, '\n  angular projection'))
-
-            mask_arc = ur.um.mask_arc(img.shape, cx, cy, ro, ri, ao, ai, dtype=np.uint8)
-
-            return orbins.bincenters(),\
-                oabins.bincenters(),\
-                orbins.binedges(),\
-                oabins.binedges(),\
-                ra2d,\
-                ranpix,\
-                rproj,\
-                aproj,\
-                (cx, cy, ro, ri, ao, ai, nr, na),\
-                (ri, ro-ri, ao, ai-ao),\
-                mask_arc
-
     class RoiArch(CtrlNode):
         """
         Region of Interest of image shaped as arch (a.k.a. cut-donat).
@@ -268,10 +221,99 @@ class Roi2D(CtrlNode):
         else:
             rotation = 0
 
-        def func(img): 
-            return np.rot90(img, rotation)[slice(oy, oy+ey), slice(ox, ox+ex)], (ox, ex, oy, ey)
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=Roi2DProc(ox, ex, oy, ey, rotation), pure=True)
+
+
+class MultiRoi(CtrlNode):
+
+    """
+    Sums of many regions of interest of an image, extracted in a single pass.
+
+    ROIs are separated by semicolons, each one a kind followed by its
+    parameters: 'rect ox ex oy ey', 'pixel x y', 'arc cx cy ro ri ao ai' or
+    'poly x0 y0 x1 y1 x2 y2 ...'. Out has the sum of each ROI in order.
+    """
+
+    nodeName = "MultiRoi"
+    uiTemplate = [('rois', 'text', {'placeholder': "rect 0 10 0 10; arc 100 100 50 20 0 90"})]
+
+    def __init__(self, name):
+        super().__init__(name,
+                         terminals={'In': {'io': 'in', 'ttype': Array2d},
+                                    'Out': {'io': 'out', 'ttype': Array1d}},
+                         viewable=True)
+
+    def isChanged(self, restore_ctrl, restore_widget):
+        return restore_ctrl
 
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=func)
+    def display(self, topics, terms, addr, win, **kwargs):
+        return super().display(topics, terms, addr, win, ImageWidget, **kwargs)
+
+    def to_operation(self, **kwargs):
+        if self.widget is not None:
+            rotation = self.widget.rotate
+        else:
+            rotation = 0
+
+        rois = parse_rois(self.values['rois'], rotation)
+
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=MultiRoiProc(rois), pure=True)
+
+
+class AzimuthalIntegration(CtrlNode):
+
+    """
+    Radial profile and cake image of a detector image or of a 3d array of
+    panels, using the pixel coordinates from the Geometry node for the latter.
+
+    The pixel-to-bin map is only rebuilt when the shape, mask or coordinates
+    change and at the beginning of each run. The center is in pixels, the
+    pixel size and the coordinates in um, the distance in mm and the
+    wavelength in Angstroms. Radial is q in 1/A if both the distance and the
+    wavelength are set, 2theta in degrees if only the distance is set and the
+    radius in um otherwise.
+    """
+
+    nodeName = "AzimuthalIntegration"
+    uiTemplate = [('center x', 'doubleSpin', {'value': 0, 'min': -1e6}),
+                  ('center y', 'doubleSpin', {'value': 0, 'min': -1e6}),
+                  ('pixel size', 'doubleSpin', {'value': 100, 'min': 1e-3}),
+                  ('distance', 'doubleSpin', {'value': 0, 'min': 0}),
+                  ('wavelength', 'doubleSpin', {'value': 0, 'min': 0}),
+                  ('radial bins', 'intSpin', {'value': 100, 'min': 1}),
+                  ('radial min', 'doubleSpin', {'value': 0, 'min': 0}),
+                  ('radial max', 'doubleSpin', {'value': 0, 'min': 0, 'tip': "0 uses the full range"}),
+                  ('phi bins', 'intSpin', {'value': 1, 'min': 1}),
+                  ('solid angle', 'check', {'checked': False})]
+
+    def __init__(self, name):
+        super().__init__(name,
+                         terminals={'In': {'io': 'in', 'ttype': Union[Array2d, Array3d]},
+                                    'mask': {'io': 'in', 'ttype': Union[Array2d, Array3d], 'removable': True},
+                                    'coords_xyz': {'io': 'in', 'ttype': list, 'removable': True},
+                                    'Radial': {'io': 'out', 'ttype': Array1d},
+                                    'Profile': {'io': 'out', 'ttype': Array1d},
+                                    'Phi': {'io': 'out', 'ttype': Array1d},
+                                    'Cake': {'io': 'out', 'ttype': Array2d}})
+
+    def to_operation(self, inputs, outputs, **kwargs):
+        radial_range = None
+        if self.values['radial max'] > self.values['radial min']:
+            radial_range = (self.values['radial min'], self.values['radial max'])
+
+        proc = AzimuthalIntegrationProc(list(inputs),
+                                        self.values['center x'],
+                                        self.values['center y'],
+                                        self.values['pixel size'],
+                                        nbins=self.values['radial bins'],
+                                        nphi=self.values['phi bins'],
+                                        radial_range=radial_range,
+                                        distance=self.values['distance']*1e3,
+                                        wavelength=self.values['wavelength'],
+                                        solid_angle=self.values['solid angle'])
+
+        return gn.Map(name=self.name()+"_operation", inputs=inputs, outputs=outputs, **kwargs,
+                      func=proc, begin_run=proc.begin_run)
 
 
 class Roi1D(CtrlNode):
@@ -328,10 +370,7 @@ class Roi1D(CtrlNode):
         extent = self.values['extent']
         size = list(sorted([origin, extent]))
 
-        def func(arr):
-            return arr[slice(*size)]
-
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=func)
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=functools.partial(ops.roi1d, *size), pure=True)
 
 
 class ScatterRoi(CtrlNode):
@@ -396,29 +435,16 @@ class ScatterRoi(CtrlNode):
         pickn_outputs = [self.name()+"_picked"]
         display_outputs = [self.name()+"_displayX", self.name()+"_displayY"]
 
-        def display_func(arr):
-            x, y = zip(*arr)
-            return np.array(x), np.array(y)
-
         origin = self.values['origin']
         extent = self.values['extent']
 
-        def func(arr):
-            arr = np.array(arr)
-
-            roi = arr[(origin < arr[:, 0]) & (arr[:, 0] < extent)]
-            if roi.size > 0:
-                return roi[:, 0], roi[:, 1]
-            else:
-                return np.array([]), np.array([])
-
         nodes = [gn.PickN(name=self.name()+"_pickN",
                           inputs=inputs, outputs=pickn_outputs, **kwargs,
                           N=self.values['Num Points']),
-                 gn.Map(name=self.name()+"_operation", inputs=pickn_outputs, outputs=outputs, func=func,
-                        **kwargs),
+                 gn.Map(name=self.name()+"_operation", inputs=pickn_outputs, outputs=outputs,
+                        func=functools.partial(ops.scatter_roi, origin, extent), **kwargs),
                  gn.Map(name=self.name()+"_display", inputs=pickn_outputs, outputs=display_outputs,
-                        **kwargs, func=display_func)]
+                        **kwargs, func=ops.unzip_points)]
 
         return nodes
 
@@ -470,9 +496,6 @@ class Roi0D(CtrlNode):
         x = self.values['x']
         y = self.values['y']
 
-        def func(img):
-            return img[x, y]
-
-        return gn.Map(name=self.name()+"_operation", **kwargs, func=func)
+        return gn.Map(name=self.name()+"_operation", **kwargs, func=functools.partial(ops.pixel, x, y), pure=True)
 
 # EOF
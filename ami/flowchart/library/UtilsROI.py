@@ -19,22 +19,8 @@ QPen, QBrush, QColor = pg.QtGui.QPen, pg.QtGui.QBrush, pg.QtGui.QColor
 # scene.setClickRadius(r)
 
 try:
-    import ami.pyalgos.HPolar as hp
-
-    def polar_histogram(shape, mask, cx, cy, ro, ri, ao, ai, nr, na):
-        """Returns hp.HPolar object.
-        """
-        rows, cols = shape
-        xarr1 = np.arange(cols) - cx
-        yarr1 = np.arange(rows) - cy
-        xarr, yarr = np.meshgrid(xarr1, yarr1)
-        hpolar = hp.HPolar(xarr, yarr, mask=mask, radedges=(ri, ro),
-                           nradbins=nr, phiedges=(ao, ai), nphibins=na)
-        # logger.info('%s %s\n%s' %(hp.info_ndarr(xarr,
-        #              'pixel coordinate arrays: xarr'),
-        #              hp.info_ndarr(yarr,' yarr'),
-        #              hpolar.info_attrs()))
-        return hpolar
+    import ami.pyalgos.HPolar  # noqa: F401
+    from ami.ops.roi import polar_histogram  # noqa: F401
 
 except ImportError as e:
     print(e)
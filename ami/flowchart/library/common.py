@@ -6,6 +6,28 @@ from ami.flowchart.library.WidgetGroup import generateUi
 from ami.flowchart.library.DisplayWidgets import ScalarWidget, WaveformWidget, ImageWidget, \
         ObjectWidget, MultiWaveformWidget
 from amitypes import Array1d, Array2d, MultiChannelWaveformTypes
+import ami.graph_nodes as gn
+
+
+# controls for running a slow node on a sample of the events, see sampling
+SAMPLING_TEMPLATE = [('every', 'intSpin', {'value': 1, 'min': 1, 'group': 'Sampling'}),
+                     ('max rate', 'doubleSpin', {'value': 0, 'min': 0, 'group': 'Sampling'}),
+                     ('time budget', 'doubleSpin', {'value': 0, 'min': 0, 'group': 'Sampling'})]
+
+
+def sampling(values):
+    """
+    Returns the sampling policy set with the SAMPLING_TEMPLATE controls of a
+    node, or None if the node runs on every event. The max rate is in events
+    per second and the time budget in seconds per heartbeat, 0 for no limit.
+    """
+    values = values.get('Sampling', {})
+    every = values.get('every', 1)
+    rate = values.get('max rate', 0)
+    budget = values.get('time budget', 0)
+    if every <= 1 and not rate and not budget:
+        return None
+    return gn.Sampling(every=every, rate=rate, budget=budget)
 
 
 class CtrlNode(Node):
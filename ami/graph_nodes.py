@@ -1,8 +1,13 @@
 import abc
+import time
+import pickle
+import hashlib
 import operator
+import collections
 import numpy as np
 from networkfox import operation
 from networkfox.modifiers import GraphWarning
+from ami.data import Lazy, resolve
 
 
 class Transformation(abc.ABC):
@@ -14,6 +19,12 @@ class Transformation(abc.ABC):
             inputs (list): List of inputs
             outputs (list): List of outputs
             func (function): Function node will call
+            pure (bool): The function has no state or side effects, so nodes
+                with equal functions and the same inputs can be merged
+            lazy (bool): The function only passes its inputs on, so lazy
+                source values (see ami.data.Lazy) are not read for it
+            sampling (Sampling): Run the function on a sample of the events
+                instead of all of them
         """
 
         self.name = kwargs['name']
@@ -37,6 +48,11 @@ class Transformation(abc.ABC):
         self.end_run_func = kwargs.get('end_run', None)
         self.begin_step_func = kwargs.get('begin_step', None)
         self.end_step_func = kwargs.get('end_step', None)
+        self.pure = kwargs.get('pure', False)
+        self.lazy = kwargs.get('lazy', False)
+        self.sampling = kwargs.get('sampling', None)
+        # set by Graph.compile on nodes which may be passed lazy source values
+        self.lazy_inputs = False
         self.exportable = False
         self.is_global_operation = False
 
@@ -61,8 +77,19 @@ class Transformation(abc.ABC):
         """
         Return NetworkFoX operation node.
         """
+        func = Resolve(self.func, len(self.outputs)) if self.lazy_inputs else self.func
+        if self.sampling is not None:
+            func = Sampled(func, self.sampling, len(self.outputs))
         return operation(name=self.name, needs=self.inputs, provides=self.outputs, color=self.color,
-                         metadata={'parent': self.parent})(self.func)
+                         metadata={'parent': self.parent})(func)
+
+    def warmup(self):
+        """
+        Compiles the JIT kernels used by the node's function (see ami.jit)
+        ahead of the first event.
+        """
+        if callable(getattr(self.func, 'warmup', None)):
+            return self.func.warmup()
 
     def begin_run(self, color=""):
         if color == self.color and callable(self.begin_run_func):
@@ -90,10 +117,76 @@ class Map(Transformation):
             inputs (list): List of inputs
             outputs (list): List of outputs
             func (function): Function node will call
+            pure (bool): The function has no state or side effects, so nodes
+                with equal functions and the same inputs can be merged
+            lazy (bool): The function only passes its inputs on, so lazy
+                source values (see ami.data.Lazy) are not read for it
+            sampling (Sampling): Run the function on a sample of the events
+                instead of all of them
         """
         super().__init__(**kwargs)
 
 
+class Predicate(Map):
+
+    def __init__(self, **kwargs):
+        """
+        Keyword Arguments:
+            name (str): Name of node
+            condition_needs (list): Inputs of the condition
+            inputs (list): Inputs passed on when the condition holds
+            outputs (list): List of outputs, one for each input
+            func (function): The condition, called with the values of the
+                condition_needs
+
+        When the condition does not hold the node provides none of its
+        outputs, so none of the nodes depending on them are run. The inputs
+        are passed on without reading lazy source values (see ami.data.Lazy),
+        and the events passing and failing the condition are counted.
+        """
+        condition_needs = kwargs.pop('condition_needs', [])
+        if type(condition_needs) is dict:
+            condition_needs = list(condition_needs.values())
+        inputs = kwargs['inputs']
+        if type(inputs) is dict:
+            inputs = list(inputs.values())
+        kwargs['inputs'] = list(condition_needs) + list(inputs)
+        kwargs['lazy'] = True
+        super().__init__(**kwargs)
+        assert len(inputs) == len(self.outputs), "a predicate needs one output for each input"
+        self.condition_needs = list(condition_needs)
+        self.passed = 0
+        self.failed = 0
+
+    def to_operation(self):
+        return operation(name=self.name, needs=self.inputs, provides=self.outputs, color=self.color,
+                         metadata={'parent': self.parent})(self.filter)
+
+    def filter(self, *args):
+        nconds = len(self.condition_needs)
+        conditions = tuple(map(resolve, args[:nconds]))
+        if any(arg is None for arg in conditions):
+            passed = None
+        else:
+            passed = self.func(*conditions)
+        if passed:
+            self.passed += 1
+            return forward(*args[nconds:])
+        elif passed is not None:
+            self.failed += 1
+        return None if len(self.outputs) == 1 else (None,)*len(self.outputs)
+
+    def counts(self):
+        """
+        Returns the number of events which passed and failed the condition
+        since the last call.
+        """
+        counts = self.passed, self.failed
+        self.passed = 0
+        self.failed = 0
+        return counts
+
+
 class StatefulTransformation(Transformation):
 
     def __init__(self, **kwargs):
@@ -132,8 +225,11 @@ class StatefulTransformation(Transformation):
         return
 
     def to_operation(self):
+        func = Resolve(self, len(self.outputs)) if self.lazy_inputs else self
+        if self.sampling is not None:
+            func = Sampled(func, self.sampling, len(self.outputs))
         return operation(name=self.name, needs=self.inputs, provides=self.outputs,
-                         color=self.color, metadata={'parent': self.parent})(self)
+                         color=self.color, metadata={'parent': self.parent})(func)
 
 
 class GlobalTransformation(StatefulTransformation):
@@ -393,3 +489,239 @@ class RollingBuffer(GlobalTransformation):
 
 class AMIWarning(GraphWarning):
     pass
+
+
+class Resolve():
+
+    """
+    Reads the lazy source values (see ami.data.Lazy) passed to a node before
+    calling its function. If a value turns out to be missing from the event
+    the function is not called, as if the value had not been in the event.
+
+    Args:
+        func (function): the function of the node.
+        noutputs (int): the number of outputs of the node.
+    """
+
+    def __init__(self, func, noutputs=1):
+        self.func = func
+        self.missing = None if noutputs == 1 else (None,)*noutputs
+
+    def __call__(self, *args, **kwargs):
+        if any(type(arg) is Lazy for arg in args):
+            args = tuple(map(resolve, args))
+            if any(arg is None for arg in args):
+                return self.missing
+        if any(type(value) is Lazy for value in kwargs.values()):
+            kwargs = {key: resolve(value) for key, value in kwargs.items()}
+            kwargs = {key: value for key, value in kwargs.items() if value is not None}
+        return self.func(*args, **kwargs)
+
+
+class Sampling():
+
+    """
+    A policy for running a node on a sample of the events of a worker, for
+    nodes too slow to run on every event. The nodes depending on the outputs
+    of the node only run on the sampled events too, as with a Predicate, so
+    the counts of the accumulators downstream are counts of sampled events.
+
+    Args:
+        every (int): run on one in every `every` events.
+        rate (float): run at most `rate` times a second, None for no limit.
+        budget (float): spend at most `budget` seconds running the node in
+            each heartbeat, None for no limit.
+    """
+
+    def __init__(self, every=1, rate=None, budget=None):
+        self.every = max(int(every), 1)
+        self.rate = rate or None
+        self.budget = budget or None
+        self.seen = 0
+        self.last = None
+        self.spent = 0.0
+        self.passed = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return "Sampling(every=%s, rate=%s, budget=%s)" % (self.every, self.rate, self.budget)
+
+    def sample(self):
+        """
+        Returns whether to run the node on the current event.
+        """
+        now = time.monotonic()
+        self.seen += 1
+        if (self.seen - 1) % self.every or \
+                (self.rate is not None and self.last is not None and now - self.last < 1/self.rate) or \
+                (self.budget is not None and self.spent >= self.budget):
+            self.skipped += 1
+            return False
+        self.last = now
+        self.passed += 1
+        return True
+
+    def spend(self, elapsed):
+        self.spent += elapsed
+
+    def heartbeat_finished(self):
+        self.spent = 0.0
+
+    def counts(self):
+        """
+        Returns the number of events which were sampled and skipped since the
+        last call.
+        """
+        counts = self.passed, self.skipped
+        self.passed = 0
+        self.skipped = 0
+        return counts
+
+
+class Sampled():
+
+    """
+    Calls the function of a node only on the events picked by its sampling
+    policy, timing the calls against the time budget of the policy. On the
+    other events the node provides none of its outputs.
+
+    Args:
+        func (function): the function of the node.
+        sampling (Sampling): the sampling policy of the node.
+        noutputs (int): the number of outputs of the node.
+    """
+
+    def __init__(self, func, sampling, noutputs=1):
+        self.func = func
+        self.sampling = sampling
+        self.missing = None if noutputs == 1 else (None,)*noutputs
+
+    def __call__(self, *args, **kwargs):
+        if not self.sampling.sample():
+            return self.missing
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.sampling.spend(time.perf_counter() - start)
+
+
+def forward(*args):
+    """
+    Returns its arguments unchanged, used to alias the outputs of a node to
+    the outputs of an identical node.
+    """
+    return args if len(args) > 1 else args[0]
+
+
+class AsType():
+
+    """
+    Converts arrays to a dtype, other values are returned unchanged.
+
+    Conversions to the same dtype compare equal, so the graph only converts an
+    input once however many nodes need it converted (see Map's pure option).
+    """
+
+    def __init__(self, dtype):
+        self.dtype = np.dtype(dtype)
+
+    def __eq__(self, other):
+        return type(other) is AsType and other.dtype == self.dtype
+
+    def __hash__(self):
+        return hash((AsType, self.dtype))
+
+    def __repr__(self):
+        return "AsType(%s)" % self.dtype
+
+    def __call__(self, *args):
+        args = tuple(arg.astype(self.dtype, copy=False) if type(arg) is np.ndarray else arg for arg in args)
+        return forward(*args)
+
+
+def fingerprint(obj):
+    """
+    Returns a hashable key for the content of an object, hashing the data of
+    numpy arrays and recursing into dicts, lists and tuples.
+    """
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            return ('ndarray', obj.shape, fingerprint(obj.tolist()))
+        digest = hashlib.blake2b(np.ascontiguousarray(obj).view(np.uint8), digest_size=16).digest()
+        return ('ndarray', obj.shape, obj.dtype.str, digest)
+    elif isinstance(obj, dict):
+        return ('dict',) + tuple((k, fingerprint(v)) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return (type(obj).__name__,) + tuple(map(fingerprint, obj))
+
+    try:
+        hash(obj)
+        return obj
+    except TypeError:
+        pass
+
+    try:
+        return ('pickle', hashlib.blake2b(pickle.dumps(obj), digest_size=16).digest())
+    except Exception:
+        return ('id', id(obj))
+
+
+class RunCache():
+
+    """
+    Memoizes a node function for the duration of a run.
+
+    Results are keyed on the content of the arguments (see fingerprint), so
+    work that only depends on calibration constants, geometry or masks is done
+    once per run per worker however often the function is called. Calls with
+    the very same argument objects as the previous call skip the hashing. The
+    cache is cleared by begin_run, which should be passed to the node along
+    with the cache, and it is not pickled with the function.
+
+    Args:
+        func (function): the function to memoize.
+        maxsize (int): the number of results to keep.
+    """
+
+    def __init__(self, func, maxsize=4):
+        self.func = func
+        self.maxsize = maxsize
+        self.cache = collections.OrderedDict()
+        self.last = None
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = collections.OrderedDict()
+        state['last'] = None
+        return state
+
+    def begin_run(self):
+        self.cache.clear()
+        self.last = None
+        if callable(getattr(self.func, 'begin_run', None)):
+            self.func.begin_run()
+
+    def __call__(self, *args):
+        if self.last is not None:
+            last_args, result = self.last
+            if len(args) == len(last_args) and all(a is b for a, b in zip(args, last_args)):
+                self.hits += 1
+                return result
+
+        key = fingerprint(args)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            result = self.cache[key]
+        else:
+            self.misses += 1
+            result = self.func(*args)
+            self.cache[key] = result
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+
+        self.last = (args, result)
+        return result
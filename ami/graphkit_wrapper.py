@@ -2,7 +2,7 @@ import dill
 import networkx as nx
 import collections
 import ami.graph_nodes as gn
-from ami.data import RequestedData
+from ami.data import RequestedData, resolve
 from networkfox import compose, modifiers
 
 
@@ -26,6 +26,8 @@ class Graph():
         self.children_of_global_operations = {}
         self.inputs = collections.defaultdict(set)
         self.outputs = collections.defaultdict(set)
+        self.merged = {}
+        self.pruned = {}
 
     def __bool__(self):
         return self.graph.size() != 0
@@ -218,6 +220,17 @@ class Graph():
                             self.graph.nodes))
         list(map(lambda node: node.heartbeat_finished(), nodes))
 
+        # the time budgets of the sampled nodes are per heartbeat
+        nodes = list(filter(lambda node: getattr(node, 'sampling', None) is not None, self.graph.nodes))
+        list(map(lambda node: node.sampling.heartbeat_finished(), nodes))
+
+    def warmup(self):
+        """
+        Compile the JIT kernels used by the nodes in the graph.
+        """
+        nodes = list(filter(lambda node: hasattr(node, "warmup"), self.graph.nodes))
+        list(map(lambda node: node.warmup(), nodes))
+
     def begin_run(self, color):
         """
         Execute pre run hook on nodes in the graph.
@@ -413,13 +426,104 @@ class Graph():
                 node.inputs = new_inputs
             self.add(node)
 
+    def _common_subexpressions(self):
+        """
+        Find pure Map nodes which compute the same function of the same inputs
+        as another node, e.g. the same dtype conversion of an image feeding
+        several nodes. Inputs produced by merged nodes count as the outputs of
+        the node they are merged with, so identical chains are merged whole.
+
+        Only nodes whose outputs are all consumed by other nodes are merged,
+        since the outputs of the graph have to be computed under their names.
+
+        Returns:
+            A dictionary mapping each duplicate node to the node it is merged
+            with.
+        """
+        seen = {}
+        duplicates = {}
+        # outputs of merged nodes, so that their consumers can be merged too
+        aliases = {}
+
+        for node in nx.algorithms.topological_sort(self.graph):
+            if skip(node) or type(node) is not gn.Map or not node.pure or node.sampling is not None:
+                continue
+
+            inputs = tuple((type(i).__name__, aliases.get(i, i)) for i in node.inputs)
+            try:
+                key = (node.func, inputs, len(node.outputs), node.color)
+                hash(key)
+            except TypeError:
+                continue
+
+            if key not in seen:
+                seen[key] = node
+            elif all(self.graph.out_degree(o) > 0 for o in node.outputs):
+                duplicates[node] = seen[key]
+                aliases.update(zip(node.outputs, seen[key].outputs))
+
+        return duplicates
+
+    def _dead_nodes(self, duplicates):
+        """
+        Find pure Map nodes whose outputs do not reach any other kind of node,
+        e.g. the view and export nodes, global operations, or nodes with side
+        effects. Everything else is live along with its ancestors.
+
+        Args:
+            duplicates (dict): the merged nodes (see _common_subexpressions),
+                which depend on the outputs of the node they are merged with
+                instead of on their own inputs.
+
+        Returns:
+            A tuple of the set of dead nodes and the set of live nodes and
+            variables.
+        """
+        graph = self.graph.copy()
+        for node, original in duplicates.items():
+            graph.remove_edges_from(list(graph.in_edges(node)))
+            graph.add_edges_from((o, node) for o in original.outputs)
+
+        stack = [node for node in graph.nodes
+                 if not skip(node) and not (type(node) is gn.Map and node.pure)]
+        live = set(stack)
+        while stack:
+            for predecessor in graph.predecessors(stack.pop()):
+                if predecessor not in live:
+                    live.add(predecessor)
+                    stack.append(predecessor)
+
+        dead = {node for node in graph.nodes if not skip(node) and node not in live}
+        return dead, live
+
+    def _mark_lazy_inputs(self, nodes):
+        """
+        Mark the worker nodes which may be passed lazy source values (see
+        ami.data.Lazy), i.e. the values of the sources and the outputs of the
+        nodes which only pass them on, so that they read them before running.
+
+        Args:
+            nodes (list): the nodes of the graph in topological order.
+        """
+        lazy = set(self.inputs['worker'])
+
+        for node in nodes:
+            node.lazy_inputs = False
+            if node.color != 'worker' or lazy.isdisjoint(node.inputs):
+                continue
+            if node.lazy:
+                lazy.update(node.outputs)
+            else:
+                node.lazy_inputs = True
+
     def compile(self, num_workers=1, num_local_collectors=1):
         """
         Convert an AMI graph to a networkfox graph. This function must be called after any function which modifies the
         graph, ie add, insert, remove, or replace.
 
         This is done by coloring nodes, expanding global operations, and replacing filter nodes with the appropriate
-        networkfox equivalents.
+        networkfox equivalents. Pure nodes duplicating another node forward its outputs instead of recomputing them,
+        and pure nodes whose outputs are not used are left out. The eliminated nodes are reported in the metadata.
 
         Args:
             num_workers (int): Total number of workers.
@@ -430,17 +534,32 @@ class Graph():
         self._collect_global_inputs()
         self._expand_global_operations(num_workers, num_local_collectors)
 
-        seen = set()
-        outputs = [n for n, d in self.graph.out_degree() if d == 0]
-        body = []
+        duplicates = self._common_subexpressions()
+        dead, live = self._dead_nodes(duplicates)
+        duplicates = {node: original for node, original in duplicates.items() if node not in dead}
+        self.merged = {node.name: original.name for node, original in duplicates.items()}
+        self.pruned = {node.name: node.parent for node in dead}
+        # the worker doesn't need to request sources that are only used by pruned nodes
+        self.inputs['worker'].intersection_update(live)
+
+        dead_outputs = {o for node in dead for o in node.outputs}
+        outputs = [n for n, d in self.graph.out_degree() if d == 0 and n not in dead_outputs]
+        nodes = []
 
-        for node in self.graph.nodes:
-            if node in seen or skip(node):
+        for node in nx.algorithms.topological_sort(self.graph):
+            if node in dead or skip(node):
                 continue
-            body.append(node.to_operation())
+            if node in duplicates:
+                node = gn.Map(name=node.name, inputs=duplicates[node].outputs, outputs=node.outputs,
+                              func=gn.forward, color=node.color, parent=node.parent, lazy=True)
+            nodes.append(node)
+
+        self._mark_lazy_inputs(nodes)
+        body = [node.to_operation() for node in nodes]
 
         self.outputs['globalCollector'].update(outputs)
         self.graphkit = compose(name=self.name)(*body)
+        self.warmup()
 
     def nxplot(self, filename=None):
         A = nx.nx_agraph.to_agraph(self.graph)
@@ -483,7 +602,8 @@ class Graph():
         assert color is not None
         result = self.graphkit(*args, **kwargs)
         outputs = self.outputs[color]
-        return {k: result[k] for k in outputs if k in result}
+        # outputs passed on unread from a lazy source are read here
+        return {k: resolve(result[k]) for k in outputs if k in result}
 
     def times(self):
         """
@@ -496,12 +616,29 @@ class Graph():
         assert self.graphkit is not None, "call compile first"
         return self.graphkit.warnings()
 
+    def filter_counts(self):
+        """
+        Return dictionary of the number of events which passed and failed each predicate node since the last call,
+        and of the number of events which each sampled node ran on and skipped.
+        """
+        counts = {node.name: node.counts() for node in self.graph.nodes if isinstance(node, gn.Predicate)}
+        counts.update({node.name: node.sampling.counts() for node in self.graph.nodes
+                       if getattr(node, 'sampling', None) is not None})
+        return counts
+
     def metadata(self):
         """
-        Return dictionary of node metadata.
+        Return dictionary of node metadata. Nodes merged with an identical node
+        have the name of that node under 'merged_with' and nodes left out of
+        the graph because their outputs are not used have 'pruned' set.
         """
         assert self.graphkit is not None, "call compile first"
-        return self.graphkit.node_metadata()
+        metadata = dict(self.graphkit.node_metadata())
+        for name, original in self.merged.items():
+            metadata[name] = dict(metadata.get(name, {}), merged_with=original)
+        for name, parent in self.pruned.items():
+            metadata[name] = {'parent': parent, 'pruned': True}
+        return metadata
 
     def dump(self, pth):
         with open(pth, 'wb') as f:
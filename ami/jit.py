@@ -0,0 +1,142 @@
+import time
+import logging
+import importlib
+import prometheus_client as pc
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+logger = logging.getLogger(__name__)
+
+compile_time = pc.Gauge('ami_jit_compile_secs', 'JIT Compile Time', ['kernel'])
+kernels = {}  # { name : Kernel }
+
+
+def lookup(name):
+    """
+    Returns a registered kernel by name, importing the module that defines it
+    if needed.
+
+    Args:
+        name (str): the fully qualified name of the kernel.
+
+    Returns:
+        The registered Kernel.
+    """
+    if name not in kernels:
+        importlib.import_module(name.rsplit('.', 1)[0])
+    return kernels[name]
+
+
+class Kernel:
+    """
+    A numba kernel shared by the nodes of all graphs in a process.
+
+    Kernels are module-level functions, so they are compiled once per process
+    instead of once per graph edit, and they are compiled with `cache=True` so
+    that the compiled code is reused from disk by the other workers and by
+    later runs. They pickle by name, so sending a graph that uses a kernel to
+    the workers does not send (and recompile) the function itself.
+
+    If numba is not available the kernel runs the plain python function.
+
+    Args:
+        func (function): the function to compile.
+        warmup (list): tuples of example arguments whose types are compiled
+            when the kernel is warmed up.
+        options: extra options passed to `numba.njit`.
+    """
+
+    def __init__(self, func, warmup=(), **options):
+        self.name = "%s.%s" % (func.__module__, func.__qualname__)
+        self.py_func = func
+        self.warmup_args = list(warmup)
+        self.compile_time = 0.0
+        if numba is None:
+            self.dispatcher = func
+        else:
+            self.dispatcher = numba.njit(cache=True, **options)(func)
+
+    def __call__(self, *args):
+        return self.dispatcher(*args)
+
+    def __reduce__(self):
+        return lookup, (self.name,)
+
+    def __repr__(self):
+        return "Kernel(%s)" % self.name
+
+    @property
+    def compiled(self):
+        """
+        Returns True if the kernel has been compiled for all the warmup
+        argument types, or if there is nothing to compile.
+        """
+        if numba is None:
+            return True
+        signatures = set(self.dispatcher.signatures)
+        return all(self.signature(args) in signatures for args in self.warmup_args)
+
+    @staticmethod
+    def signature(args):
+        return tuple(numba.typeof(arg) for arg in args)
+
+    def warmup(self):
+        """
+        Compiles the kernel for the types of its warmup arguments, or loads it
+        from the on-disk cache, so that the first event does not pay for it.
+        Kernels that are already compiled are skipped.
+
+        Returns:
+            The time in seconds spent compiling.
+        """
+        if self.compiled:
+            return 0.0
+
+        start = time.time()
+        for args in self.warmup_args:
+            self.dispatcher.compile(self.signature(args))
+        elapsed = time.time() - start
+
+        self.compile_time += elapsed
+        compile_time.labels(self.name).set(self.compile_time)
+        logger.debug("Compiled kernel %s in %.3f s", self.name, elapsed)
+        return elapsed
+
+
+def kernel(*warmup, **options):
+    """
+    Decorator for registering a module-level function as a Kernel.
+
+    Args:
+        warmup: tuples of example arguments whose types are compiled when the
+            kernel is warmed up.
+        options: extra options passed to `numba.njit`.
+
+    Returns:
+        The decorator.
+    """
+    def decorator(func):
+        k = Kernel(func, warmup, **options)
+        kernels[k.name] = k
+        return k
+    return decorator
+
+
+def warmup(names=None):
+    """
+    Warms up the registered kernels.
+
+    Args:
+        names (iterable): optional names of the kernels to warm up, by
+            default all the registered kernels are warmed up.
+
+    Returns:
+        The total time in seconds spent compiling.
+    """
+    if names is None:
+        names = list(kernels)
+    return sum(lookup(name).warmup() for name in names)
@@ -13,7 +13,7 @@ import ami.multiproc as mp
 
 from ami import LogConfig, Defaults
 from ami.multiproc import check_mp_start_method
-from ami.comm import Ports, PlatformAction, GraphCommHandler
+from ami.comm import Ports, PlatformAction, GraphCommHandler, Backpressure
 from ami.manager import run_manager
 from ami.worker import run_worker
 from ami.collector import run_node_collector, run_global_collector
@@ -200,6 +200,59 @@ def build_parser():
         default=None
     )
 
+    parser.add_argument(
+        '--prefetch',
+        help='number of events each worker reads ahead from the data source while the graphs run (default: 0)',
+        type=int,
+        default=0
+    )
+
+    parser.add_argument(
+        '--backpressure',
+        metavar='[GRAPH=]POLICY',
+        type=Backpressure.parse,
+        action='append',
+        default=[],
+        help='what the workers do with the results of a heartbeat when the collectors are behind: %s '
+             '(default: block), for every graph or one graph (can be repeated)' % ', '.join(Backpressure.Policies)
+    )
+
+    parser.add_argument(
+        '--graph-threads',
+        metavar='DEPTH',
+        help='run each graph of the workers in a thread of its own which skips events when it is more than DEPTH '
+             'events behind, 0 to run the graphs in turn (default: 0)',
+        type=int,
+        default=0
+    )
+
+    parser.add_argument(
+        '--start-method',
+        choices=mp.get_all_start_methods(),
+        help='how the ami processes are started, forkserver starts them from a process that has already imported '
+             'the analysis modules (default: the platform default)'
+    )
+
+    parser.add_argument(
+        '--preload',
+        action='append',
+        default=[],
+        help='an extra module imported by the forkserver before starting the processes (can be repeated)'
+    )
+
+    parser.add_argument(
+        '--view-cache-size',
+        help='maximum size in MB of the cache of serialized views in the manager (default: 256)',
+        type=int,
+        default=256
+    )
+
+    parser.add_argument(
+        '--view-thread',
+        help='serve views from a separate thread in the manager',
+        action='store_true'
+    )
+
     parser.add_argument(
         '--use-opengl',
         help='Use opengl for plots.',
@@ -212,6 +265,12 @@ def build_parser():
         action='store_true'
     )
 
+    parser.add_argument(
+        '--poll-views',
+        help='request plot data from the manager each heartbeat instead of subscribing to it',
+        action='store_true'
+    )
+
     return parser
 
 
@@ -281,6 +340,7 @@ def run_ami(args, queue=None):
         msg_addr = "tcp://%s:%d" % (host, port + Ports.Message)
         info_addr = "tcp://%s:%d" % (host, port + Ports.Info)
         view_addr = "tcp://%s:%d" % (host, port + Ports.View)
+        view_pub_addr = "tcp://%s:%d" % (host, port + Ports.ViewPub)
     else:
         collector_addr = "ipc://%s/node_collector" % ipcdir
         globalcol_addr = "ipc://%s/collector" % ipcdir
@@ -291,6 +351,7 @@ def run_ami(args, queue=None):
         msg_addr = "ipc://%s/message" % ipcdir
         info_addr = "ipc://%s/info" % ipcdir
         view_addr = "ipc://%s/view" % ipcdir
+        view_pub_addr = "ipc://%s/view_pub" % ipcdir
 
     procs = []
     client_proc = None
@@ -330,7 +391,8 @@ def run_ami(args, queue=None):
                 target=functools.partial(_sys_exit, run_worker),
                 args=(i, args.num_workers, args.heartbeat, src_cfg,
                       collector_addr, graph_addr, msg_addr, export_addr, flags, args.prometheus_dir,
-                      args.prometheus_port, args.hutch, args.hwm)
+                      args.prometheus_port, args.hutch, args.hwm, args.prefetch, dict(args.backpressure),
+                      args.graph_threads)
             )
             proc.daemon = True
             proc.start()
@@ -360,7 +422,8 @@ def run_ami(args, queue=None):
             name='manager',
             target=functools.partial(_sys_exit, run_manager),
             args=(args.num_workers, 1, results_addr, graph_addr, comm_addr, msg_addr, info_addr, export_addr,
-                  view_addr, args.prometheus_dir, args.prometheus_port, args.hutch, args.hwm)
+                  view_addr, args.prometheus_dir, args.prometheus_port, args.hutch, args.hwm,
+                  args.view_cache_size << 20, view_pub_addr, args.view_thread)
         )
         manager_proc.daemon = True
         manager_proc.start()
@@ -387,7 +450,8 @@ def run_ami(args, queue=None):
                       args.prometheus_dir, args.prometheus_port, args.hutch,
                       args.use_opengl, args.use_numba,
                       src_cfg is None,
-                      args.save_dir)
+                      args.save_dir,
+                      None if args.poll_views else view_pub_addr)
             )
             client_proc.daemon = False
             client_proc.start()
@@ -430,6 +494,8 @@ def main():
     # start the ami processes
     parser = build_parser()
     args = parser.parse_args()
+    if args.start_method is not None:
+        mp.use_start_method(args.start_method, mp.PRELOAD + args.preload)
     return run_ami(args)
 
 
@@ -4,6 +4,8 @@ import os
 import sys
 import zmq
 import dill
+import queue
+import threading
 import logging
 import collections
 import argparse
@@ -13,14 +15,379 @@ import time
 import datetime as dt
 import prometheus_client as pc
 from ami import LogConfig
-from ami.comm import Ports, PlatformAction, AutoExport, Collector, Store, ZMQ_TOPIC_DELIM
-from ami.data import MsgTypes, Transitions, Serializer, Deserializer
+from ami.comm import Ports, PlatformAction, AutoExport, Collector, Store, ViewCache, ViewOptions, HeartbeatTracer, \
+    ZMQ_TOPIC_DELIM
+from ami.data import MsgTypes, Transitions, Serializer, Deserializer, Stages
 from ami.graphkit_wrapper import Graph
 
 
 logger = logging.getLogger(__name__)
 
 
+class ViewServer:
+    """
+    Serves the views of the entries in the feature stores of the graphs to
+    clients, both on request (view_addr) and to subscribers whenever they
+    are updated (view_pub_addr).
+
+    By default the view sockets are served by the poll loop of the manager
+    and share its feature stores. With threaded set the views are served
+    from a separate thread that keeps its own copy of the feature stores,
+    which the manager feeds with the updates it receives over an in-process
+    queue, so that bursts of view requests can't delay the processing of
+    results by the manager.
+
+    Args:
+        ctx (zmq.Context): the zmq context of the manager.
+        view_addr (str): the zmq address for serving view requests.
+        view_pub_addr (str): optional zmq address for publishing views.
+        view_cache_size (int): the maximum size of the view cache in bytes.
+        hutch (str): the hutch for the prometheus labels.
+        name (str): the process name for the prometheus labels.
+        event_counter (prometheus_client.Counter): the event counter of the
+            manager.
+        event_size (prometheus_client.Gauge): the event size gauge of the
+            manager.
+        feature_stores (dict): the feature stores of the manager to serve, if
+            not threaded.
+        heartbeats (dict): the latest heartbeats of the manager, if not
+            threaded.
+        threaded (bool): serve the views from a separate thread.
+        tracer (HeartbeatTracer): optional tracer to add the traces of the
+            heartbeats to once their views are published.
+    """
+
+    view_req = re.compile(r"view:(?P<graph>[^:]+):(?P<name>[^|]+)(\|(?P<options>.*))?$")
+
+    def __init__(self, ctx, view_addr, view_pub_addr=None, view_cache_size=0, hutch=None, name="manager",
+                 event_counter=None, event_size=None, feature_stores=None, heartbeats=None, threaded=False,
+                 tracer=None):
+        self.ctx = ctx
+        self.hutch = hutch
+        self.name = name
+        self.threaded = threaded
+        self.serializer = Serializer()
+        self.handlers = {}
+        self.event_counter = event_counter
+        self.event_size = event_size
+
+        if threaded:
+            self.feature_stores = {}
+            self.heartbeats = {}
+        else:
+            self.feature_stores = feature_stores
+            self.heartbeats = heartbeats
+
+        self.view_comm_frontend = self.ctx.socket(zmq.ROUTER)  # exports plot data to clients
+        self.view_comm_frontend.bind(view_addr)
+        self.handlers[self.view_comm_frontend] = self.view_front_forward
+
+        self.view_comm_backend = self.ctx.socket(zmq.DEALER)
+        self.view_comm_backend.bind("inproc:///view_dealer")
+        self.handlers[self.view_comm_backend] = self.view_back_forward
+
+        self.view_comm = self.ctx.socket(zmq.REP)
+        self.view_comm.connect("inproc:///view_dealer")
+        self.handlers[self.view_comm] = self.view_request
+
+        self.view_subs = collections.defaultdict(dict)  # { (graph, name) : { topic : options } }
+        self.view_sent = {}  # { topic : time of the last send }
+        if view_pub_addr is None:
+            self.view_pub_comm = None
+        else:
+            self.view_pub_comm = self.ctx.socket(zmq.XPUB)  # publishes updated plot data to subscribed clients
+            self.view_pub_comm.setsockopt(zmq.XPUB_VERBOSE, True)
+            self.view_pub_comm.bind(view_pub_addr)
+            self.handlers[self.view_pub_comm] = self.view_sub_request
+
+        self.view_cache = ViewCache(view_cache_size)
+        self.view_cache_counter = pc.Counter('ami_view_cache_count', 'View Cache Counter',
+                                             ['hutch', 'type', 'process'])
+        self.view_cache_size = pc.Gauge('ami_view_cache_size_bytes', 'View Cache Size', ['hutch', 'process'])
+        self.view_cache_hit_rate = pc.Gauge('ami_view_cache_hit_rate', 'View Cache Hit Rate', ['hutch', 'process'])
+
+        self.tracer = tracer
+        self.stage_latency = pc.Histogram('ami_heartbeat_stage_latency_secs', 'Heartbeat Stage Latency',
+                                          ['hutch', 'graph', 'stage', 'process'],
+                                          buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+
+        self.thread = None
+        if threaded:
+            self.updates = queue.SimpleQueue()
+            # the manager pokes the view thread over an inproc pair whenever it queues an update
+            self.update_notify = self.ctx.socket(zmq.PAIR)
+            self.update_notify.bind("inproc:///view_updates")
+            self.update_comm = self.ctx.socket(zmq.PAIR)
+            self.update_comm.connect("inproc:///view_updates")
+            self.handlers[self.update_comm] = self.update_request
+            self.update_latency = pc.Gauge('ami_view_update_latency_secs', 'View Update Latency', ['hutch', 'process'])
+
+    def start(self):
+        """
+        Starts the thread serving the views if threaded.
+        """
+        if self.threaded and self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="view_server", daemon=True)
+            self.thread.start()
+
+    def close(self):
+        """
+        Stops the thread serving the views if it is running.
+        """
+        if self.thread is not None:
+            self.updates.put(("stop", None, None, time.time()))
+            self.update_notify.send(b"")
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        poller = zmq.Poller()
+        for sock in self.handlers:
+            poller.register(sock, zmq.POLLIN)
+
+        while True:
+            for sock, flag in poller.poll():
+                if flag != zmq.POLLIN:
+                    continue
+                if self.handlers[sock]() is False:
+                    return
+
+    def update(self, graph, heartbeat, payload, trace=None):
+        """
+        Notifies the view server that entries of the feature store of a graph
+        have been updated.
+
+        Args:
+            graph (str): the name of the graph.
+            heartbeat (Heartbeat): the heartbeat of the update.
+            payload (dict): the updated entries of the feature store.
+            trace (dict): optional trace of the heartbeat.
+        """
+        if self.threaded:
+            self.notify("update", graph, (heartbeat, payload, trace))
+        else:
+            self.apply_update(graph, heartbeat, payload, trace)
+
+    def reset(self, graph):
+        """
+        Notifies the view server that the feature store of a graph has been
+        reset or deleted.
+
+        Args:
+            graph (str): the name of the graph.
+        """
+        if self.threaded:
+            self.notify("reset", graph)
+        else:
+            self.apply_reset(graph)
+
+    def notify(self, cmd, graph, args=None):
+        self.updates.put((cmd, graph, args, time.time()))
+        self.update_notify.send(b"")
+
+    def update_request(self):
+        self.update_comm.recv()
+        cmd, graph, args, queued = self.updates.get()
+        self.update_latency.labels(self.hutch, self.name).set(time.time() - queued)
+
+        if cmd == "update":
+            self.apply_update(graph, *args)
+        elif cmd == "reset":
+            self.apply_reset(graph)
+        elif cmd == "stop":
+            return False
+
+    def apply_update(self, graph, heartbeat, payload, trace=None):
+        if self.threaded:
+            if graph not in self.feature_stores:
+                self.feature_stores[graph] = Store()
+            self.feature_stores[graph].update(payload)
+            self.heartbeats[graph] = heartbeat
+        # drop the cached views of the updated entries
+        self.view_cache.invalidate(graph, payload)
+        # publish data for viewing in the AMI GUI
+        self.export_view(graph, keys=payload.keys())
+        if trace and self.tracer is not None:
+            trace[Stages.View] = time.time()
+            for stage, latency in self.tracer.add(graph, heartbeat, trace).items():
+                self.stage_latency.labels(self.hutch, graph, stage, self.name).observe(latency)
+
+    def apply_reset(self, graph):
+        if self.threaded:
+            self.feature_stores.pop(graph, None)
+            self.heartbeats.pop(graph, None)
+        self.view_cache.invalidate(graph)
+        if self.tracer is not None:
+            self.tracer.clear(graph)
+
+    def exists(self, graph, name):
+        return graph in self.feature_stores and self.heartbeats.get(graph) is not None and \
+            name in self.feature_stores[graph]
+
+    def publish_view(self, topic, timestamp, data):
+        return self.send_view(topic, timestamp, self.serializer(data))
+
+    def send_view(self, topic, timestamp, frames, sock=None):
+        if sock is None:
+            sock = self.view_comm
+        sock.send_string(topic + ZMQ_TOPIC_DELIM, zmq.SNDMORE)
+        sock.send_pyobj(timestamp, zmq.SNDMORE)
+        sock.send_multipart(frames, copy=False, flags=zmq.NOBLOCK)
+        return self.serializer.sizeof(frames)
+
+    def parse_view(self, topic):
+        """
+        Parses a view topic of the form 'view:<graph>:<name>[|<options>]'.
+
+        Args:
+            topic (str): the view topic.
+
+        Returns:
+            A tuple of the graph name, entry name and ViewOptions (or None if
+            the topic has no options), or None if the topic is invalid.
+        """
+        matched = self.view_req.match(topic)
+        if matched:
+            try:
+                return matched.group('graph'), matched.group('name'), ViewOptions.parse(matched.group('options'))
+            except ValueError:
+                logger.exception("Received view topic with invalid options: %s", topic)
+        return None
+
+    def view_header(self, graph, name, options=None):
+        """
+        Returns the header sent with the view of an entry in the feature store
+        of a graph. The header is the heartbeat of the graph, unless the entry
+        is binned down for the view. In that case it is a tuple of the
+        heartbeat and the original shape of the entry, so that the client can
+        map the binned pixels back to the original ones.
+
+        Args:
+            graph (str): the name of the graph.
+            name (str): the name of the entry in the feature store.
+            options (ViewOptions): optional options of a reduced view.
+
+        Returns:
+            The header of the view.
+        """
+        heartbeat = self.heartbeats[graph]
+        if options is not None and options.shape is not None:
+            data = self.feature_stores[graph].get(name)
+            if options.factors(data) is not None:
+                return heartbeat, data.shape
+        return heartbeat
+
+    def serialize_view(self, graph, name, options=None):
+        """
+        Returns the serialized frames of an entry in the feature store of a
+        graph. The frames are taken from the view cache if available, otherwise
+        the entry is serialized, reduced first if view options are given, and
+        added to the cache.
+
+        Args:
+            graph (str): the name of the graph.
+            name (str): the name of the entry in the feature store.
+            options (ViewOptions): optional options of a reduced view.
+
+        Returns:
+            The list of serialized frames of the entry.
+        """
+        frames = self.view_cache.get(graph, name, options)
+        if frames is None:
+            self.view_cache_counter.labels(self.hutch, 'Miss', self.name).inc()
+            data = self.feature_stores[graph].get(name)
+            if options is not None:
+                data = options.downsample(data)
+            frames = self.serializer(data)
+            evicted = self.view_cache.put(graph, name, frames, self.serializer.sizeof(frames), options)
+            if evicted:
+                self.view_cache_counter.labels(self.hutch, 'Evict', self.name).inc(evicted)
+            self.view_cache_size.labels(self.hutch, self.name).set(self.view_cache.size)
+        else:
+            self.view_cache_counter.labels(self.hutch, 'Hit', self.name).inc()
+        self.view_cache_hit_rate.labels(self.hutch, self.name).set(self.view_cache.hit_rate)
+        return frames
+
+    def view_request(self):
+        request = self.view_comm.recv_string()
+
+        parsed = self.parse_view(request)
+
+        if parsed:
+            graph, name, options = parsed
+            size = 0
+            if self.exists(graph, name):
+                size += self.send_view(request,
+                                       self.view_header(graph, name, options),
+                                       self.serialize_view(graph, name, options))
+            else:
+                size += self.publish_view(request, None, None)
+                logger.debug("Received view request for unknown graph/feature: %s", request)
+
+            self.event_size.labels(self.hutch, self.name).set(size)
+        else:
+            logger.warn("Received invalid view request: %s", request)
+
+    def view_front_forward(self):
+        req = self.view_comm_frontend.recv_multipart()
+        self.view_comm_backend.send_multipart(req)
+
+    def view_back_forward(self):
+        rep = self.view_comm_backend.recv_multipart()
+        self.view_comm_frontend.send_multipart(rep)
+
+    def view_sub_request(self):
+        request = self.view_pub_comm.recv()
+        topic = request[1:].decode().rstrip(ZMQ_TOPIC_DELIM)
+
+        parsed = self.parse_view(topic)
+
+        if not parsed:
+            logger.warn("Received invalid view subscription: %s", topic)
+        elif request[0] == 1:
+            graph, name, options = parsed
+            self.view_subs[(graph, name)][topic] = options
+            # send the current data so the new subscriber doesn't wait for the next heartbeat
+            if self.exists(graph, name):
+                self.view_sent[topic] = time.time()
+                self.send_view(topic,
+                               self.view_header(graph, name, options),
+                               self.serialize_view(graph, name, options),
+                               self.view_pub_comm)
+        elif request[0] == 0:
+            graph, name, options = parsed
+            topics = self.view_subs.get((graph, name), {})
+            topics.pop(topic, None)
+            if not topics:
+                self.view_subs.pop((graph, name), None)
+            self.view_sent.pop(topic, None)
+
+    def export_view(self, name, keys=[]):
+        if self.view_pub_comm is None:
+            return
+
+        size = 0
+        now = time.time()
+
+        for key in keys:
+            if (name, key) not in self.view_subs or key not in self.feature_stores[name]:
+                continue
+
+            for topic, options in self.view_subs[(name, key)].items():
+                # skip the heartbeats that come faster than the subscriber can render them
+                if options is not None and now - self.view_sent.get(topic, 0) < options.interval:
+                    self.event_counter.labels(self.hutch, 'ViewSkipped', self.name).inc()
+                    continue
+
+                self.view_sent[topic] = now
+                size += self.send_view(topic,
+                                       self.view_header(name, key, options),
+                                       self.serialize_view(name, key, options),
+                                       self.view_pub_comm)
+                self.event_counter.labels(self.hutch, 'View', self.name).inc()
+        self.event_size.labels(self.hutch, self.name).set(size)
+
+
 class Manager(Collector):
     """
     An AMI graph Manager is the control point for an
@@ -42,7 +409,10 @@ class Manager(Collector):
                  view_addr,
                  prometheus_dir,
                  hutch,
-                 hwm):
+                 hwm,
+                 view_cache_size=0,
+                 view_pub_addr=None,
+                 view_thread=False):
         """
         protocol right now only tells you how to communicate with workers
         """
@@ -54,7 +424,6 @@ class Manager(Collector):
         self.partition = {}
         self.feature_stores = {}
         self.feature_req = re.compile(r"(?P<type>fetch):(?P<name>.*)")
-        self.view_req = re.compile(r"view:(?P<graph>[^:]+):(?P<name>.+)$")
         self.graphs = {}
         self.paths = collections.defaultdict(set)
         self.versions = {}  # { graph_name : version_number}
@@ -89,18 +458,16 @@ class Manager(Collector):
         self.node_msg_comm.bind(msg_addr)
         self.register(self.node_msg_comm, self.node_request)
 
-        self.view_comm_frontend = self.ctx.socket(zmq.ROUTER)  # exports plot data to clients
-        self.view_comm_frontend.bind(view_addr)
-        self.register(self.view_comm_frontend, self.view_front_forward)
-
-        self.view_comm_backend = self.ctx.socket(zmq.DEALER)
-        self.view_comm_backend.bind("inproc:///view_dealer")
-        self.register(self.view_comm_backend, self.view_back_forward)
-
-        self.view_comm = self.ctx.socket(zmq.REP)
-        self.view_comm.connect("inproc:///view_dealer")
-
-        self.register(self.view_comm, self.view_request)
+        self.tracer = HeartbeatTracer()
+        self.views = ViewServer(self.ctx, view_addr, view_pub_addr, view_cache_size,
+                                hutch=self.hutch, name=self.name,
+                                event_counter=self.event_counter, event_size=self.event_size,
+                                feature_stores=self.feature_stores, heartbeats=self.heartbeats,
+                                threaded=view_thread, tracer=self.tracer)
+        if not view_thread:
+            for sock, handler in self.views.handlers.items():
+                self.register(sock, handler)
+        self.views.start()
 
         self.prometheus_dir = prometheus_dir
 
@@ -111,6 +478,7 @@ class Manager(Collector):
         self.close()
 
     def close(self):
+        self.views.close()
         self.ctx.destroy()
 
     def process_msg(self, msg):
@@ -119,6 +487,7 @@ class Manager(Collector):
             self.event_latency.labels(self.hutch, 'globalCollector%03d' % msg.identity,
                                       self.name).set(latency.total_seconds())
             datagram_start = time.time()
+            msg.trace[Stages.Manager] = datagram_start
             if msg.name not in self.feature_stores:
                 if msg.name in self.purged:
                     logger.debug("Received data from deleted graph '%s'!", msg.name)
@@ -149,8 +518,8 @@ class Manager(Collector):
                 self.heartbeats[msg.name] = msg.heartbeat
                 # export the heartbeat to epics
                 self.export_heartbeat(msg.name)
-                # export data for viewing in the AMI GUI
-                # self.export_view(msg.name, keys=msg.payload.keys())
+                # publish data for viewing in the AMI GUI
+                self.views.update(msg.name, msg.heartbeat, msg.payload, msg.trace)
 
             self.event_counter.labels(self.hutch, 'Heartbeat', self.name).inc()
             self.event_time.labels(self.hutch, 'Heartbeat', self.name).set(time.time() - datagram_start)
@@ -191,6 +560,7 @@ class Manager(Collector):
             del self.graphs[name]
             del self.versions[name]
             del self.heartbeats[name]
+            self.views.reset(name)
             # notify export of the removed graph
             self.export_destroy(name)
             # add the graph name to the purged list
@@ -263,6 +633,9 @@ class Manager(Collector):
     def cmd_get_heartbeat(self, name):
         self.comm.send_pyobj(self.heartbeats[name])
 
+    def cmd_get_traces(self, name):
+        self.comm.send_pyobj(self.tracer.slowest(name))
+
     def cmd_get_versions(self, name):
         self.comm.send_pyobj((self.versions[name], self.feature_stores[name].version))
 
@@ -317,6 +690,7 @@ class Manager(Collector):
     def cmd_reset_features(self, name):
         self.feature_stores[name].clear()
         self.feature_stores[name].version = 0
+        self.views.reset(name)
         self.export_store(name)
         self.comm.send_string('ok')
 
@@ -517,13 +891,6 @@ class Manager(Collector):
         self.info_comm.send_string(node, zmq.SNDMORE)
         self.info_comm.send(payload)
 
-    def publish_view(self, topic, timestamp, data):
-        self.view_comm.send_string(topic + ZMQ_TOPIC_DELIM, zmq.SNDMORE)
-        self.view_comm.send_pyobj(timestamp, zmq.SNDMORE)
-        data = self.serializer(data)
-        self.view_comm.send_multipart(data, copy=False, flags=zmq.NOBLOCK)
-        return self.serializer.sizeof(data)
-
     def graph_request(self):
         request = self.graph_comm.recv_string()
 
@@ -574,46 +941,6 @@ class Manager(Collector):
         if request == "\x01" or request == "\x01sources":
             self.publish_message("sources", "manager", dill.dumps(self.partition))
 
-    def view_request(self):
-        request = self.view_comm.recv_string()
-
-        matched = self.view_req.match(request)
-
-        if matched:
-            graph = matched.group('graph')
-            name = matched.group('name')
-            size = 0
-            if self.exists(graph) and name in self.feature_stores[graph]:
-                size += self.publish_view("view:%s:%s" % (graph, name),
-                                          self.heartbeats[graph],
-                                          self.feature_stores[graph].get(name))
-            else:
-                size += self.publish_view("view:%s:%s" % (graph, name),
-                                          None, None)
-                logger.debug("Received view request for unknown graph/feature: %s", request)
-
-            self.event_size.labels(self.hutch, self.name).set(size)
-        else:
-            logger.warn("Received invalid view request: %s", request)
-
-    def view_front_forward(self):
-        req = self.view_comm_frontend.recv_multipart()
-        self.view_comm_backend.send_multipart(req)
-
-    def view_back_forward(self):
-        rep = self.view_comm_backend.recv_multipart()
-        self.view_comm_frontend.send_multipart(rep)
-
-    def export_view(self, name, keys=[]):
-        size = 0
-
-        for key, value in self.feature_stores[name].namespace.items():
-            if key in keys:
-                size += self.publish_view("view:%s:%s" % (name, key),
-                                          self.heartbeats[name],
-                                          value)
-        self.event_size.labels(self.hutch, self.name).set(size)
-
     def export_request(self):
         request = self.export.recv_string()
 
@@ -719,7 +1046,10 @@ def run_manager(num_workers,
                 prometheus_dir,
                 prometheus_port,
                 hutch,
-                hwm):
+                hwm,
+                view_cache_size=0,
+                view_pub_addr=None,
+                view_thread=False):
     logger.info('Starting manager, controlling %d workers on %d nodes PID: %d',
                 num_workers, num_nodes, os.getpid())
     with Manager(
@@ -734,7 +1064,10 @@ def run_manager(num_workers,
             view_addr,
             prometheus_dir,
             hutch,
-            hwm) as manager:
+            hwm,
+            view_cache_size,
+            view_pub_addr,
+            view_thread) as manager:
         if prometheus_port:
             manager.start_prometheus(prometheus_port)
         return manager.run()
@@ -812,6 +1145,19 @@ def main():
         default=None
     )
 
+    parser.add_argument(
+        '--view-cache-size',
+        help='maximum size in MB of the cache of serialized views (default: 256)',
+        type=int,
+        default=256
+    )
+
+    parser.add_argument(
+        '--view-thread',
+        help='serve views from a separate thread so clients can\'t delay the processing of results',
+        action='store_true'
+    )
+
     args = parser.parse_args()
 
     results_addr = "tcp://%s:%d" % (args.host, args.port + Ports.Results)
@@ -821,6 +1167,7 @@ def main():
     info_addr = "tcp://%s:%d" % (args.host, args.port + Ports.Info)
     export_addr = "tcp://%s:%d" % (args.host, args.port + Ports.Export)
     view_addr = "tcp://%s:%d" % (args.host, args.port + Ports.View)
+    view_pub_addr = "tcp://%s:%d" % (args.host, args.port + Ports.ViewPub)
 
     log_handlers = [logging.StreamHandler()]
     if args.log_file is not None:
@@ -843,7 +1190,10 @@ def main():
                            args.prometheus_dir,
                            args.prometheus_port,
                            args.hutch,
-                           args.hwm)
+                           args.hwm,
+                           args.view_cache_size << 20,
+                           view_pub_addr,
+                           args.view_thread)
     except KeyboardInterrupt:
         logger.info("Manager killed by user...")
         return 0
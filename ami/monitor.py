@@ -473,7 +473,7 @@ class Monitor():
 def run_monitor(graph_name, export_addr, view_addr, address, http_port):
     logger.info('Starting monitor')
 
-    graphmgr_addr = GraphMgrAddress(graph_name, export_addr, view_addr, None)
+    graphmgr_addr = GraphMgrAddress(graph_name, export_addr, view_addr, None, export_addr)
 
     loop = tornado.ioloop.IOLoop.current()
     with Monitor(graphmgr_addr) as mon:
@@ -537,7 +537,8 @@ def main():
     args = parser.parse_args()
     graph = args.graph_name
     export_addr = "tcp://%s:%d" % (args.host, args.port + Ports.Export)
-    view_addr = "tcp://%s:%d" % (args.host, args.port + Ports.View)
+    # the monitor subscribes to the views published by the manager
+    view_addr = "tcp://%s:%d" % (args.host, args.port + Ports.ViewPub)
     http_port = args.listen_port
     address = args.address
 
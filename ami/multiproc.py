@@ -11,6 +11,22 @@ except ImportError:
     setproctitle = None
 
 
+# the modules imported by the forkserver, which every process started from it then has already imported
+PRELOAD = [
+    'numpy',
+    'amitypes',
+    'ami.psana',
+    'ami.worker',
+    'ami.collector',
+    'ami.manager',
+    'ami.ops.common',
+    'ami.ops.numpy',
+    'ami.ops.operators',
+    'ami.ops.roi',
+    'ami.ops.psalg',
+]
+
+
 def check_mp_start_method():
     if sys.platform == 'darwin':
         method = _mp.get_start_method(allow_none=True)
@@ -20,6 +36,26 @@ def check_mp_start_method():
             warnings.warn("AMI may not work properly on macOS with the %s start method" % _mp.get_start_method())
 
 
+def use_start_method(method, preload=None):
+    """
+    Sets the start method of the processes started afterwards.
+
+    With 'forkserver' a server process is started along with the first
+    process, which imports the preloaded modules once. Every process is then
+    forked from it, so starting the workers does not import numpy, psana and
+    the graph operations again in each of them, and it does not inherit the
+    threads and sockets of the parent either.
+
+    Args:
+        method (str): 'fork', 'spawn' or 'forkserver'.
+        preload (list): the modules imported by the forkserver, `PRELOAD` if
+            None. The modules that are not installed are skipped.
+    """
+    _mp.set_start_method(method, force=True)
+    if method == 'forkserver':
+        _mp.set_forkserver_preload(PRELOAD if preload is None else list(preload))
+
+
 class Process(_mp.Process):
     def __init__(self, group=None, target=None, name=None, args=(), kwargs={},
                  *, daemon=None):
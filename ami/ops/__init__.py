@@ -0,0 +1,9 @@
+"""
+The functions computing the graph nodes of the flowchart library.
+
+The nodes of `ami.flowchart.library` build their graph nodes from the
+functions and classes of the matching module of this package, which only
+depend on numpy and the optional analysis packages. The graph nodes pickle
+them by reference, so loading a graph on a worker or a collector imports
+these modules and never the Qt based flowchart modules.
+"""
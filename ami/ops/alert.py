@@ -0,0 +1,2 @@
+def exceeds(threshold, count, arr):
+    return len(arr[arr > threshold]) > count
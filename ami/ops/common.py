@@ -0,0 +1,38 @@
+import numpy as np
+
+
+def constant(value):
+    return value
+
+
+def identity(*args):
+    return args
+
+
+def apply_each(func, *arrs):
+    """
+    Applies a function to each of the inputs, for nodes with a group of
+    inputs processed the same way.
+    """
+    return list(map(func, arrs))
+
+
+def values_array(*values):
+    return np.asarray(values)
+
+
+def unzip(values):
+    return zip(*values)
+
+
+def drop_count(count, value):
+    return value
+
+
+def accumulate_sum(res, *rest):
+    res += np.sum(rest, axis=0)
+    return res
+
+
+def average(count, value):
+    return value/count
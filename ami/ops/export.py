@@ -0,0 +1,83 @@
+from ami.data import TimestampConverter
+import ami.graph_nodes as gn
+import socket
+import struct
+
+try:
+    import caproto
+    import caproto.threading.client as ct
+except ImportError:
+    caproto = None
+    ct = None
+
+try:
+    import p4p.client.thread as pct
+except ImportError:
+    pct = None
+
+
+class McastProc():
+    def __init__(self, grp, port):
+        self.mcast_grp_port = (grp, int(port))
+        self._socket = None
+        self.ts_converter = None
+
+    def __del__(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def __call__(self, values):
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 8)
+            self.ts_converter = TimestampConverter()
+
+        version = 0
+        validMask = 0
+
+        for data, eventid in sorted(values, key=lambda v: v[1]):
+            timestamp, pulseId = self.ts_converter.decode(eventid)
+            header = struct.pack('QQII', timestamp, pulseId, version, validMask)
+
+            self._socket.sendmsg((header, data), (), 0, self.mcast_grp_port)
+
+        return []
+
+
+class CaputProc():
+
+    def __init__(self, **kwargs):
+        self.pvname = kwargs['pvname']
+        self.ctx = None
+        self.pv = None
+        self.wait = kwargs['wait']
+        self.timeout = kwargs['timeout']
+
+    def __call__(self, values):
+        if self.ctx is None:
+            self.ctx = ct.Context()
+            self.pv = self.ctx.get_pvs(self.pvname)[0]
+        try:
+            for value in sorted(values, key=lambda v: v[1]):
+                self.pv.write(value, wait=self.wait, timeout=self.timeout)
+        except caproto._utils.CaprotoTimeoutError as e:
+            raise gn.AMIWarning(e)
+
+
+class PvputProc():
+
+    def __init__(self, **kwargs):
+        self.pvname = kwargs['pvname']
+        self.ctx = None
+        self.wait = kwargs['wait']
+        self.timeout = kwargs['timeout']
+
+    def __call__(self, values):
+        if self.ctx is None:
+            self.ctx = pct.Context('pva')
+        try:
+            for value in sorted(values, key=lambda v: v[1]):
+                self.ctx.put(self.pvname, value, wait=self.wait, timeout=self.timeout)
+        except TimeoutError:
+            raise gn.AMIWarning("pvput timeout error")
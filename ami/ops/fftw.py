@@ -0,0 +1,20 @@
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+
+class FFTProc():
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.input_ = None
+        self.fft = None
+
+    def __call__(self, arr):
+        if self.fft is None:
+            self.input_ = pyfftw.empty_aligned(arr.shape, dtype=arr.dtype)
+            self.fft = self.builder(self.input_)
+
+        self.input_[:] = arr
+        return self.fft()
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+def array_sum(arr):
+    return np.sum(arr, dtype=np.float64)
+
+
+def histogram(nbins, range, density, arr, weights=None):
+    counts, bins = np.histogram(arr, bins=nbins, range=range, density=density, weights=weights)
+    return bins, counts
+
+
+def histogram_res():
+    return [None, 0]
+
+
+def histogram_reduction(res, *rest):
+    res[0] = rest[0]  # bins
+    res[1] = res[1] + rest[1]  # counts
+    return res
+
+
+def histogram2d(nxbins, nybins, range, density, x, y):
+    counts, xbins, ybins = np.histogram2d(x, y, bins=[nxbins, nybins], range=range, density=density)
+    return xbins, ybins, counts
+
+
+def histogram2d_scalar(nxbins, nybins, range, density, x, y):
+    return histogram2d(nxbins, nybins, range, density, [x], [y])
+
+
+def histogram2d_res():
+    return [None, None, 0]
+
+
+def histogram2d_reduction(res, *rest):
+    res[0] = rest[0]  # xbins
+    res[1] = rest[1]  # ybins
+    res[2] = res[2] + rest[2]  # counts
+    return res
+
+
+def unzip_histogram(count, bins_counts):
+    return tuple(bins_counts)
+
+
+def split(sections, axis, arr):
+    splits = np.split(arr, sections, axis=axis)
+    if axis == 0:
+        return list(map(lambda a: a[0, :], splits))
+    else:
+        return list(map(lambda a: a[:, 0], splits))
+
+
+def stack(axis, *arr):
+    return np.stack(arr, axis=axis)
+
+
+def rms(arr):
+    return np.sqrt(np.mean(np.square(arr)))
+
+
+def mean_rms(arr):
+    mean = np.mean(arr)
+    rms = np.sqrt(np.mean(np.square(arr)))
+    return mean, rms
+
+
+def mean_rms_events(arr):
+    mean = np.mean(arr, axis=0)
+    sq = list(map(np.square, arr.astype(np.float32)))
+    rms = np.sqrt(np.mean(sq, axis=0))
+    return mean, rms
+
+
+def hist_mean_rms(arr):
+    centers = np.arange(len(arr))
+    mean = np.average(centers, 0, arr)
+    var = np.average((centers-mean)**2, 0, arr)
+    std = np.sqrt(var)
+    return mean, std
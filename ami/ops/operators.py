@@ -0,0 +1,178 @@
+import logging
+import itertools
+import numpy as np
+
+try:
+    import sympy
+    from ami.expression import FusedExpression
+except ImportError:
+    sympy = None
+    FusedExpression = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def count(value):
+    return value, 1
+
+
+def sum_counts(cv, v):
+    return cv[0]+v[0], cv[1]+v[1]
+
+
+def digitize_count(bins, k, v):
+    return np.digitize(k, bins), (v, 1)
+
+
+def binned_means(bins, n_values, d):
+    res = {bins[i]: [0]*n_values for i in range(0, bins.size)}
+    for k, v in d.items():
+        try:
+            res[bins[k]] = v[0]/v[1]
+        except IndexError:
+            pass
+    keys, values = zip(*sorted(res.items()))
+    return np.array(keys), np.array(values)
+
+
+def means(d):
+    res = {}
+    for k, v in d.items():
+        res[k] = v[0]/v[1]
+    keys, values = zip(*sorted(res.items()))
+    return np.array(keys), np.array(values)
+
+
+def distribute_outputs(args):
+    """
+    Distribute the binned array elements to the corresponding outputs.
+
+    Inputs:
+        args[0]: bins
+        args[1]: mean_values (array_bin1, array_bin2, array_bin3, ...)
+    """
+    bins = args[0]
+    mean_values = np.atleast_2d(args[1].transpose())
+    return tuple([bins]) + tuple(mean_values)
+
+
+def binned_mean_waveforms(bins, d):
+    res = {}
+    for k, v in d.items():
+        try:
+            res[bins[k]] = v[0]/v[1]
+        except IndexError:
+            pass
+
+    missing_keys = set(bins).difference(res.keys())
+    k, v = d.popitem()
+    for k in missing_keys:
+        res[k] = np.zeros(v[0].shape)
+
+    keys, values = zip(*sorted(res.items()))
+    stack = np.stack(values, axis=1)
+    return np.arange(0, stack.shape[0]), np.array(keys), stack
+
+
+def mean_waveforms(d):
+    res = {}
+    for k, v in d.items():
+        res[k] = v[0]/v[1]
+    keys, values = zip(*sorted(res.items()))
+    stack = np.stack(values, axis=1)
+    return np.arange(0, stack.shape[0]), np.array(keys), stack
+
+
+def listify(value):
+    return [value]
+
+
+def extend(cv, v):
+    cv.extend(v)
+    return cv
+
+
+def digitize_list(bins, k, v):
+    return np.digitize(k, bins), [v]
+
+
+def binned_stats(bins, d):
+    res = {bins[i]: (0, 0, 0) for i in range(0, bins.size)}
+    for k, v in d.items():
+        try:
+            stddev = np.std(v)
+            res[bins[k]] = (np.mean(v), stddev, stddev/np.sqrt(len(v)))
+        except IndexError:
+            pass
+
+    keys, values = zip(*sorted(res.items()))
+    mean, stddev, error = zip(*values)
+    return np.array(keys), np.array(mean), np.array(stddev), np.array(error)
+
+
+def stats(d):
+    res = {}
+    for k, v in d.items():
+        stddev = np.std(v)
+        res[k] = (np.mean(v), stddev, stddev/np.sqrt(len(v)))
+    keys, values = zip(*sorted(res.items()))
+    mean, stddev, error = zip(*values)
+    return np.array(keys), np.array(mean), np.array(stddev), np.array(error)
+
+
+def combinations(length, *args):
+    r = list(map(np.array, zip(*itertools.combinations(*args, length))))
+    if r:
+        return r
+    else:
+        return [np.array([])]*length
+
+
+class CalcProc():
+
+    def __init__(self, params, fused=False):
+        self.params = params
+        self.fused = fused
+        self.func = None
+        self.fused_func = None
+        self.validated = False
+
+    def __eq__(self, other):
+        return type(other) is CalcProc and other.params == self.params and other.fused == self.fused
+
+    def __hash__(self):
+        return hash((tuple(self.params['args']), self.params['expr']))
+
+    def __call__(self, *args, **kwargs):
+        # note: args get passed in order of input terminals on node from top to bottom
+        # sympy symbols need to be defined in same order for this to work correctly
+        if self.func is None:
+            self.func = sympy.lambdify(**self.params, modules=["numpy", "scipy"])
+            if self.fused:
+                try:
+                    self.fused_func = FusedExpression(**self.params)
+                except NotImplementedError as e:
+                    logger.debug("Calculator expression %s is not fused: %s", self.params['expr'], e)
+
+        args = list(args)
+        for idx, arg in enumerate(args):
+            if type(arg) is np.ndarray:
+                args[idx] = arg.astype(np.float64, copy=False)
+
+        if self.fused_func is not None and not kwargs and any(type(arg) is np.ndarray for arg in args):
+            if self.validated:
+                return self.fused_func(*args)
+
+            # check the fused expression against lambdify on the first event
+            result = self.fused_func(*args)
+            expected = self.func(*args)
+            if np.shape(result) == np.shape(expected) and np.allclose(result, expected, equal_nan=True):
+                self.validated = True
+                return result
+            logger.warning("Calculator expression %s gives different results when fused, not fusing it",
+                           self.params['expr'])
+            self.fused_func = None
+            return expected
+
+        return self.func(*args, **kwargs)
@@ -0,0 +1,417 @@
+import os
+import logging
+import numpy as np
+import ami.graph_nodes as gn
+from ami.assembly import ImageAssembler
+from ami.jit import kernel
+
+try:
+    import constFracDiscrim as cfd
+except ImportError:
+    cfd = None
+
+try:
+    import psana.hexanode.DLDProcessor as psfDLD
+except ImportError:
+    psfDLD = None
+
+try:
+    import psana.xtcav.LasingOnCharacterization as psLOC
+except ImportError:
+    psLOC = None
+
+try:
+    from psalg_ext import peak_finder_algos
+except ImportError:
+    peak_finder_algos = None
+
+try:
+    from psana.pyalgos.generic import edgefinder
+except ImportError:
+    edgefinder = None
+
+try:
+    from psana.detector.mask_algos import MaskAlgos
+    from psana.detector.NDArrUtils import info_ndarr
+except ImportError:
+    MaskAlgos = None
+    info_ndarr = None
+
+try:
+    from psana.pscalib.geometry.GeometryAccess import GeometryAccess, convert_mask2d_to_ndarray
+except ImportError:
+    GeometryAccess = None
+    convert_mask2d_to_ndarray = None
+
+try:
+    from ami.pyalgos.NDArrUtils import reshape_to_2d, arr_rot_n90
+    from ami.pyalgos.PSUtils import table_nxn_epix10ka_from_ndarr, table_nxm_jungfrau_from_ndarr
+except ImportError:
+    reshape_to_2d = None
+    arr_rot_n90 = None
+    table_nxn_epix10ka_from_ndarr = None
+    table_nxm_jungfrau_from_ndarr = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def constant_fraction(sampleInterval, horpos, gain, offset, delay, walk, threshold, fraction, waveform):
+    return cfd.cfd(sampleInterval, horpos, gain, offset, waveform, delay, walk, threshold, fraction)
+
+
+def find_peaks(wfpeaks, wts, wfs):
+    return wfpeaks(wfs, wts)
+
+
+def find_hits(hit_finder, nhits, pktsec):
+    hit_finder.FindHits(pktsec[4, :nhits[4]],
+                        pktsec[0, :nhits[0]],
+                        pktsec[1, :nhits[1]],
+                        pktsec[2, :nhits[2]],
+                        pktsec[3, :nhits[3]])
+    return hit_finder.GetXYT()
+
+
+def threshold_img(threshold, img):
+    return np.where(img >= threshold, 1, 0)
+
+
+class DLDProc():
+
+    def __init__(self, **params):
+        self.params = params
+        self.proc = None
+
+    def __call__(self, nev, nhits, pktsec, calib):
+        if self.params['consts'] != calib:
+            self.params['consts'] = calib
+            self.proc = psfDLD.DLDProcessor(**self.params)
+
+        r = self.proc.xyrt_list(nev, nhits, pktsec)
+        if r:
+            x, y, r, t = zip(*r)
+            return (np.array(x), np.array(y), np.array(r), np.array(t))
+        else:
+            return (np.array([]), np.array([]), np.array([]), np.array([]))
+
+
+class LOCProc():
+
+    def __init__(self, **params):
+        self.params = params
+        self.proc = None
+        self.dets = None
+        self.src_key = 0
+
+    def __call__(self, src, cam, pars):
+        time = None
+        power = None
+        agreement = None
+        pulse = None
+
+        if self.proc is None or self.src_key != src.key:
+            if src.cfg['type'] == 'psana':
+                self.src_key = src.key
+                self.dets = psLOC.setDetectors(src.run, camera=cam.det, xtcavpars=pars.det)
+                self.proc = psLOC.LasingOnCharacterization(self.params, src.run, self.dets)
+            else:
+                raise NotImplementedError("XTCAVLasingOn does not support the %s source type!" % src.cfg['type'])
+
+        if self.proc.processEvent(src.evt):
+            time, power, agreement, pulse = self.proc.resultsProcessImage()
+
+        return time, power, agreement, pulse
+
+
+@kernel((np.zeros(3), 0.0, 0.0), (np.zeros(3, dtype=np.float32), 0.0, 0.0))
+def peakfinder1d(waveform, threshold_lo, threshold_hi):
+    centroids = []
+    widths = []
+
+    for i in range(1, waveform.shape[0]-1):
+        if waveform[i] < threshold_hi:
+            continue
+
+        weighted_sum = 0
+        weights = 0
+
+        left = i - 1
+        right = i + 1
+
+        peak = waveform[i]
+
+        left_found = False
+        while threshold_lo < waveform[left] <= peak:
+            left_found = True
+            weighted_sum += waveform[left]*left
+            weights += waveform[left]
+            left -= 1
+            if left < 0:
+                break
+
+        right_found = False
+        while threshold_lo < waveform[right] <= peak:
+            right_found = True
+            weighted_sum += waveform[right]*right
+            weights += waveform[right]
+            right += 1
+            if right > waveform.shape[0] - 1:
+                break
+
+        if left_found and right_found:
+            weighted_sum += peak*i
+            weights += peak
+            centroids.append(weighted_sum/weights)
+            widths.append(right-left-1)
+
+    return np.array(centroids), np.array(widths)
+
+
+class PeakFinder1DProc():
+
+    def __init__(self, threshold_lo, threshold_hi):
+        self.threshold_lo = threshold_lo
+        self.threshold_hi = threshold_hi
+
+    def __call__(self, waveform):
+        return peakfinder1d(waveform, self.threshold_lo, self.threshold_hi)
+
+    def warmup(self):
+        return peakfinder1d.warmup()
+
+
+class PeakfinderAlgos():
+
+    def __init__(self, constructor_params={}, call_params={}, outputs=[]):
+        self.constructor_params = constructor_params
+        self.call_params = call_params
+        self.outputs = outputs
+        self.proc = None
+
+    def __call__(self, img):
+        if self.proc is None:
+            self.proc = peak_finder_algos(pbits=0)
+            self.proc.set_peak_selection_parameters(**self.constructor_params)
+
+        mask = np.ones(img.shape, dtype=np.uint16)
+        peaks = self.proc.peak_finder_v4r3_d2(img, mask, **self.call_params)
+
+        outputs = []
+        for output in self.outputs:
+            outputs.append(np.array(list(map(lambda peak: getattr(peak, output), peaks))))
+
+        return outputs
+
+
+class EdgeFinderProc():
+
+    def __init__(self, calibconsts={}):
+        self.calibconsts = calibconsts
+        self.proc = None
+
+    def __call__(self, image, iir, calib):
+
+        if self.calibconsts.keys() != calib.keys():
+            self.calibconsts = calib
+            self.proc = edgefinder.EdgeFinder(self.calibconsts)
+        elif all(np.array_equal(self.calibconsts[key], calib[key]) for key in calib):
+            self.calibconsts = calib
+            self.proc = edgefinder.EdgeFinder(self.calibconsts)
+
+        r = self.proc(image, iir)
+        if r:
+            return r.edge, r.fwhm, r.amplitude, r.amplitude_next, r.ref_amplitude
+        return np.nan, np.nan, np.nan, np.nan, np.nan
+
+
+class MaskProd():
+
+    def __init__(self, **kwa):
+        logger.info('MaskProd.__init__ kwa: %s' % str(kwa))
+        kwa.pop('calibconsts', None)
+        self.kwa = kwa
+
+    def __call__(self, calib):
+        """ called once per run and set of calibration constants, see gn.RunCache
+        """
+        logger.debug('MaskProd.__call__ : %s' % self.__call__.__doc__.rstrip())
+
+        if not calib:
+            return (None, None)
+
+        logger.info('MaskProd.__call__: calibconsts.keys(): %s' % str(calib.keys()))
+        data_and_meta = calib.get('pixel_status', None)
+        data, meta = (np.nan, None) if data_and_meta is None else data_and_meta
+        logger.debug('pixel_status meta: %s' % str(meta))
+        logger.debug('pixel_status data: %s' % str(data))
+
+        o = MaskAlgos(calib)
+        logger.info('MaskProd.__call__: create mask_comb with pars: %s' % str(self.kwa))
+        mask = o.mask_comb(**self.kwa)
+        logger.debug(info_ndarr(mask, 'mask_comb:'))
+
+        return (None, None) if mask is None else\
+               (mask, None) if mask.ndim == 2 else\
+               (None, mask) if mask.ndim == 3 else\
+               (None, None)
+
+
+class GeometryProd():
+
+    def __init__(self, **kwa):
+        logger.info('GeometryProd.__init__ kwa: %s' % str(kwa))
+        kwa.pop('calibconsts', None)
+        self.kwa = kwa
+        self.geometry = gn.RunCache(self.load_geometry)
+
+    def begin_run(self):
+        self.geometry.begin_run()
+
+    def load_geometry(self, calib):
+        """ called once per run and set of calibration constants, see gn.RunCache
+        """
+        geofname = self.kwa.get('geofname', '')
+        o = GeometryAccess()
+        if geofname and os.path.exists(geofname):
+            logger.info('GeometryProd.load_geometry load geometry from file "%s"' % geofname)
+            o.load_pars_from_file(geofname)
+        elif calib.get('geometry', None) is not None:
+            logger.info('GeometryProd.load_geometry: calibconsts.keys(): %s' % str(calib.keys()))
+            data, meta = calib['geometry']
+            logger.info('geometry meta: %s' % str(meta))
+            logger.info('geometry data: %s' % str(data))
+            o.load_pars_from_str(data)
+        else:
+            return None
+
+        x, y, z = o.get_pixel_coords()
+        ix, iy = o.get_pixel_coord_indexes()
+        shape3d = o.shape3d()
+        x.shape = shape3d
+        y.shape = shape3d
+        z.shape = shape3d
+        ix.shape = shape3d
+        iy.shape = shape3d
+
+        logger.info('\n  %s\n  %s\n  %s\n  %s' %
+                    (info_ndarr(ix, 'ix:'),
+                     info_ndarr(iy, 'iy:'),
+                     info_ndarr(x,  ' x:'),
+                     info_ndarr(y,  ' y:')))
+
+        return [ix, iy], [x, y, z], ImageAssembler(ix, iy)
+
+    def __call__(self, calib, arr3d=None):
+        """ the geometry is loaded once per run, only the image is assembled per call
+        """
+        logger.debug('GeometryProd.kwa: %s' % str(self.kwa))
+
+        geometry = self.geometry(calib)
+        if geometry is None:
+            return (None, None, None)
+
+        inds_xy, coords_xyz, assembler = geometry
+        img = None if arr3d is None else assembler(arr3d)
+
+        return (inds_xy, coords_xyz, img)
+
+
+class Mask3dFrom2dProd():
+
+    def __init__(self, **kwa):
+        logger.info('Mask3dFrom2dProd.__init__ kwa: %s' % str(kwa))
+        self.kwa = kwa
+
+    def __call__(self, inds_xy, mask2d):
+        """ called once per run and set of inputs, see gn.RunCache
+        """
+        iy, ix = inds_xy
+
+        logger.info('Mask3dFrom2dProd\n  %s\n  %s\n  %s' %
+                    (info_ndarr(ix, 'ix:'),
+                     info_ndarr(iy, 'iy:'),
+                     info_ndarr(mask2d, 'input mask2d:')))
+
+        mask3d = None
+        if mask2d is not None:
+            mask3d = convert_mask2d_to_ndarray(mask2d, ix, iy)
+            if mask3d is not None:
+                mask3d.shape = ix.shape
+
+        logger.info(info_ndarr(mask3d, 'output mask3d:'))
+
+        return mask3d
+
+
+class ImageAssemblyProc():
+
+    def __init__(self, reuse=False):
+        self.reuse = reuse
+        self.assembler = gn.RunCache(self.make_assembler, maxsize=1)
+
+    def make_assembler(self, ix, iy):
+        return ImageAssembler(ix, iy, reuse=self.reuse)
+
+    def begin_run(self):
+        self.assembler.begin_run()
+
+    def __call__(self, inds_xy, arr3d):
+        return self.assembler(*inds_xy)(arr3d)
+
+
+class TableFromArr3dProd():
+
+    def __init__(self, **kwa):
+        logger.info('TableFromArr3dProd.__init__ kwa: %s' % str(kwa))
+        self.kwa = kwa
+
+    def __call__(self, arr3d):
+        """ call frequency ~1Hz
+        """
+        logger.info('TableFromArr3dProd.__call__ : %s' % self.__call__.__doc__.rstrip())
+        logger.info(info_ndarr(arr3d, 'input arr3d:'))
+        assert isinstance(arr3d, np.ndarray)
+        assert len(arr3d.shape) >= 3
+        # jungfrau shape (N, 512, 1024)
+        # epix10ka/epixhr shape (N, 352, 384)/(N, 288, 384)
+        arr2d = table_nxm_jungfrau_from_ndarr(arr3d) if (len(arr3d) % 512*1024) == 0 else\
+            table_nxn_epix10ka_from_ndarr(arr3d) if (len(arr3d) % 384) == 0 else\
+            reshape_to_2d(np.array(arr3d))
+        logger.info(info_ndarr(arr2d, 'output 2-d table:'))
+        logger.info('**kwa: %s' % str(self.kwa))
+        transpose = self.kwa.get('transpose', False)
+        ang_n90 = int(self.kwa.get('rot_n90', 90))
+        if transpose:
+            arr2d = arr2d.T
+        if ang_n90 != 0:
+            arr2d = arr_rot_n90(arr2d, rot_ang_n90=ang_n90)
+        return arr2d
+
+
+class TestQtPickleProd():
+
+    def __init__(self, **kwa):
+        logger.info('TestQtPickleProdProd.__init__ kwa: %s' % str(kwa))
+        self.kwa = kwa
+
+    def __call__(self, arr3d):
+        """ call frequency ~1Hz
+        """
+        logger.info(info_ndarr(arr3d, 'TestQtPickleProd.__call__ input arr3d:'))
+        assert isinstance(arr3d, np.ndarray)
+        assert len(arr3d.shape) >= 3
+        # jungfrau shape (N, 512, 1024)
+        # epix10ka/epixhr shape (N, 352, 384)/(N, 288, 384)
+        arr2d = table_nxm_jungfrau_from_ndarr(arr3d) if (len(arr3d) % 512*1024) == 0 else\
+            table_nxn_epix10ka_from_ndarr(arr3d) if (len(arr3d) % 384) == 0 else\
+            reshape_to_2d(np.array(arr3d))
+        logger.info(info_ndarr(arr2d, 'output 2-d table:'))
+        logger.info('**kwa: %s' % str(self.kwa))
+        transpose = self.kwa.get('transpose', False)
+        ang_n90 = int(self.kwa.get('rot_n90', 90))
+        if transpose:
+            arr2d = arr2d.T
+        if ang_n90 != 0:
+            arr2d = arr_rot_n90(arr2d, rot_ang_n90=ang_n90)
+        return arr2d
@@ -0,0 +1,203 @@
+import logging
+import numpy as np
+from ami.roi import RoiEngine, Rect
+from ami.azimuthal import AzimuthalIntegrator, pixel_coords
+
+try:
+    import ami.pyalgos.HPolar as hp
+except ImportError:
+    hp = None
+
+try:
+    import ami.pyalgos.UtilsMask as um
+except ImportError:
+    um = None
+
+try:
+    from ami.pyalgos.NDArrUtils import info_ndarr
+except ImportError:
+    info_ndarr = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def polar_histogram(shape, mask, cx, cy, ro, ri, ao, ai, nr, na):
+    """Returns hp.HPolar object.
+    """
+    rows, cols = shape
+    xarr1 = np.arange(cols) - cx
+    yarr1 = np.arange(rows) - cy
+    xarr, yarr = np.meshgrid(xarr1, yarr1)
+    hpolar = hp.HPolar(xarr, yarr, mask=mask, radedges=(ri, ro),
+                       nradbins=nr, phiedges=(ao, ai), nphibins=na)
+    # logger.info('%s %s\n%s' %(hp.info_ndarr(xarr,
+    #              'pixel coordinate arrays: xarr'),
+    #              hp.info_ndarr(yarr,' yarr'),
+    #              hpolar.info_attrs()))
+    return hpolar
+
+
+class PolarHistogram():
+
+    def __init__(self, *args):
+        logger.info('in PolarHistogram.__init__')
+        self.args = args
+        self.hpolar = None
+        self.mask_arc = None
+
+    def __call__(self, img, mask=None):
+        logger.debug('in PolarHistogram.__call__ %s' % info_ndarr(img, 'image'))
+        cx, cy, ro, ri, ao, ai, nr, na = self.args
+        if self.hpolar is None:
+            logger.info('update hpolar with cx:%.1f, cy:%.1f, ro:%d, ri:%d, ao:%.1f, ai:%.1f, nr:%d, na:%d' %
+                        (cx, cy, ro, ri, ao, ai, nr, na))
+            hp = self.hpolar = polar_histogram(img.shape, mask, cx, cy, ro, ri, ao, ao+ai, nr, na)
+            logger.info(info_ndarr(hp.obj_radbins().bincenters(), '\n  rad bin centers')
+                        + info_ndarr(hp.obj_phibins().bincenters(), '\n  ang bin centers'))
+
+        hp = self.hpolar
+        orbins = hp.obj_radbins()
+        oabins = hp.obj_phibins()
+        ra2d = hp.bin_avrg_rad_phi(img, do_transp=True)
+        rproj = np.sum(ra2d, axis=1)/oabins.nbins()  # normalized per pixel
+        aproj = np.sum(ra2d, axis=0)/orbins.nbins()
+
+        ranpix = hp.bin_number_of_pixels()[:-1]  # remove the last out of ROI bin
+        ranpix.shape = (oabins.nbins(), orbins.nbins())
+        ranpix = np.transpose(ranpix)
+
+        logger.debug(info_ndarr(ra2d, '\n  ra2d')
+                     + info_ndarr(ranpix, '\n  ranpix')
+                     + info_ndarr(orbins.bincenters(), '\n  orbins')
+                     + info_ndarr(oabins.bincenters(), '\n  oabins')
+                     + info_ndarr(rproj, '\n  radial  projection')
+                     + info_ndarr(aproj, '\n  angular projection'))
+
+        if self.mask_arc is None or self.mask_arc.shape != img.shape[::-1]:
+            self.mask_arc = um.mask_arc(img.shape, cx, cy, ro, ri, ao, ai, dtype=np.uint8)
+        mask_arc = self.mask_arc
+
+        return orbins.bincenters(), \
+            oabins.bincenters(), \
+            orbins.binedges(), \
+            oabins.binedges(), \
+            ra2d, \
+            ranpix, \
+            rproj, \
+            aproj, \
+            (cx, cy, ro, ri, ao, ai, nr, na), \
+            (ri, ro-ri, ao, ai-ao), \
+            mask_arc
+
+
+class Roi2DProc():
+
+    def __init__(self, ox, ex, oy, ey, rotation=0):
+        self.coordinates = (ox, ex, oy, ey)
+        self.rect = Rect(ox, ex, oy, ey, rotation)
+
+    def __eq__(self, other):
+        return type(other) is Roi2DProc and other.rect == self.rect
+
+    def __hash__(self):
+        return hash(self.rect)
+
+    def __call__(self, img):
+        # a single rectangle is a view of the image, no gather is needed (see MultiRoiProc)
+        rect = self.rect
+        return np.rot90(img, rect.rotation)[rect.oy:rect.oy+rect.ey, rect.ox:rect.ox+rect.ex], self.coordinates
+
+
+class MultiRoiProc():
+
+    def __init__(self, rois):
+        self.rois = tuple(rois.items())
+        self.engine = RoiEngine(rois)
+
+    def __eq__(self, other):
+        return type(other) is MultiRoiProc and other.rois == self.rois
+
+    def __hash__(self):
+        return hash(self.rois)
+
+    def __call__(self, img):
+        return self.engine.sums(img)
+
+
+class AzimuthalIntegrationProc():
+
+    def __init__(self, terms, cx, cy, pixel_size, **kwargs):
+        self.terms = terms
+        self.center = (cx, cy)
+        self.pixel_size = pixel_size
+        self.integrator = AzimuthalIntegrator(**kwargs)
+        self.geometry = None
+
+    def begin_run(self):
+        self.geometry = None
+
+    @staticmethod
+    def same(a, b):
+        if a is b:
+            return True
+        elif a is None or b is None:
+            return False
+        elif isinstance(a, np.ndarray):
+            return np.array_equal(a, b)
+        return len(a) == len(b) and all(map(np.array_equal, a, b))
+
+    def changed(self, shape, mask, coords):
+        if self.geometry is None:
+            return True
+        prev_shape, prev_mask, prev_coords = self.geometry
+        return shape != prev_shape or not self.same(mask, prev_mask) or not self.same(coords, prev_coords)
+
+    def setup(self, shape, mask, coords):
+        cx, cy = self.center
+        if coords is not None:
+            x, y, z = coords
+            x = x - cx*self.pixel_size
+            y = y - cy*self.pixel_size
+        elif len(shape) == 2:
+            x, y = pixel_coords(shape, cx, cy, self.pixel_size)
+            z = None
+        else:
+            raise ValueError("coords_xyz is needed to integrate a %dd array" % len(shape))
+        self.integrator.setup(x, y, z, mask)
+        self.geometry = (shape, mask, coords)
+
+    def __call__(self, *args):
+        args = dict(zip(self.terms, args))
+        img = args['In']
+        mask = args.get('mask')
+        coords = args.get('coords_xyz')
+
+        if self.changed(img.shape, mask, coords):
+            self.setup(img.shape, mask, coords)
+
+        profile, cake = self.integrator.integrate(img)
+        return self.integrator.radial_centers, profile, self.integrator.phi_centers, cake
+
+
+def roi1d(start, stop, arr):
+    return arr[start:stop]
+
+
+def pixel(x, y, img):
+    return img[x, y]
+
+
+def unzip_points(arr):
+    x, y = zip(*arr)
+    return np.array(x), np.array(y)
+
+
+def scatter_roi(origin, extent, arr):
+    arr = np.array(arr)
+
+    roi = arr[(origin < arr[:, 0]) & (arr[:, 0] < extent)]
+    if roi.size > 0:
+        return roi[:, 0], roi[:, 1]
+    else:
+        return np.array([]), np.array([])
@@ -0,0 +1,13 @@
+import numpy as np
+
+
+def hsd_peak_test(waveform, peaks):
+    for i in range(len(peaks[0])):
+        swf = peaks[1][i]
+        s0 = peaks[0][i]
+        ns = len(swf)
+        if s0+ns >= len(waveform):
+            break
+        if not np.array_equal(swf, waveform[s0:s0+ns]):
+            return 0, 1
+    return 1, 0
@@ -0,0 +1,242 @@
+import math
+import numpy as np
+from collections import namedtuple
+
+
+def arc_mask(shape, cx, cy, ro, ri, ao, ai):
+    """
+    Returns a boolean mask of the pixels of an image inside of an arc ROI.
+
+    This is the same geometry as `UtilsMask.mask_arc`, with the mask
+    computed directly in image coordinates so that it has the shape of the
+    image for non-square images as well.
+
+    Args:
+        shape (tuple): the shape of the image.
+        cx, cy (float): the center of the arc.
+        ro, ri (float): the radii of the outer and inner corner points.
+        ao, ai (float): the angle in degrees of the outer corner point and the
+            angular span of the arc.
+
+    Returns:
+        The boolean mask.
+    """
+    if ro <= ri:
+        raise ValueError("outer radius %s should be greater than inner radius %s" % (ro, ri))
+    if ai <= 0:
+        raise ValueError("arc span angle %s should be greater than 0" % ai)
+
+    x, y = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), indexing='ij')
+    rad = np.hypot(x - cx, y - cy)
+    ring = (rad >= ri) & (rad <= ro)
+
+    def halfplane(radius, angle, delta):
+        x2, y2 = cx + radius*math.cos(angle), cy + radius*math.sin(angle)
+        xm, ym = cx + radius*math.cos(angle+delta), cy + radius*math.sin(angle+delta)
+        if cy == y2:
+            return y <= cy if ym < cy else y >= cy
+        if cx == x2:
+            return x <= cx if xm < cx else x >= cx
+        f = (y2 - cy)/(x2 - cx)
+        if ym > cy + f*(xm - cx):
+            return y <= cy + f*(x - cx)
+        return y >= cy + f*(x - cx)
+
+    delta = -0.1  # radian
+    outer = ring & halfplane(ro, math.radians(ao), delta)
+    inner = ring & halfplane(ri, math.radians(ao + ai), -delta)
+    return (outer & inner) if ai < 180 else (outer | inner)
+
+
+def polygon_mask(shape, points):
+    """
+    Returns a boolean mask of the pixels of an image whose index lies inside
+    of a polygon, using the even-odd rule.
+
+    Args:
+        shape (tuple): the shape of the image.
+        points (list): the (x, y) vertices of the polygon.
+
+    Returns:
+        The boolean mask.
+    """
+    x, y = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), indexing='ij')
+    mask = np.zeros(shape, dtype=bool)
+    points = list(points)
+    for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        mask ^= crosses & (x < x1 + (y - y1)*(x2 - x1)/(y2 - y1))
+    return mask
+
+
+class Rect(namedtuple('Rect', ['ox', 'ex', 'oy', 'ey', 'rotation'], defaults=[0])):
+    """
+    A rectangular ROI, the same region as `np.rot90(img, rotation)[oy:oy+ey, ox:ox+ex]`.
+    """
+
+    def indices(self, shape):
+        index = np.arange(np.prod(shape)).reshape(shape)
+        return np.rot90(index, self.rotation)[self.oy:self.oy+self.ey, self.ox:self.ox+self.ex]
+
+
+class Pixel(namedtuple('Pixel', ['x', 'y'])):
+    """
+    A single pixel ROI, the same pixel as `img[x, y]`.
+    """
+
+    def indices(self, shape):
+        return np.array(np.ravel_multi_index((self.x, self.y), shape))
+
+
+class Arc(namedtuple('Arc', ['cx', 'cy', 'ro', 'ri', 'ao', 'ai'])):
+    """
+    An arc (or annulus) ROI, the pixels of `arc_mask`.
+    """
+
+    def indices(self, shape):
+        return np.flatnonzero(arc_mask(shape, *self))
+
+
+class Polygon(namedtuple('Polygon', ['points'])):
+    """
+    A polygon ROI, the pixels of `polygon_mask`.
+    """
+
+    def indices(self, shape):
+        return np.flatnonzero(polygon_mask(shape, self.points))
+
+
+class RoiEngine:
+    """
+    Extracts many ROIs from the same image in a single pass.
+
+    The flat indices of the pixels of every ROI are computed once per image
+    shape and concatenated into one index map, so each image is read with a
+    single gather no matter how many ROIs are defined, and the sums of all the
+    ROIs come from a single reduction over the gathered pixels.
+
+    Args:
+        rois (dict): optional ROIs to add, keyed by name.
+    """
+
+    def __init__(self, rois=None):
+        self.rois = {}
+        self.shape = None
+        self.index = None
+        self.offsets = None
+        self.sizes = None
+        self.shapes = None
+        if rois is not None:
+            for name, roi in rois.items():
+                self.add(name, roi)
+
+    def __len__(self):
+        return len(self.rois)
+
+    def add(self, name, roi):
+        """
+        Adds a ROI to the engine.
+
+        Args:
+            name (str): the name of the ROI.
+            roi: a Rect, Pixel, Arc or Polygon.
+        """
+        self.rois[name] = roi
+        self.shape = None
+
+    def compile(self, shape):
+        """
+        Computes the index map of the ROIs for images of the given shape. This
+        is done automatically for the first image of each shape.
+
+        Args:
+            shape (tuple): the shape of the image.
+        """
+        indices = [np.asarray(roi.indices(shape)) for roi in self.rois.values()]
+        self.shapes = [idx.shape for idx in indices]
+        self.sizes = np.array([idx.size for idx in indices], dtype=np.intp)
+        self.offsets = np.concatenate(([0], np.cumsum(self.sizes)[:-1])).astype(np.intp)
+        if indices:
+            self.index = np.concatenate([idx.ravel() for idx in indices]).astype(np.intp)
+        else:
+            self.index = np.empty(0, dtype=np.intp)
+        self.shape = shape
+
+    def gather(self, img):
+        """
+        Returns the pixels of all the ROIs concatenated into a 1d array.
+        """
+        if img.shape != self.shape:
+            self.compile(img.shape)
+        return img.ravel()[self.index]
+
+    def extract(self, img):
+        """
+        Returns the pixels of each ROI keyed by name, shaped like the ROI: a
+        2d array for a Rect, a scalar for a Pixel and a 1d array otherwise.
+        """
+        values = self.gather(img)
+        result = {}
+        for name, offset, size, shape in zip(self.rois, self.offsets, self.sizes, self.shapes):
+            data = values[offset:offset+size].reshape(shape)
+            result[name] = data[()] if data.ndim == 0 else data
+        return result
+
+    def sums(self, img):
+        """
+        Returns a 1d array of the sums of each ROI, with the same dtype that
+        `np.sum` would return for the image.
+        """
+        values = self.gather(img)
+        dtype = np.sum(np.zeros(0, dtype=img.dtype)).dtype
+        sums = np.zeros(len(self.rois), dtype=dtype)
+        nonempty = self.sizes > 0
+        if values.size:
+            sums[nonempty] = np.add.reduceat(values, self.offsets[nonempty], dtype=dtype)
+        return sums
+
+
+shapes = {'rect': Rect, 'pixel': Pixel, 'arc': Arc, 'poly': Polygon}
+
+
+def parse_rois(text, rotation=0):
+    """
+    Parses ROIs from text, one ROI per line (or separated by semicolons) given
+    as a kind followed by its parameters::
+
+        rect ox ex oy ey
+        pixel x y
+        arc cx cy ro ri ao ai
+        poly x0 y0 x1 y1 x2 y2 ...
+
+    Args:
+        text (str): the ROI definitions.
+        rotation (int): the rotation applied to the rectangular ROIs.
+
+    Returns:
+        A dictionary of the ROIs keyed by name, the name being the kind and
+        the position of the ROI (e.g. 'rect0').
+    """
+    rois = {}
+    for idx, line in enumerate(filter(None, map(str.strip, text.replace(';', '\n').splitlines()))):
+        kind, *args = line.split()
+        if kind not in shapes:
+            raise ValueError("Unknown ROI kind '%s', expected one of: %s" % (kind, ", ".join(shapes)))
+        try:
+            args = [float(arg) for arg in args]
+            if kind == 'rect':
+                roi = Rect(*map(int, args), rotation=rotation)
+            elif kind == 'pixel':
+                roi = Pixel(*map(int, args))
+            elif kind == 'arc':
+                roi = Arc(*args)
+            else:
+                if len(args) < 6 or len(args) % 2:
+                    raise TypeError("a polygon needs at least three (x, y) points")
+                roi = Polygon(tuple(zip(args[0::2], args[1::2])))
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid ROI '%s': %s" % (line, e)) from e
+        rois["%s%d" % (kind, idx)] = roi
+    return rois
@@ -7,11 +7,12 @@ import json
 import logging
 import argparse
 import time
-import datetime as dt
+import queue
+import threading
 import prometheus_client as pc
 from ami import LogConfig, Defaults
-from ami.comm import Ports, PlatformAction, Colors, ResultStore, Node, AutoExport
-from ami.data import MsgTypes, Source, Transitions
+from ami.comm import Ports, PlatformAction, Colors, ResultStore, Node, AutoExport, EventTimes, Backpressure
+from ami.data import MsgTypes, Source, Transitions, Stages, Heartbeat
 from ami.graphkit_wrapper import Graph
 from ami.data import RequestedData
 
@@ -19,26 +20,297 @@ from ami.data import RequestedData
 logger = logging.getLogger(__name__)
 
 
+class Prefetcher:
+    """
+    Reads the messages of a source in a background thread, so that reading
+    the next events overlaps with running the graphs on the current one.
+
+    The messages are handed over in order through a bounded queue, together
+    with the heartbeat of the source when each message was produced, since
+    the source is ahead of the messages being processed.
+
+    Args:
+        src (Source): the source to read.
+        depth (int): the maximum number of messages read ahead.
+    """
+
+    done = object()
+
+    def __init__(self, src, depth):
+        self.src = src
+        self.queue = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.fill, name="prefetch", daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                # the item may only have fit because close dropped the ones before it
+                return not self.stopped.is_set()
+            except queue.Full:
+                pass
+        return False
+
+    def fill(self):
+        events = self.src.events()
+        try:
+            for msg in events:
+                if not self.put((msg, self.src.heartbeat)):
+                    return
+        except Exception as e:
+            self.put(e)
+            return
+        finally:
+            # the source is only used from this thread, so it is also closed here
+            events.close()
+        self.put(self.done)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is self.done:
+                return
+            elif isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        """
+        Stops reading the source and drops the messages read ahead. Returns
+        once the thread is done with the source, after the message it is
+        reading, so that the source can be replaced.
+        """
+        self.stopped.set()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.thread.join()
+
+
+class GraphRunner:
+    """
+    Runs a graph of a worker in a thread of its own, so that a slow graph
+    does not hold up the other graphs of the worker.
+
+    The worker passes every event to the runner of each graph. A runner which
+    falls `depth` messages behind skips events until it catches up. When the
+    runner reaches a heartbeat or the graph fails it hands over to the worker,
+    which is the only one to use the sockets, and waits for the worker to
+    collect the results of the graph or purge it before going on.
+
+    Args:
+        worker (Worker): the worker running the graph.
+        name (str): the name of the graph.
+        depth (int): the maximum number of messages waiting to be run.
+    """
+
+    stop = object()
+
+    def __init__(self, worker, name, depth):
+        self.worker = worker
+        self.name = name
+        self.maxsize = depth
+        self.queue = queue.Queue()
+        self.released = threading.Event()
+        self.times = EventTimes()
+        self.first_event = None  # time of the first event of the current heartbeat
+        self.events = 0
+        self.skipped = 0
+        self.thread = threading.Thread(target=self.run, name="graph-%s" % name, daemon=True)
+        self.thread.start()
+
+    def put(self, msg):
+        """
+        Passes an event to the graph, unless the runner is too far behind.
+        """
+        if self.queue.qsize() >= self.maxsize:
+            self.skipped += 1
+        else:
+            self.queue.put(msg)
+
+    def heartbeat(self, heartbeat):
+        self.queue.put(heartbeat)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def busy(self):
+        return self.queue.unfinished_tasks > 0
+
+    def counts(self):
+        """
+        Returns the number of events which were run and skipped since the last
+        call.
+        """
+        counts = self.events, self.skipped
+        self.events = 0
+        self.skipped = 0
+        return counts
+
+    def handover(self, kind, value):
+        self.worker.graph_results.put((kind, self.name, value))
+        self.released.wait()
+        self.released.clear()
+
+    def release(self):
+        self.released.set()
+
+    def execute(self, msg):
+        graph = self.worker.graphs.get(self.name)
+        if not graph:
+            return
+
+        if self.first_event is None:
+            self.first_event = msg.unix_ts or time.time()
+
+        # the graph removes missing values from the event, so each graph gets its own copy
+        payload = dict(msg.payload)
+        if self.name in self.worker.exports:
+            payload.update(self.worker.exports[self.name])
+
+        try:
+            start = time.time()
+            graph_result = graph(payload, color=Colors.Worker)
+            stop = time.time()
+            self.worker.store.update(self.name, graph_result)
+            self.times.add(start, stop)
+            self.events += 1
+        except Exception as e:
+            e.graph_name = self.name
+            logger.exception("%s: Failure encountered while executing graph (%s, v%d):",
+                             self.worker.name, self.name, self.worker.store.version(self.name))
+            self.handover("error", e)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is self.stop:
+                    return
+                elif isinstance(item, Heartbeat):
+                    self.handover("heartbeat", item)
+                else:
+                    self.execute(item)
+            finally:
+                self.queue.task_done()
+
+    def close(self, timeout=1.0):
+        self.queue.put(self.stop)
+        self.release()
+        self.thread.join(timeout)
+
+
+class WorkerMetrics:
+    """
+    The prometheus metrics of a worker. The children of the metrics updated
+    for every event are bound to their labels once, instead of looking them
+    up under a lock on each update.
+
+    Args:
+        hutch (str): the hutch label.
+        process (str): the process label.
+    """
+
+    def __init__(self, hutch, process):
+        event_counter = pc.Counter('ami_event_count', 'Event Counter', ['hutch', 'type', 'process'])
+        event_time = pc.Gauge('ami_event_time_secs', 'Event Time', ['hutch', 'type', 'process'])
+        event_size = pc.Gauge('ami_event_size_bytes', 'Event Size', ['hutch', 'process'])
+        event_latency = pc.Gauge('ami_event_latency_secs', 'Event Latency', ['hutch', 'sender', 'process'])
+        prefetch_depth = pc.Gauge('ami_prefetch_queue_depth', 'Prefetch Queue Depth', ['hutch', 'process'])
+        self.filter_counter = pc.Counter('ami_filter_count', 'Filter Counter',
+                                         ['hutch', 'graph', 'filter', 'result', 'process'])
+        self.shed_counter = pc.Counter('ami_shed_count', 'Shed Heartbeat Contributions',
+                                       ['hutch', 'graph', 'policy', 'process'])
+        self.graph_counter = pc.Counter('ami_graph_event_count', 'Graph Event Counter',
+                                        ['hutch', 'graph', 'result', 'process'])
+        self.graph_backlog = pc.Gauge('ami_graph_backlog', 'Graph Backlog', ['hutch', 'graph', 'process'])
+
+        self.hutch = hutch
+        self.process = process
+        self.heartbeats = event_counter.labels(hutch, 'Heartbeat', process)
+        self.datagrams = event_counter.labels(hutch, 'Datagram', process)
+        self.partials = event_counter.labels(hutch, 'Partial', process)
+        self.transitions = event_counter.labels(hutch, 'Transition', process)
+        self.others = event_counter.labels(hutch, 'Other', process)
+        self.idle_time = event_time.labels(hutch, 'Idle', process)
+        self.heartbeat_time = event_time.labels(hutch, 'Heartbeat', process)
+        self.datagram_time = event_time.labels(hutch, 'Datagram', process)
+        self.event_size = event_size.labels(hutch, process)
+        self.source_latency = event_latency.labels(hutch, 'Source', process)
+        self.prefetch_depth = prefetch_depth.labels(hutch, process)
+        self.reconfigure_time = event_time.labels(hutch, 'Reconfigure', process)
+
+    def filtered(self, graph, counts):
+        """
+        Adds the number of events which passed and failed the filters of a
+        graph (see Graph.filter_counts).
+        """
+        for name, (passed, failed) in counts.items():
+            self.filter_counter.labels(self.hutch, graph, name, 'Passed', self.process).inc(passed)
+            self.filter_counter.labels(self.hutch, graph, name, 'Failed', self.process).inc(failed)
+
+    def shed(self, store):
+        """
+        Adds the number of contributions of each graph which the result store
+        dropped or coalesced because the collector was not keeping up.
+        """
+        for graph, count in store.shed_counts().items():
+            policy = store.policy(graph)
+            logger.debug("%s: %s %d contributions of graph %s", self.process, policy, count, graph)
+            self.shed_counter.labels(self.hutch, graph, policy, self.process).inc(count)
+
+    def runner(self, runner):
+        """
+        Adds the number of events which the runner of a graph ran and skipped,
+        and sets the number of messages waiting for it.
+        """
+        events, skipped = runner.counts()
+        self.graph_counter.labels(self.hutch, runner.name, 'Run', self.process).inc(events)
+        self.graph_counter.labels(self.hutch, runner.name, 'Skipped', self.process).inc(skipped)
+        self.graph_backlog.labels(self.hutch, runner.name, self.process).set(runner.depth())
+
+
 class Worker(Node):
     def __init__(self, node, src, collector_addr, graph_addr, msg_addr, export_addr, prometheus_dir,
-                 prometheus_port, hutch, hwm):
+                 prometheus_port, hutch, hwm, prefetch=0, backpressure=None, graph_threads=0):
         """
         node : int
             a unique integer identifying this worker
         src : object
             object with an events() method that is an iterable (like psana.DataSource)
+        prefetch : int
+            the number of messages to read ahead from the source in a background thread, 0 to read them in turn
+        backpressure : dict
+            the backpressure policy of each graph (see ami.comm.ResultStore), blocking if None
+        graph_threads : int
+            the number of events each graph may fall behind when run in a thread of its own (see GraphRunner), 0
+            to run the graphs in turn
         """
         super().__init__(node, graph_addr, msg_addr, export_addr, prometheus_dir=prometheus_dir,
                          prometheus_port=prometheus_port, hutch=hutch)
 
         self.src = src
         self.pending_src = False
-        self.store = ResultStore(collector_addr, self.ctx, hwm)
+        self.reconfigure_start = None  # time the pending source configuration was received
+        self.metrics = None
+        self.store = ResultStore(collector_addr, self.ctx, hwm, backpressure)
 
         self.graph_comm.add_handler("update_sources", self.update_sources)
         self.graph_comm.add_handler("update_requested_data", self.update_requests_kwargs)
 
         self.exports = {}
+        self.first_event = None  # time of the first event of the current heartbeat
+        self.prefetch = prefetch
+        self.graph_threads = graph_threads
+        self.runners = {}
+        self.graph_results = queue.Queue()
 
     def __enter__(self):
         return self
@@ -51,8 +323,115 @@ class Worker(Node):
         return "worker%03d" % self.node
 
     def close(self):
+        for runner in self.runners.values():
+            runner.close()
         self.ctx.destroy()
 
+    @property
+    def threaded(self):
+        # lazy sources run the graphs in turn for the same reason they are not prefetched (see events)
+        return self.graph_threads > 0 and self.src is not None and not self.src.config.get('lazy', False)
+
+    def update_runners(self):
+        """
+        Starts a runner for each new graph and stops the runners of the purged
+        graphs, when the graphs run in threads of their own.
+        """
+        names = set(self.graphs) if self.threaded else set()
+        for name in set(self.runners) - names:
+            self.runners.pop(name).close()
+        for name in names - set(self.runners):
+            self.runners[name] = GraphRunner(self, name, self.graph_threads)
+
+    def handle_graph_results(self, metrics, timeout=0):
+        """
+        Collects the results of the graphs which reached a heartbeat and purges
+        the graphs which failed, releasing their runners.
+
+        Returns:
+            The size in bytes of the collected results.
+        """
+        size = 0
+        while True:
+            try:
+                kind, name, value = self.graph_results.get(timeout=timeout) if timeout else \
+                    self.graph_results.get_nowait()
+            except queue.Empty:
+                return size
+
+            runner = self.runners.get(name)
+            try:
+                if runner is None:
+                    continue
+                elif kind == "heartbeat":
+                    size += self.collect_graph(runner, value, metrics)
+                elif kind == "error":
+                    self.report("error", value)
+                    logger.error("%s: Purging graph (%s v%d)", self.name, name, self.store.version(name))
+                    self.clear_graph(name)
+                    self.report("purge", name)
+            finally:
+                if runner is not None:
+                    runner.release()
+
+    def collect_graph(self, runner, heartbeat, metrics):
+        """
+        Sends the results of the graph of a runner for a heartbeat to the
+        collector, the counterpart of collect for a graph run in a thread.
+        """
+        name = runner.name
+        size = 0
+        if name in self.store:
+            trace = {Stages.Worker: time.time()}
+            if runner.first_event is not None:
+                trace[Stages.Source] = runner.first_event
+                runner.first_event = None
+            size = self.store.collect(self.node, heartbeat, trace, names=[name])
+            metrics.shed(self.store)
+
+        graph = self.graphs.get(name)
+        if graph:
+            # a coalesced graph keeps accumulating until its contribution is sent
+            if name not in self.store.coalesced:
+                self.store.clear(name)
+                graph.heartbeat_finished()
+
+            for node_name, warning in graph.warnings().items():
+                warning.graph_name = name
+                self.report("warning", warning)
+
+            metrics.filtered(name, graph.filter_counts())
+
+        metrics.runner(runner)
+        if runner.times.count:
+            self.report("event_rate", {name: runner.times.summary(), 'num_events': self.num_events})
+            runner.times = EventTimes()
+        return size
+
+    def recv_graph_updates(self, metrics):
+        """
+        Applies the pending graph updates. The runners go through the events
+        passed to them before each update, so that no graph is changed while
+        it runs.
+        """
+        while self.graph_comm.sock.poll(0):
+            if self.runners:
+                self.drain_graphs(metrics)
+            try:
+                self.graph_comm.recv(False)
+            except zmq.Again:
+                break
+        self.update_runners()
+
+    def drain_graphs(self, metrics):
+        """
+        Waits for the runners to go through the messages passed to them, so
+        that the graphs can be changed.
+        """
+        while any(runner.busy() for runner in self.runners.values()):
+            self.handle_graph_results(metrics, timeout=0.01)
+        self.handle_graph_results(metrics)
+
     def init_graph(self, name):
         if name not in self.graphs or self.graphs[name] is None:
             self.graphs[name] = Graph(name)
@@ -124,13 +503,20 @@ class Worker(Node):
         hb_period = src_cfg['hb_period']
         num_workers = args['num_workers']
         logger.info("%s: Received source configuration", self.name)
+        if not self.pending_src:
+            self.reconfigure_start = time.time()
         try:
             src_cls = Source.find_source(src_type)
             flags = {}
             if self.src is None:
-                self.report("info", "Updated source configuration")
                 self.src = src_cls(self.node, num_workers, hb_period, src_cfg, flags)
                 self.pending_src = False
+                self.source_updated("new source")
+            elif not self.pending_src and type(self.src) is src_cls and self.src.heartbeat_period == hb_period \
+                    and self.src.num_workers == num_workers and self.src.reconfigure(src_cfg, flags):
+                # the running source applied the change itself without an unconfigure, unless it is
+                # already going to be replaced with a configuration this one has to supersede
+                self.source_updated("running source")
             else:
                 self.pending_src = True
                 self.report("info", "Pending source configuration")
@@ -139,9 +525,20 @@ class Worker(Node):
             self.report("error", e)
             logger.error("%s: Error configuring source", self.name)
 
+    def source_updated(self, how):
+        latency = time.time() - self.reconfigure_start
+        logger.info("%s: Updated source configuration of the %s in %.3f s", self.name, how, latency)
+        if self.metrics is not None:
+            self.metrics.reconfigure_time.set(latency)
+        self.report("info", "Updated source configuration (%s, %.1f ms)" % (how, latency*1e3))
+
     def collect(self, heartbeat):
         # send the data from the store to collector
-        size = self.store.collect(self.node, heartbeat)
+        trace = {Stages.Worker: time.time()}
+        if self.first_event is not None:
+            trace[Stages.Source] = self.first_event
+            self.first_event = None
+        size = self.store.collect(self.node, heartbeat, trace)
 
         # update the profiler data
         # if self.times:
@@ -153,14 +550,36 @@ class Worker(Node):
         #     self.times = {}
 
         if self.event_rate:
-            self.event_rate['num_events'] = self.num_events
-            self.report("event_rate", self.event_rate)
+            # a summary of the execution times of each graph instead of the times of every event
+            rates = {name: times.summary() for name, times in self.event_rate.items()}
+            rates['num_events'] = self.num_events
+            self.report("event_rate", rates)
             self.event_rate = {}
 
         # clear the data from the store after collecting
         self.store.clear()
         return size
 
+    def events(self, metrics):
+        """
+        Yields the messages of the source with the heartbeat of the source
+        when each message was produced, reading ahead in a thread if the
+        worker prefetches.
+        """
+        if self.prefetch <= 0 or self.src.config.get('lazy', False):
+            # lazy event data has to be read before the source moves on to the next event
+            for msg in self.src.events():
+                yield msg, self.src.heartbeat
+            return
+
+        prefetcher = Prefetcher(self.src, self.prefetch)
+        try:
+            for item in prefetcher:
+                metrics.prefetch_depth.set(prefetcher.depth())
+                yield item
+        finally:
+            prefetcher.close()
+
     def run(self):
         # self.times = {}
         self.event_rate = {}
@@ -171,38 +590,44 @@ class Worker(Node):
             logger.info("%s: Waiting for source configuration", self.name)
             self.graph_comm.recv(True)
 
-        event_counter = pc.Counter('ami_event_count', 'Event Counter', ['hutch', 'type', 'process'])
-        event_time = pc.Gauge('ami_event_time_secs', 'Event Time', ['hutch', 'type', 'process'])
-        event_size = pc.Gauge('ami_event_size_bytes', 'Event Size', ['hutch', 'process'])
-        event_latency = pc.Gauge('ami_event_latency_secs', 'Event Latency', ['hutch', 'sender', 'process'])
+        metrics = self.metrics = WorkerMetrics(self.hutch, self.name)
+        self.update_runners()
 
         idle_start = time.time()
         idle_stop = time.time()
         heartbeat_time = 0
 
         while True:
-            for msg in self.src.events():
+            events = self.events(metrics)
+            for msg, src_heartbeat in events:
                 idle_stop = time.time()
-                event_time.labels(self.hutch, 'Idle', self.name).set(idle_stop - idle_start)
+                metrics.idle_time.set(idle_stop - idle_start)
 
                 # check to see if the graph has been reconfigured after update
                 if msg.mtype == MsgTypes.Heartbeat:
                     heartbeat_start = time.time()
-                    size = self.collect(msg.payload)
-                    for name, graph in self.graphs.items():
-                        if graph:
-                            graph.heartbeat_finished()
+                    if self.runners:
+                        # each graph sends its results when its runner reaches the heartbeat
+                        for runner in self.runners.values():
+                            runner.heartbeat(msg.payload)
+                        size = self.handle_graph_results(metrics)
+                    else:
+                        size = self.collect(msg.payload)
+                        metrics.shed(self.store)
+                        for name, graph in self.graphs.items():
+                            if graph:
+                                # a coalesced graph keeps accumulating until its contribution is sent
+                                if name not in self.store.coalesced:
+                                    graph.heartbeat_finished()
 
-                            for node_name, warning in graph.warnings().items():
-                                warning.graph_name = name
-                                self.report("warning", warning)
+                                for node_name, warning in graph.warnings().items():
+                                    warning.graph_name = name
+                                    self.report("warning", warning)
+
+                                metrics.filtered(name, graph.filter_counts())
 
                     # check if there are graph updates
-                    while True:
-                        try:
-                            self.graph_comm.recv(False)
-                        except zmq.Again:
-                            break
+                    self.recv_graph_updates(metrics)
 
                     while True:
                         try:
@@ -212,27 +637,35 @@ class Worker(Node):
                         except zmq.Again:
                             break
 
-                    event_counter.labels(self.hutch, 'Heartbeat', self.name).inc()
+                    metrics.heartbeats.inc()
 
                     if self.pending_src:
                         break
 
                     heartbeat_stop = time.time()
                     heartbeat_time += heartbeat_stop - heartbeat_start
-                    event_time.labels(self.hutch, 'Heartbeat', self.name).set(heartbeat_time)
-                    event_size.labels(self.hutch, self.name).set(size)
+                    metrics.heartbeat_time.set(heartbeat_time)
+                    metrics.event_size.set(size)
                     heartbeat_time = 0
 
                 elif msg.mtype == MsgTypes.Datagram:
                     datagram_start = time.time()
-                    input_latency = dt.datetime.now() - dt.datetime.fromtimestamp(msg.unix_ts)
-                    event_latency.labels(self.hutch, "Source",
-                                         self.name).set(input_latency.total_seconds())
+                    metrics.source_latency.set(datagram_start - msg.unix_ts)
+                    if self.first_event is None:
+                        self.first_event = msg.unix_ts or datagram_start
+
+                    if any(v is None for v in msg.payload.values()):
+                        metrics.partials.inc()
 
-                    if any(v is None for k, v in msg.payload.items()):
-                        event_counter.labels(self.hutch, 'Partial', self.name).inc()
+                    for runner in self.runners.values():
+                        runner.put(msg)
+                    if self.runners:
+                        self.handle_graph_results(metrics)
 
                     for name, graph in self.graphs.items():
+                        if name in self.runners:
+                            continue
+
                         graph_result = None
                         try:
                             if graph:
@@ -246,9 +679,9 @@ class Worker(Node):
                                 self.store.update(name, graph_result)
 
                                 if name not in self.event_rate:
-                                    self.event_rate[name] = []
+                                    self.event_rate[name] = EventTimes()
 
-                                self.event_rate[name].append((start, stop))
+                                self.event_rate[name].add(start, stop)
 
                                 # if name not in self.times:
                                 #     self.times[name] = []
@@ -264,20 +697,22 @@ class Worker(Node):
                             self.report("purge", name)
 
                     self.num_events += 1
-                    event_counter.labels(self.hutch, 'Datagram', self.name).inc()
+                    metrics.datagrams.inc()
                     datagram_duration = time.time() - datagram_start
-                    event_time.labels(self.hutch, 'Datagram', self.name).set(datagram_duration)
+                    metrics.datagram_time.set(datagram_duration)
                     heartbeat_time += datagram_duration
 
                 elif msg.mtype == MsgTypes.Transition:
+                    # the transitions change the state of the graphs once they are through the events before them
+                    self.drain_graphs(metrics)
                     if msg.payload.ttype == Transitions.Configure:
                         for name, graph in self.graphs.items():
                             if graph:
                                 graph.reset()
                                 graph.begin_run(color=Colors.Worker)
                     elif msg.payload.ttype == Transitions.Unconfigure:
-                        if self.src.heartbeat is not None:
-                            self.collect(self.src.heartbeat)
+                        if src_heartbeat is not None:
+                            self.collect(src_heartbeat)
                         for name, graph in self.graphs.items():
                             if graph:
                                 graph.end_run(color=Colors.Worker)
@@ -292,22 +727,28 @@ class Worker(Node):
 
                     # forward the transition
                     self.store.send(msg)
-                    event_counter.labels(self.hutch, 'Transition', self.name).inc()
+                    metrics.transitions.inc()
                 else:
                     self.store.send(msg)
-                    event_counter.labels(self.hutch, 'Other', self.name).inc()
+                    metrics.others.inc()
 
                 idle_start = time.time()
 
+            # stop reading ahead before the source is replaced
+            events.close()
+
             if self.pending_src:
+                self.drain_graphs(metrics)
                 msg = self.src.unconfigure()
                 self.store.send(msg)
                 self.src = None
                 self.update_sources(**self.source_args)
+                self.update_runners()
 
 
 def run_worker(num, num_workers, hb_period, source, collector_addr, graph_addr, msg_addr, export_addr,
-               flags=None, prometheus_dir=None, prometheus_port=None, hutch=None, hwm=None):
+               flags=None, prometheus_dir=None, prometheus_port=None, hutch=None, hwm=None, prefetch=0,
+               backpressure=None, graph_threads=0):
 
     logger.info('Starting worker # %d, sending to collector at %s PID: %d', num, collector_addr, os.getpid())
 
@@ -345,7 +786,7 @@ def run_worker(num, num_workers, hb_period, source, collector_addr, graph_addr,
             return 1
 
     with Worker(num, src, collector_addr, graph_addr, msg_addr, export_addr, prometheus_dir, prometheus_port,
-                hutch, hwm) as worker:
+                hutch, hwm, prefetch, backpressure, graph_threads) as worker:
         return worker.run()
 
 
@@ -459,6 +900,32 @@ def main():
         default=None
     )
 
+    parser.add_argument(
+        '--prefetch',
+        help='number of events read ahead from the data source while the graphs run (default: 0)',
+        type=int,
+        default=0
+    )
+
+    parser.add_argument(
+        '--backpressure',
+        metavar='[GRAPH=]POLICY',
+        type=Backpressure.parse,
+        action='append',
+        default=[],
+        help='what to do with the results of a heartbeat when the collector is behind: %s (default: block), '
+             'for every graph or one graph (can be repeated)' % ', '.join(Backpressure.Policies)
+    )
+
+    parser.add_argument(
+        '--graph-threads',
+        metavar='DEPTH',
+        help='run each graph in a thread of its own which skips events when it is more than DEPTH events behind, '
+             '0 to run the graphs in turn (default: 0)',
+        type=int,
+        default=0
+    )
+
     parser.add_argument(
         'source',
         nargs='?',
@@ -493,7 +960,10 @@ def main():
                           args.prometheus_dir,
                           args.prometheus_port,
                           args.hutch,
-                          args.hwm)
+                          args.hwm,
+                          args.prefetch,
+                          dict(args.backpressure),
+                          args.graph_threads)
     except KeyboardInterrupt:
         logger.info("Worker killed by user...")
         return 0
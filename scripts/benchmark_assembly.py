@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+import timeit
+import argparse
+import numpy as np
+from ami.assembly import ImageAssembler
+
+try:
+    from psana.pscalib.geometry.GeometryAccess import img_from_pixel_arrays
+except ImportError:
+    def img_from_pixel_arrays(rows, cols, W=None, dtype=np.float32, vbase=0):
+        # the psana implementation, for environments without psana
+        rsize = int(rows.max())+1
+        csize = int(cols.max())+1
+        weight = np.ones_like(rows) if W is None else W
+        img = vbase*np.ones((rsize, csize), dtype=dtype)
+        img[rows, cols] = weight
+        return img
+
+
+parser = argparse.ArgumentParser(description='Benchmark image assembly from detector panels.')
+parser.add_argument('--panels', type=int, default=16, help='Number of panels (default: 16).')
+parser.add_argument('--rows', type=int, default=352, help='Rows per panel (default: 352).')
+parser.add_argument('--cols', type=int, default=384, help='Columns per panel (default: 384).')
+parser.add_argument('--gap', type=int, default=20, help='Gap in pixels between panels (default: 20).')
+parser.add_argument('--number', type=int, default=50, help='Number of images to assemble (default: 50).')
+
+
+def geometry(panels, rows, cols, gap):
+    """
+    Returns the pixel index arrays of panels laid out on a square grid, with
+    every other panel rotated by 180 degrees like on an Epix10ka2M.
+    """
+    side = int(np.ceil(np.sqrt(panels)))
+    r, c = np.meshgrid(np.arange(rows), np.arange(cols), indexing='ij')
+    ix = np.empty((panels, rows, cols), dtype=np.uint32)
+    iy = np.empty((panels, rows, cols), dtype=np.uint32)
+    for p in range(panels):
+        pr, pc = divmod(p, side)
+        pix_r, pix_c = (r, c) if p % 2 == 0 else (rows - 1 - r, cols - 1 - c)
+        ix[p] = pr*(rows + gap) + pix_r
+        iy[p] = pc*(cols + gap) + pix_c
+    return ix, iy
+
+
+def benchmark(args):
+    ix, iy = geometry(args.panels, args.rows, args.cols, args.gap)
+    data = np.random.default_rng(0).random(ix.shape, dtype=np.float32)
+
+    start = timeit.default_timer()
+    assembler = ImageAssembler(ix, iy)
+    setup = timeit.default_timer() - start
+    reused = ImageAssembler(ix, iy, reuse=True)
+
+    expected = img_from_pixel_arrays(ix.ravel(), iy.ravel(), W=data.ravel())
+    assert np.array_equal(assembler(data), expected)
+    assert np.array_equal(reused(data), expected)
+
+    results = {
+        'psana img_from_pixel_arrays': lambda: img_from_pixel_arrays(ix.ravel(), iy.ravel(), W=data.ravel()),
+        'ImageAssembler': lambda: assembler(data),
+        'ImageAssembler (reuse)': lambda: reused(data),
+    }
+
+    print("%d panels of %dx%d pixels into a %dx%d image" % (args.panels, args.rows, args.cols, *assembler.shape))
+    print("%-30s %12.3f ms (once per geometry)" % ('ImageAssembler setup', setup*1e3))
+    for name, func in results.items():
+        elapsed = min(timeit.repeat(func, number=args.number, repeat=3)) / args.number
+        print("%-30s %12.3f ms" % (name, elapsed*1e3))
+
+
+if __name__ == '__main__':
+    benchmark(parser.parse_args())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import os
+import sys
+import dill
+import argparse
+import subprocess
+from qtpy import QtWidgets
+from ami.graphkit_wrapper import Graph
+from ami.flowchart.library.Numpy import Projection, Binning
+from ami.flowchart.library.Operators import MeanVsScan
+from ami.flowchart.library.Display import ScatterPlot
+from ami.flowchart.library.Roi import Roi1D
+from ami.flowchart.library.Psalg import ThresholdingHitFinder
+
+
+parser = argparse.ArgumentParser(description='Benchmark loading a graph of library nodes in a fresh process.')
+parser.add_argument('--repeat', type=int, default=5, help='Number of fresh processes to time (default: 5).')
+
+
+LOAD = """
+import sys
+import time
+import resource
+
+start = time.perf_counter()
+import dill
+import ami.worker  # noqa: F401
+worker = time.perf_counter() - start
+graph = dill.loads(sys.stdin.buffer.read())
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+qt = any(m.split('.')[0] in ('qtpy', 'PyQt5', 'pyqtgraph') for m in sys.modules)
+print(worker, elapsed, rss, len(sys.modules), qt)
+"""
+
+
+def build_graph():
+    nodes = [Projection('projection'), Binning('binning'), MeanVsScan('scan'),
+             ScatterPlot('scatter'), Roi1D('roi1d'), ThresholdingHitFinder('hitfinder')]
+    terms = {'projection': ({"In": "img"}, ["projection.Out"]),
+             'binning': ({"In": "projection.Out"}, ["binning.Bins", "binning.Counts"]),
+             'scan': ({"Bin": "bin", "Value": "value"}, ["scan.Bins", "scan.Counts"]),
+             'scatter': ({"X": "x", "Y": "y"}, ["scatter.X", "scatter.Y"]),
+             'roi1d': ({"In": "wf"}, ["roi1d.Out"]),
+             'hitfinder': ({"In": "img"}, ["hitfinder.Out"])}
+
+    graph = Graph(name='benchmark')
+    for node in nodes:
+        inputs, outputs = terms[node.name()]
+        graph.add(node.to_operation(inputs=inputs, outputs=outputs))
+    return graph
+
+
+def benchmark(args):
+    app = QtWidgets.QApplication([])  # noqa: F841
+    payload = dill.dumps(build_graph())
+
+    results = []
+    for _ in range(args.repeat):
+        proc = subprocess.run([sys.executable, '-c', LOAD], input=payload, stdout=subprocess.PIPE,
+                              check=True, env=os.environ)
+        # the timings are on the last line, after anything printed while importing
+        results.append(proc.stdout.decode().splitlines()[-1].split())
+
+    worker = min(float(r[0]) for r in results)
+    elapsed = min(float(r[1]) for r in results)
+    rss, modules, qt = results[-1][2:]
+    print("%-30s %12.1f ms" % ('import ami.worker', worker*1e3))
+    print("%-30s %12.1f ms" % ('import and load graph', elapsed*1e3))
+    print("%-30s %12.1f MB" % ('max RSS', int(rss)/1024))
+    print("%-30s %12s" % ('modules loaded', modules))
+    print("%-30s %12s" % ('Qt imported', qt))
+
+
+if __name__ == '__main__':
+    benchmark(parser.parse_args())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+import time
+import pickle
+import timeit
+import argparse
+import datetime as dt
+import prometheus_client as pc
+from ami.comm import EventTimes
+
+
+parser = argparse.ArgumentParser(description='Benchmark the per-event instrumentation of the worker.')
+parser.add_argument('--events', type=int, default=100000, help='Number of events per heartbeat (default: 100000).')
+parser.add_argument('--graphs', type=int, default=2, help='Number of graphs (default: 2).')
+
+
+def metrics(registry):
+    return (pc.Counter('ami_event_count', 'Event Counter', ['hutch', 'type', 'process'], registry=registry),
+            pc.Gauge('ami_event_time_secs', 'Event Time', ['hutch', 'type', 'process'], registry=registry),
+            pc.Gauge('ami_event_latency_secs', 'Event Latency', ['hutch', 'sender', 'process'], registry=registry))
+
+
+def benchmark(args):
+    payload = {'cspad': object(), 'laser': True, 'delta_t': 3, 'ebeam': 1.0}
+    graphs = ['graph%d' % i for i in range(args.graphs)]
+    unix_ts = time.time()
+
+    counter, timer, latency = metrics(pc.CollectorRegistry())
+
+    def before():
+        event_rate = {}
+        for _ in range(args.events):
+            start = time.time()
+            input_latency = dt.datetime.now() - dt.datetime.fromtimestamp(unix_ts)
+            latency.labels('tst', "Source", 'worker000').set(input_latency.total_seconds())
+            if any(v is None for k, v in payload.items()):
+                counter.labels('tst', 'Partial', 'worker000').inc()
+            for name in graphs:
+                if name not in event_rate:
+                    event_rate[name] = []
+                event_rate[name].append((start, time.time()))
+            counter.labels('tst', 'Datagram', 'worker000').inc()
+            timer.labels('tst', 'Datagram', 'worker000').set(time.time() - start)
+        return event_rate
+
+    counter, timer, latency = metrics(pc.CollectorRegistry())
+    source_latency = latency.labels('tst', 'Source', 'worker000')
+    partials = counter.labels('tst', 'Partial', 'worker000')
+    datagrams = counter.labels('tst', 'Datagram', 'worker000')
+    datagram_time = timer.labels('tst', 'Datagram', 'worker000')
+
+    def after():
+        event_rate = {}
+        for _ in range(args.events):
+            start = time.time()
+            source_latency.set(start - unix_ts)
+            if any(v is None for v in payload.values()):
+                partials.inc()
+            for name in graphs:
+                if name not in event_rate:
+                    event_rate[name] = EventTimes()
+                event_rate[name].add(start, time.time())
+            datagrams.inc()
+            datagram_time.set(time.time() - start)
+        return {name: times.summary() for name, times in event_rate.items()}
+
+    print("%d events per heartbeat, %d graphs" % (args.events, args.graphs))
+    for label, func in (('labels() + datetime + lists', before), ('bound children + histograms', after)):
+        elapsed = min(timeit.repeat(func, number=1, repeat=3))
+        size = len(pickle.dumps(func()))
+        print("%-30s %8.3f us/event %10d bytes/heartbeat" % (label, elapsed/args.events*1e6, size))
+
+
+if __name__ == '__main__':
+    benchmark(parser.parse_args())
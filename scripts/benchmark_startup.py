@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+import time
+import argparse
+import ami.multiproc as mp
+
+
+parser = argparse.ArgumentParser(description='Benchmark starting ami worker processes with each start method.')
+parser.add_argument('-n', '--num-workers', type=int, default=4, help='Number of processes to start (default: 4).')
+parser.add_argument('--repeat', type=int, default=3, help='Number of times to start them (default: 3).')
+
+
+def ready(queue):
+    import ami.worker  # noqa: F401
+    queue.put(time.perf_counter())
+
+
+def start(num_workers):
+    queue = mp.Queue()
+    begin = time.perf_counter()
+    procs = [mp.Process(target=ready, args=(queue,)) for _ in range(num_workers)]
+    for proc in procs:
+        proc.start()
+    elapsed = max(queue.get() for _ in procs) - begin
+    for proc in procs:
+        proc.join()
+    return elapsed
+
+
+def benchmark(args):
+    for method in mp.get_all_start_methods():
+        mp.use_start_method(method)
+        if method == 'forkserver':
+            # the first start also launches the forkserver, which is paid once per ami-local
+            first = start(args.num_workers)
+            print("%-30s %12.1f ms" % ('forkserver (first start)', first*1e3))
+        elapsed = min(start(args.num_workers) for _ in range(args.repeat))
+        print("%-30s %12.1f ms" % (method, elapsed*1e3))
+
+
+if __name__ == '__main__':
+    benchmark(parser.parse_args())
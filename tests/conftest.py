@@ -28,6 +28,10 @@ try:
     import h5py
 except ImportError:
     h5py = None
+try:
+    import numba
+except ImportError:
+    numba = None
 
 from ami.multiproc import check_mp_start_method
 from ami.asyncqt import QEventLoop
@@ -53,6 +57,9 @@ pyarrowtest = pytest.mark.skipif(pa is None, reason="pyarrow not avaliable")
 hdf5test = pytest.mark.skipif(h5py is None, reason="h5py not avaliable")
 
 
+numbatest = pytest.mark.skipif(numba is None, reason="numba not avaliable")
+
+
 @pytest.fixture(scope='session')
 def ipc_dir(tmpdir_factory):
     if sys.platform == 'darwin':
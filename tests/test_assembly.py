@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+from ami.assembly import ImageAssembler
+
+
+@pytest.fixture(scope='module')
+def panels():
+    # two 4x5 panels side by side with a gap, the second one rotated by 180 degrees
+    r, c = np.meshgrid(np.arange(4), np.arange(5), indexing='ij')
+    ix = np.stack([r, 3 - r + 1])
+    iy = np.stack([c, 4 - c + 7])
+    return ix, iy
+
+
+def test_assembly(panels):
+    ix, iy = panels
+    data = np.arange(40, dtype=np.uint16).reshape(2, 4, 5)
+
+    expected = np.zeros((5, 12), dtype=np.float32)
+    expected[ix.ravel(), iy.ravel()] = data.ravel()
+
+    assembler = ImageAssembler(ix, iy)
+    img = assembler(data)
+    assert img.shape == (5, 12)
+    assert img.dtype == np.float32
+    assert np.array_equal(img, expected)
+    assert assembler(data) is not img
+
+    with pytest.raises(ValueError):
+        assembler(data[0])
+
+
+def test_assembly_reuse(panels):
+    ix, iy = panels
+    assembler = ImageAssembler(ix, iy, dtype=np.float64, background=-1, reuse=True)
+
+    first = assembler(np.ones((2, 4, 5)))
+    second = assembler(np.full((2, 4, 5), 2.0))
+    assert second is first
+    assert np.all(second[ix, iy] == 2)
+    assert np.all(second[:, 5:7] == -1)
+
+    out = np.zeros(assembler.shape)
+    assert assembler(np.ones((2, 4, 5)), out=out) is out
+    with pytest.raises(ValueError):
+        assembler(np.ones((2, 4, 5)), out=np.zeros(assembler.shape)[:, ::2])
@@ -0,0 +1,94 @@
+import pytest
+import numpy as np
+from ami.azimuthal import AzimuthalIntegrator, pixel_coords
+
+
+@pytest.fixture(scope='module')
+def image():
+    return np.random.default_rng(0).random((40, 60))
+
+
+def reference(image, x, y, edges, mask=None):
+    r = np.hypot(x, y)
+    valid = np.ones(image.shape, dtype=bool) if mask is None else mask.astype(bool)
+    profile = np.zeros(len(edges) - 1)
+    for i, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+        inbin = valid & (r >= lo) & ((r < hi) if i < len(edges) - 2 else (r <= hi))
+        if inbin.any():
+            profile[i] = image[inbin].mean()
+    return profile
+
+
+def test_radial_profile(image):
+    x, y = pixel_coords(image.shape, 20, 30)
+    mask = np.ones(image.shape, dtype=np.uint8)
+    mask[:5] = 0
+
+    integ = AzimuthalIntegrator(nbins=25, radial_range=(0, 25))
+    assert integ.radial_unit == 'r'
+    integ.setup(x, y, mask=mask)
+    profile, cake = integ.integrate(image)
+
+    assert np.allclose(profile, reference(image, x, y, integ.radial_edges, mask))
+    assert np.allclose(cake[:, 0], profile)
+    assert np.allclose(integ.radial_centers, np.arange(25) + 0.5)
+
+    with pytest.raises(ValueError):
+        integ.integrate(image[:10])
+
+
+def test_cake(image):
+    x, y = pixel_coords(image.shape, 20, 30, pixel_size=2)
+    integ = AzimuthalIntegrator(nbins=10, nphi=4)
+    integ.setup(x, y)
+    profile, cake = integ.integrate(image)
+
+    assert cake.shape == (10, 4)
+    assert np.allclose(integ.phi_edges, [-180, -90, 0, 90, 180])
+    # the pixels of each quadrant land in their own azimuthal bin
+    assert integ.counts.sum() == image.size
+    sums = cake*integ.counts
+    phi = np.degrees(np.arctan2(y, x))
+    assert np.isclose(sums[:, 3].sum(), image[phi >= 90].sum())
+    assert np.isclose(sums[:, 0].sum(), image[phi < -90].sum())
+    assert np.allclose(profile*integ.counts.sum(axis=1), sums.sum(axis=1))
+
+
+def test_solid_angle_and_q(image):
+    x, y = pixel_coords(image.shape, 20, 30, pixel_size=100)
+    distance = 5e4
+
+    integ = AzimuthalIntegrator(nbins=20, distance=distance, wavelength=1.0, solid_angle=True)
+    assert integ.radial_unit == 'q'
+    integ.setup(x, y)
+    profile, _ = integ.integrate(np.ones(image.shape))
+
+    tth = np.arctan2(np.hypot(x, y), distance)
+    q = 4*np.pi*np.sin(tth/2)
+    assert np.isclose(integ.radial_edges[0], q.min())
+    assert np.isclose(integ.radial_edges[-1], q.max())
+    # a flat image is brighter after the correction away from the center
+    assert profile[0] < profile[-1]
+    assert np.isclose(profile[0], 1, atol=1e-3)
+
+    integ = AzimuthalIntegrator(nbins=20, distance=distance)
+    assert integ.radial_unit == '2theta'
+    integ.setup(x, y)
+    assert np.isclose(integ.radial_edges[-1], np.degrees(tth.max()))
+
+
+def test_panels(image):
+    # a 3d array of panels integrates the same as the assembled image
+    x, y = pixel_coords(image.shape, 20, 30)
+    panels = image.reshape(2, 20, 60)
+
+    integ = AzimuthalIntegrator(nbins=15, nphi=3, radial_range=(0, 30))
+    integ.setup(x, y)
+    profile, cake = integ.integrate(image)
+
+    integ3d = AzimuthalIntegrator(nbins=15, nphi=3, radial_range=(0, 30))
+    integ3d.setup(x.reshape(panels.shape), y.reshape(panels.shape), z=np.zeros(panels.shape))
+    profile3d, cake3d = integ3d.integrate(panels)
+
+    assert np.allclose(profile, profile3d)
+    assert np.allclose(cake, cake3d)
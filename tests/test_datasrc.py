@@ -1156,3 +1156,29 @@ def test_source_badrequest(sim_src_cfg):
         assert name in source.requested_names.names
         # check that the bad names are not in requested_data
         assert (name in source.requested_data.names) is present
+
+
+def test_source_reconfigure(sim_src_cfg):
+    src_cls = Source.find_source('static')
+    assert src_cls is not None
+
+    sim_src_cfg['bound'] = 10
+    source = src_cls(0, 1, 3, dict(sim_src_cfg))
+    events = source.events()
+    assert next(events).mtype == MsgTypes.Transition
+
+    # changing the interval applies to the running source
+    assert source.reconfigure(dict(sim_src_cfg, interval='0.5', repeat='true'))
+    assert source.interval == 0.5
+    assert source.config['repeat'] is True
+    assert source.reconfigure(sim_src_cfg)
+    assert source.interval == 0
+    assert 'repeat' not in source.config
+    assert sum(msg.mtype == MsgTypes.Datagram for msg in events) == 10
+
+    # the source has to be recreated for anything else
+    assert not source.reconfigure(dict(sim_src_cfg, bound=20))
+    # the initial wait is only read when the events start
+    assert not source.reconfigure(dict(sim_src_cfg, init_time=1))
+    assert not source.reconfigure(dict(sim_src_cfg, config={}))
+    assert source.bound == 10
@@ -1,9 +1,11 @@
 import pytest
 import zmq
 import dill
+import prometheus_client as pc
 
 from ami.data import MsgTypes, Transitions, Message, CollectorMessage, Deserializer, Heartbeat
 from ami.comm import Colors, ContributionBuilder, TransitionBuilder, EventBuilder
+from ami.collector import GraphCollector
 from ami.graphkit_wrapper import Graph
 from ami.graph_nodes import PickN
 
@@ -332,3 +334,31 @@ def test_pending_graph(event_builder, eb_graph):
         for nv in range(ver+1, graph_versions):
             assert nv in event_builder.pending_graphs(graph_name)
             assert event_builder.version(graph_name) == ver
+
+
+def test_collector_shed(tmp_path):
+    addrs = ['ipc://%s' % (tmp_path / name) for name in ('collector', 'downstream', 'graph', 'msg')]
+    collector = GraphCollector(0, 'localCollector%03d', 2, 5, Colors.LocalCollector, *addrs, None, None, 'tst', None)
+    downstream = collector.ctx.socket(zmq.PULL)
+    downstream.bind(addrs[1])
+    try:
+        def contribution(worker, hb, value, shed=()):
+            return CollectorMessage(mtype=MsgTypes.Datagram, identity=worker, heartbeat=Heartbeat(hb),
+                                    name='test', version=0, payload={'value_%s' % Colors.Worker: value},
+                                    shed=list(shed))
+
+        # the second worker shed its contribution to the first heartbeat
+        collector.process_msg(contribution(0, 0, 6))
+        collector.process_msg(contribution(0, 1, 7))
+        collector.process_msg(contribution(1, 1, 7, shed=[(Heartbeat(0), 0)]))
+
+        # the first heartbeat is completed with the contribution of the first worker instead of being dropped
+        heartbeats = [downstream.recv_serialized(Deserializer()).heartbeat for _ in range(2)]
+        assert heartbeats == [0, 1]
+        assert not collector.store.pending('test')
+    finally:
+        for ctx in (collector.ctx, collector.graph_comm.ctx):
+            ctx.destroy(linger=0)
+        # the processes forked by later tests register the same metrics
+        for metric in (collector.event_counter, collector.event_time, collector.event_size, collector.event_latency):
+            pc.REGISTRY.unregister(metric)
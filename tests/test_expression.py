@@ -0,0 +1,71 @@
+import pytest
+import numpy as np
+import sympy
+from ami.expression import FusedExpression
+
+
+@pytest.fixture(scope='module')
+def images():
+    rng = np.random.default_rng(0)
+    return rng.random((3, 40, 50)) + 0.5
+
+
+@pytest.mark.parametrize('expr', [
+    '(a - b) / (a + b)',
+    'a + b + c',
+    '-a - 2*b + 3',
+    'a*b/c',
+    '1/a',
+    'a**2 + sqrt(b) - c**3',
+    '2*exp(-a) + log(b)*sin(c)',
+    'Abs(a - b) / (a*b*c)**2',
+    'pi*a/2',
+    'a',
+])
+def test_fused_expression(images, expr):
+    args = ['a', 'b', 'c']
+    fused = FusedExpression(args, expr)
+    expected = sympy.lambdify(args, expr, modules=["numpy", "scipy"])(*images)
+
+    result = fused(*images)
+    assert result.shape == images[0].shape
+    assert np.allclose(result, expected)
+    # the temporaries are reused, the result is not
+    temps = [id(t) for t in fused.temps]
+    again = fused(*images)
+    assert again is not result or expr == 'a'
+    assert [id(t) for t in fused.temps] == temps
+    assert np.allclose(again, expected)
+
+
+def test_fused_temporaries(images):
+    fused = FusedExpression(['a', 'b'], '(a - b) / (a + b)')
+    # a - b and a + b are computed into temporaries and the quotient into the result
+    assert len(fused.program) == 3
+    assert fused.ntemps == 2
+
+
+def test_fused_broadcasting(images):
+    a, b, _ = images
+    fused = FusedExpression(['a', 'b', 'x'], '(a - b)*x')
+    assert np.allclose(fused(a, b, 2.0), (a - b)*2.0)
+    assert np.allclose(fused(a, b[0], np.arange(50)), (a - b[0])*np.arange(50))
+    # arrays of the same shape are evaluated in blocks with temporaries of the size of a block
+    assert np.allclose(fused(a[:10], b[:10], 3.0), (a[:10] - b[:10])*3.0)
+    assert fused.temps[0].shape == (500,)
+
+
+def test_fused_blocks(images):
+    a, b, c = images
+    # the last block is shorter than the others
+    fused = FusedExpression(['a', 'b', 'c'], 'a*b + c/a - 1', blocksize=300)
+    assert np.allclose(fused(a, b, c), a*b + c/a - 1)
+    assert np.allclose(fused(a.T, b.T, c.T), a.T*b.T + c.T/a.T - 1)
+    assert fused.temps[0].shape == (300,)
+
+
+def test_fused_unsupported():
+    with pytest.raises(NotImplementedError):
+        FusedExpression(['a'], 'gamma(a)')
+    with pytest.raises(NotImplementedError):
+        FusedExpression(['a'], 'a*I')
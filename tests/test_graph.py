@@ -1,7 +1,10 @@
 import dill
+import time
 import numpy as np
 from ami.graphkit_wrapper import Graph
-from ami.graph_nodes import PickN, RollingBuffer, Map
+from ami.data import Lazy
+from ami.graph_nodes import PickN, RollingBuffer, Map, Predicate, RunCache, AsType, Resolve, fingerprint, \
+    Sampling, Sampled
 
 
 def test_filter_on(complex_graph):
@@ -116,3 +119,188 @@ def test_rolling_buffer():
     globalCollector = graph(localCollector1, color='globalCollector')
     assert (globalCollector == {'scatter_x': (8, 10, 12, 14, 16, 18, 20, 22),
                                 'scatter_y': (9, 11, 13, 15, 17, 19, 21, 23)})
+
+
+def test_run_cache():
+    calls = []
+
+    def geometry(calib, shape):
+        calls.append(shape)
+        return np.ones(shape) * calib['geometry'][0].sum()
+
+    cache = RunCache(geometry, maxsize=2)
+    calib = {'geometry': (np.arange(3), {'run': 1})}
+
+    first = cache(calib, (2, 2))
+    assert cache(calib, (2, 2)) is first
+    # equal content in new objects is a hit as well
+    assert cache({'geometry': (np.arange(3), {'run': 1})}, (2, 2)) is first
+    assert len(calls) == 1
+
+    # a change of the content is a miss
+    other = cache({'geometry': (np.arange(4), {'run': 1})}, (2, 2))
+    assert other[0, 0] == 6
+    assert len(calls) == 2
+    assert cache.hits == 2 and cache.misses == 2
+
+    # the cache is cleared at the beginning of a run and is not pickled
+    cache.begin_run()
+    cache(calib, (2, 2))
+    assert len(calls) == 3
+    cache = dill.loads(dill.dumps(cache))
+    assert not cache.cache and cache.last is None
+
+    assert fingerprint(np.zeros(3)) != fingerprint(np.zeros(3, dtype=np.float32))
+    assert fingerprint([1, np.ones(2)]) == fingerprint([1, np.ones(2)])
+    assert fingerprint([1, 2]) != fingerprint((1, 2))
+
+
+def test_common_subexpressions():
+    graph = Graph(name='cse')
+    graph.add([Map(name='a_float', inputs=['cspad'], outputs=['a_cspad'], func=AsType(np.float64), pure=True),
+               Map(name='a', inputs=['a_cspad'], outputs=['a_sum'], func=np.sum),
+               Map(name='b_float', inputs=['cspad'], outputs=['b_cspad'], func=AsType(np.float64), pure=True),
+               Map(name='b', inputs=['b_cspad'], outputs=['b_sum'], func=np.sum),
+               # a different conversion, a node that is not pure and a node whose output is a graph output
+               Map(name='c_float', inputs=['cspad'], outputs=['c_cspad'], func=AsType(np.float32), pure=True),
+               Map(name='c', inputs=['c_cspad'], outputs=['c_sum'], func=np.sum),
+               Map(name='d_float', inputs=['cspad'], outputs=['d_cspad'], func=AsType(np.float64)),
+               Map(name='d', inputs=['d_cspad'], outputs=['d_sum'], func=np.sum),
+               Map(name='e_float', inputs=['cspad'], outputs=['e_cspad'], func=AsType(np.float64), pure=True)])
+
+    duplicates = {dup.name: node.name for dup, node in graph._common_subexpressions().items()}
+    assert duplicates in ({'b_float': 'a_float'}, {'a_float': 'b_float'})
+
+    img = np.ones((2, 2), dtype=np.uint16)
+    assert AsType(np.float64)(img).dtype == np.float64
+    converted = img.astype(np.float64)
+    assert AsType(np.float64)(converted) is converted
+    converted, value = AsType(np.float32)(img, 3)
+    assert converted.dtype == np.float32 and value == 3
+    assert AsType(np.float64) == AsType('f8') and AsType(np.float64) != AsType(np.float32)
+
+
+def test_dead_nodes():
+    graph = Graph(name='prune')
+    graph.add([Map(name='a_float', inputs=['cspad'], outputs=['a_cspad'], func=AsType(np.float64), pure=True),
+               Map(name='a', inputs=['a_cspad'], outputs=['a_roi'], func=AsType(np.float32), pure=True),
+               Map(name='b_float', inputs=['cspad'], outputs=['b_cspad'], func=AsType(np.float64), pure=True),
+               Map(name='b', inputs=['b_cspad'], outputs=['b_roi'], func=AsType(np.float32), pure=True),
+               # the outputs of a and b are viewed
+               PickN(name='a_view', inputs=['a_roi'], outputs=['_auto_a_roi']),
+               PickN(name='b_view', inputs=['b_roi'], outputs=['_auto_b_roi']),
+               # nobody uses the output of c, but d may have side effects
+               Map(name='c', inputs=['laser'], outputs=['c_out'], func=AsType(np.float64), pure=True),
+               Map(name='d', inputs=['delta_t'], outputs=['d_out'], func=np.sum)])
+
+    # the whole chain of b is the same as the one of a
+    duplicates = graph._common_subexpressions()
+    assert {dup.name: node.name for dup, node in duplicates.items()} in ({'b_float': 'a_float', 'b': 'a'},
+                                                                         {'a_float': 'b_float', 'a': 'b'})
+
+    # the conversion of the duplicate chain is no longer needed once its last node forwards the other one
+    dead, live = graph._dead_nodes(duplicates)
+    converted = {dup.name for dup in duplicates if dup.name.endswith('_float')}
+    assert {node.name for node in dead} == {'c'} | converted
+    assert 'cspad' in live and 'delta_t' in live and 'laser' not in live
+
+
+def test_lazy_inputs():
+    reads = []
+
+    def read(name, value):
+        reads.append(name)
+        return value
+
+    graph = Graph(name='lazy')
+    graph.add([Map(name='filter', inputs=['ebeam', 'cspad'], outputs=['filtered_cspad'],
+                   func=lambda ebeam, cspad: cspad if ebeam() > 1 else None, lazy=True),
+               Map(name='sum', inputs=['filtered_cspad'], outputs=['sum_cspad'], func=np.sum),
+               Map(name='scaled', inputs=['sum_cspad'], outputs=['scaled_cspad'], func=lambda s: 2*s)])
+    for node in graph.graph.nodes:
+        if isinstance(node, Map):
+            node.color = 'worker'
+    graph.inputs['worker'] = {'ebeam', 'cspad'}
+
+    nodes = [node for node in graph.graph.nodes if isinstance(node, Map)]
+    graph._mark_lazy_inputs(nodes)
+    assert {node.name: node.lazy_inputs for node in nodes} == {'filter': False, 'sum': True, 'scaled': False}
+
+    total = Resolve(np.sum)
+    assert total(Lazy(read, 'dropped', np.ones(3))) is not None
+    assert reads == ['dropped']
+
+    # the detector is only read once however many nodes use it
+    cspad = Lazy(read, 'cspad', np.ones((2, 2)))
+    assert total(cspad) == 4 and total(cspad) == 4
+    assert reads == ['dropped', 'cspad']
+
+    # a value missing from the event skips the node
+    assert Resolve(np.sum, 2)(Lazy(read, 'missing', None)) == (None, None)
+
+
+def test_predicate():
+    graph = Graph(name='predicate')
+    laser_on = Predicate(name='laser_on', condition_needs=['laser'], inputs=['cspad', 'delta_t'],
+                         outputs=['cspad_on', 'delta_t_on'], func=lambda laser: laser > 0)
+    graph.add([laser_on,
+               Map(name='sum', inputs=['cspad_on'], outputs=['sum_on'], func=np.sum)])
+    assert laser_on.inputs == ['laser', 'cspad', 'delta_t']
+
+    img = np.ones((2, 2))
+    assert laser_on.filter(1, img, 5) == (img, 5)
+    assert laser_on.filter(0, img, 5) == (None, None)
+    assert laser_on.filter(1, img, 6) == (img, 6)
+
+    # the detector is passed on unread, and is not read when the event is dropped
+    cspad = Lazy(lambda: img)
+    assert laser_on.filter(Lazy(lambda: 1), cspad, 5)[0] is cspad
+    assert laser_on.filter(0, Lazy(lambda: 1/0), 5) == (None, None)
+    # events missing the inputs of the condition are not counted
+    assert laser_on.filter(Lazy(lambda: None), cspad, 5) == (None, None)
+
+    assert graph.filter_counts() == {'laser_on': (3, 2)}
+    assert graph.filter_counts() == {'laser_on': (0, 0)}
+
+    for node in graph.graph.nodes:
+        if isinstance(node, Map):
+            node.color = 'worker'
+    graph.inputs['worker'] = {'laser', 'cspad', 'delta_t'}
+    nodes = [node for node in graph.graph.nodes if isinstance(node, Map)]
+    graph._mark_lazy_inputs(nodes)
+    assert {node.name: node.lazy_inputs for node in nodes} == {'laser_on': False, 'sum': True}
+
+
+def test_sampling():
+    # every third event
+    every = Sampled(lambda x: (x, -x), Sampling(every=3), 2)
+    assert [every(i) for i in range(7)] == [(0, 0), (None, None), (None, None), (3, -3),
+                                            (None, None), (None, None), (6, -6)]
+    assert every.sampling.counts() == (3, 4)
+
+    # at most 10 events a second
+    rate = Sampled(np.sum, Sampling(rate=10))
+    assert [rate(np.ones(2)) for i in range(3)] == [2, None, None]
+    time.sleep(0.1)
+    assert rate(np.ones(2)) == 2
+
+    # at most 50 ms per heartbeat
+    def slow(x):
+        time.sleep(0.03)
+        return x
+
+    graph = Graph(name='sampling')
+    node = Map(name='slow', inputs=['cspad'], outputs=['slow_cspad'], func=slow, pure=True,
+               sampling=Sampling(budget=0.05))
+    graph.add([node,
+               Map(name='slow_dup', inputs=['cspad'], outputs=['slow_dup_cspad'], func=slow, pure=True),
+               Map(name='sum', inputs=['slow_cspad'], outputs=['sum'], func=np.sum),
+               Map(name='sum_dup', inputs=['slow_dup_cspad'], outputs=['sum_dup'], func=np.sum)])
+    budget = Sampled(node.func, node.sampling)
+    assert [budget(i) for i in range(4)] == [0, 1, None, None]
+    graph.heartbeat_finished()
+    assert budget(4) == 4
+    assert graph.filter_counts() == {'slow': (3, 2)}
+
+    # sampled nodes are not merged with the identical node running on every event
+    assert graph._common_subexpressions() == {}
@@ -0,0 +1,37 @@
+import sys
+import pytest
+import subprocess
+
+
+# the maximum time to import an entry point, which is paid by every process ami-local starts
+IMPORT_BUDGET = 2.0
+
+# modules the entry points only import when they are used
+DEFERRED = ['h5py', 'pyarrow', 'psana', 'p4p', 'ami.psana', 'qtpy', 'PyQt5', 'pyqtgraph', 'ami.flowchart']
+
+
+def importtime(module):
+    """
+    Returns the cumulative import time in seconds of each module imported by
+    importing `module` in a fresh interpreter, from `python -X importtime`.
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                          stderr=subprocess.PIPE, check=True)
+    times = {}
+    for line in proc.stderr.decode().splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) * 1e-6
+    return times
+
+
+@pytest.mark.parametrize('module', ['ami.worker', 'ami.collector', 'ami.manager'])
+def test_import_budget(module):
+    times = importtime(module)
+
+    assert module in times
+    assert times[module] < IMPORT_BUDGET
+    for name in DEFERRED:
+        assert name not in times, "%s imports %s" % (module, name)
@@ -0,0 +1,33 @@
+import dill
+import numpy as np
+from conftest import numbatest
+from ami.jit import kernel, kernels, lookup, warmup
+
+
+@kernel((np.zeros(3), 0.0))
+def scale(values, factor):
+    out = np.empty_like(values)
+    for i in range(values.shape[0]):
+        out[i] = values[i] * factor
+    return out
+
+
+def test_kernel_registry():
+    assert kernels[scale.name] is scale
+    assert lookup(scale.name) is scale
+    assert np.array_equal(scale(np.arange(4.0), 2.0), np.arange(4.0) * 2)
+
+    # kernels pickle by name so the same instance is shared by all graphs
+    assert dill.loads(dill.dumps(scale)) is scale
+
+
+@numbatest
+def test_kernel_warmup():
+    if not scale.compiled:
+        assert scale.warmup() > 0
+        assert scale.compile_time > 0
+    assert scale.compiled
+
+    # warming up compiled kernels is free
+    assert scale.warmup() == 0
+    assert warmup([scale.name]) == 0
@@ -8,8 +8,8 @@ import multiprocessing as mp
 import ami.graph_nodes as gn
 import amitypes as at
 
-from ami.data import MsgTypes, Transitions, Transition, Heartbeat
-from ami.comm import AutoExport, Store, Node, ZmqHandler, GraphCommHandler
+from ami.data import MsgTypes, Transitions, Transition, Heartbeat, Deserializer, Stages
+from ami.comm import AutoExport, Store, Node, ZmqHandler, GraphCommHandler, ZMQ_TOPIC_DELIM
 from ami.manager import run_manager
 
 
@@ -127,8 +127,8 @@ class ResultsInjector(Node, ZmqHandler):
         else:
             return self.mark
 
-    def data(self, hb, payload, wait=False):
-        self.collector_message(self.node, Heartbeat(hb, 0), self.name, self.version, payload)
+    def data(self, hb, payload, wait=False, trace=None):
+        self.collector_message(self.node, Heartbeat(hb, 0), self.name, self.version, payload, trace)
         if wait:
             self.wait_for(hb)
         else:
@@ -170,7 +170,7 @@ def result_data():
 
 
 @pytest.fixture(scope='function')
-def manager_proc(ipc_dir):
+def manager_proc(request, ipc_dir):
     try:
         from pytest_cov.embed import cleanup_on_sigterm
         cleanup_on_sigterm()
@@ -185,6 +185,7 @@ def manager_proc(ipc_dir):
         'info': 'ipc://%s/manager_info' % ipc_dir,
         'export': 'ipc://%s/manager_export' % ipc_dir,
         'view': 'ipc://%s/manager_view' % ipc_dir,
+        'view_pub': 'ipc://%s/manager_view_pub' % ipc_dir,
     }
 
     # start the manager process
@@ -193,7 +194,8 @@ def manager_proc(ipc_dir):
         target=run_manager,
         args=(1, 1, addrs['results'], addrs['graph'], addrs['comm'],
               addrs['msg'], addrs['info'], addrs['export'], addrs['view'],
-              None, None, None)
+              None, None, None, None),
+        kwargs={'view_pub_addr': addrs['view_pub'], 'view_thread': getattr(request, 'param', False)}
     )
     proc.daemon = False
     proc.start()
@@ -688,6 +690,36 @@ def test_manager_store(manager_ctrl, result_data):
         assert comm.fetch(name) is None
 
 
+def test_manager_traces(manager_ctrl, result_data):
+    comm, injector = manager_ctrl
+
+    # allocate a graph
+    assert comm.create()
+    injector.version = comm.graphVersion
+
+    # inject data with traces where the second heartbeat is the slowest
+    for hb, delay in [(1, 1.0), (2, 5.0), (3, 0.5)]:
+        start = time.time() - delay
+        trace = {Stages.Source: start,
+                 Stages.Worker: start + 0.1,
+                 Stages.LocalCollector: start + 0.2,
+                 Stages.GlobalCollector: start + 0.3}
+        injector.data(hb, result_data, wait=True, trace=trace)
+
+    traces = comm.traces
+    assert [record['heartbeat'] for record in traces] == [2, 1, 3]
+    for record in traces:
+        # the manager should have added its own stages to the trace
+        assert set(record['trace']) == set(Stages.Order)
+        assert set(record['latencies']) == set(Stages.Order[1:]) | {'total'}
+        assert record['latencies'][Stages.Worker] == pytest.approx(0.1)
+        assert record['latencies']['total'] >= 0.3
+
+    # resetting the store drops the traces
+    assert comm.reset()
+    assert not comm.traces
+
+
 def test_manager_clear(manager_ctrl, complex_graph):
     comm, injector = manager_ctrl
 
@@ -766,3 +798,32 @@ def test_manager_versions(manager_ctrl):
     assert comm.graphVersion == graph_version
     assert comm.featuresVersion == feature_version
     assert comm.versions == (graph_version, feature_version)
+
+
+@pytest.mark.parametrize('manager_proc', [False, True], indirect=True)
+def test_manager_view_pub(manager_ctrl, manager_proc, result_data):
+    comm, injector = manager_ctrl
+    deserializer = Deserializer()
+
+    # allocate a graph
+    assert comm.create()
+    injector.version = comm.graphVersion
+
+    with injector.ctx.socket(zmq.SUB) as view:
+        view.setsockopt_string(zmq.SUBSCRIBE, "view:%s:cspad%s" % (comm.current, ZMQ_TOPIC_DELIM))
+        view.connect(manager_proc['view_pub'])
+
+        # subscriptions are asynchronous so inject data until the view is published
+        hb = 0
+        while not view.poll(timeout=100):
+            hb += 1
+            injector.data(hb, result_data, wait=True)
+
+        topic = view.recv_string()
+        heartbeat = view.recv_pyobj()
+        data = view.recv_serialized(deserializer, copy=False)
+        assert topic == "view:%s:cspad%s" % (comm.current, ZMQ_TOPIC_DELIM)
+        assert heartbeat == hb
+        assert np.array_equal(data, result_data['cspad'])
+        # only the subscribed entry should have been published
+        assert not view.poll(timeout=100)
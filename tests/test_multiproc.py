@@ -0,0 +1,33 @@
+import os
+import sys
+import subprocess
+
+
+# starts a process from a forkserver and reports whether it inherited the preloaded module
+PRELOAD = """
+import sys
+import ami.multiproc as mp
+
+
+def report(queue):
+    queue.put('ami.ops.numpy' in sys.modules)
+
+
+if __name__ == '__main__':
+    mp.use_start_method('forkserver', ['ami.ops.numpy'])
+    queue = mp.Queue()
+    proc = mp.Process(target=report, args=(queue,))
+    proc.start()
+    print(mp.get_start_method(), queue.get(timeout=30), 'ami.ops.numpy' in sys.modules)
+    proc.join()
+"""
+
+
+def test_forkserver_preload(tmp_path):
+    script = tmp_path / 'preload.py'
+    script.write_text(PRELOAD)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, str(script)], stdout=subprocess.PIPE, check=True, timeout=60, env=env)
+
+    # the child has the module without the parent ever importing it
+    assert result.stdout.decode().split() == ['forkserver', 'True', 'False']
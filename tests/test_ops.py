@@ -0,0 +1,75 @@
+import sys
+import dill
+import subprocess
+import numpy as np
+import ami.ops.common as common
+import ami.ops.numpy as npops
+import ami.ops.operators as ops
+import ami.ops.roi as roi
+from ami.ops.psalg import peakfinder1d
+from ami.flowchart.library.Numpy import Projection, Binning
+from ami.flowchart.library.Operators import MeanVsScan
+from ami.flowchart.library.Display import ScatterPlot
+from ami.flowchart.library.Roi import Roi1D
+from ami.flowchart.library.Psalg import ThresholdingHitFinder
+
+
+def test_ops():
+    bins, counts = npops.histogram(4, (0, 4), False, np.array([0.5, 1.5, 1.5, 3.5]))
+    assert np.array_equal(bins, [0, 1, 2, 3, 4])
+    assert np.array_equal(counts, [1, 2, 0, 1])
+
+    bins = np.array([0.0, 1.0, 2.0])
+    keys, means = ops.binned_means(bins, 1, {1: (np.array([6.0]), 3), 2: (np.array([4.0]), 2)})
+    assert np.array_equal(keys, bins)
+    assert np.array_equal(means, [[0], [2.0], [2.0]])
+
+    assert np.array_equal(roi.roi1d(2, 4, np.arange(10)), [2, 3])
+    x, y = roi.scatter_roi(1, 4, [(0, 10), (2, 20), (3, 30), (5, 50)])
+    assert np.array_equal(x, [2, 3])
+    assert np.array_equal(y, [20, 30])
+
+    assert list(common.unzip([(1, 2), (3, 4)])) == [(1, 3), (2, 4)]
+    assert common.apply_each(len, [1], [1, 2]) == [1, 2]
+
+    centroids, widths = peakfinder1d(np.array([0.0, 1.0, 3.0, 1.0, 0.0]), 0.5, 2.0)
+    assert np.allclose(centroids, [2.0])
+    assert np.array_equal(widths, [3])
+
+
+def test_ops_pickle(qtbot):
+    projection = Projection('projection')
+    qtbot.addWidget(projection.ctrlWidget())
+    binning = Binning('binning')
+    qtbot.addWidget(binning.ctrlWidget())
+    scan = MeanVsScan('scan')
+    qtbot.addWidget(scan.ctrlWidget())
+    scatter = ScatterPlot('scatter')
+    qtbot.addWidget(scatter.ctrlWidget())
+    roi1d = Roi1D('roi1d')
+    qtbot.addWidget(roi1d.ctrlWidget())
+    hitfinder = ThresholdingHitFinder('hitfinder')
+    qtbot.addWidget(hitfinder.ctrlWidget())
+
+    nodes = [projection.to_operation(inputs={"In": "img"}, outputs=["projection.Out"]),
+             *binning.to_operation(inputs={"In": "arr"}, outputs=["binning.Bins", "binning.Counts"]),
+             *scan.to_operation(inputs={"Bin": "bin", "Value": "value"}, outputs=["scan.Bins", "scan.Counts"]),
+             *scatter.to_operation(inputs={"X": "x", "Y": "y"}, outputs=["x", "y"]),
+             roi1d.to_operation(inputs={"In": "wf"}, outputs=["roi1d.Out"]),
+             *hitfinder.to_operation(inputs={"In": "img"}, outputs=["hitfinder.Out"])]
+
+    # the operations of the library nodes load without importing Qt or the flowchart
+    script = """
+import sys
+import dill
+import numpy as np
+
+nodes = dill.loads(sys.stdin.buffer.read())
+projection = nodes[0].func(np.ones((2, 3)))
+assert np.array_equal(projection, [2, 2, 2]), projection
+print(sorted(m for m in sys.modules if m.split('.')[0] in ('qtpy', 'PyQt5', 'pyqtgraph') or
+             m.startswith('ami.flowchart')))
+"""
+    result = subprocess.run([sys.executable, '-c', script], input=dill.dumps(nodes),
+                            stdout=subprocess.PIPE, check=True)
+    assert result.stdout.decode().strip() == '[]'
@@ -0,0 +1,82 @@
+import pytest
+import numpy as np
+from ami.roi import RoiEngine, Rect, Pixel, Arc, Polygon, arc_mask, polygon_mask, parse_rois
+from ami.ops.roi import Roi2DProc
+
+
+@pytest.fixture(scope='module')
+def image():
+    return np.random.default_rng(0).integers(0, 4096, size=(64, 48), dtype=np.uint16)
+
+
+@pytest.mark.parametrize('rotation', [0, 1, 2, 3])
+def test_roi_rect(image, rotation):
+    engine = RoiEngine({'inside': Rect(5, 10, 3, 7, rotation),
+                        'clipped': Rect(40, 100, 30, 100, rotation),
+                        'empty': Rect(200, 10, 200, 10, rotation)})
+    result = engine.extract(image)
+    rotated = np.rot90(image, rotation)
+
+    assert np.array_equal(result['inside'], rotated[3:10, 5:15])
+    assert np.array_equal(result['clipped'], rotated[30:130, 40:140])
+    assert result['empty'].shape == rotated[200:210, 200:210].shape
+    assert np.array_equal(engine.sums(image),
+                          [rotated[3:10, 5:15].sum(), rotated[30:130, 40:140].sum(), 0])
+
+    # a single rectangle is extracted without copying the image
+    roi, coordinates = Roi2DProc(5, 10, 3, 7, rotation)(image)
+    assert np.array_equal(roi, result['inside'])
+    assert np.shares_memory(roi, image)
+    assert coordinates == (5, 10, 3, 7)
+
+
+def test_roi_masks(image):
+    points = [(2, 2), (30, 5), (20, 40)]
+    engine = RoiEngine()
+    engine.add('pixel', Pixel(7, 11))
+    engine.add('arc', Arc(30, 20, 25, 10, 30, 120))
+    engine.add('poly', Polygon(points))
+    result = engine.extract(image)
+
+    arc = arc_mask(image.shape, 30, 20, 25, 10, 30, 120)
+    poly = polygon_mask(image.shape, points)
+    assert result['pixel'] == image[7, 11]
+    assert np.array_equal(result['arc'], image[arc])
+    assert np.array_equal(result['poly'], image[poly])
+    assert poly[10, 10] and not poly[2, 40]
+
+    sums = engine.sums(image)
+    assert sums.dtype == image.sum().dtype
+    assert np.array_equal(sums, [image[7, 11], image[arc].sum(), image[poly].sum()])
+
+    # the index map is rebuilt when the shape of the image changes
+    small = image[:32, :32]
+    assert engine.sums(small)[1] == small[arc_mask(small.shape, 30, 20, 25, 10, 30, 120)].sum()
+    assert engine.shape == small.shape
+
+
+def test_arc_mask():
+    mask = arc_mask((50, 50), 25, 25, 20, 10, 0, 90)
+    x, y = np.nonzero(mask)
+    rad = np.hypot(x - 25, y - 25)
+    assert np.all((rad >= 10) & (rad <= 20))
+    assert np.all(x <= 25) and np.all(y <= 25)
+
+    with pytest.raises(ValueError):
+        arc_mask((50, 50), 25, 25, 10, 20, 0, 90)
+
+
+def test_parse_rois():
+    rois = parse_rois("rect 0 10 2 5; pixel 3 4;arc 1 2 30 10 0 45; poly 0 0 10 0 0 10;", rotation=1)
+    assert rois == {'rect0': Rect(0, 10, 2, 5, 1),
+                    'pixel1': Pixel(3, 4),
+                    'arc2': Arc(1, 2, 30, 10, 0, 45),
+                    'poly3': Polygon(((0, 0), (10, 0), (0, 10)))}
+    assert parse_rois("") == {}
+
+    with pytest.raises(ValueError):
+        parse_rois("circle 1 2 3")
+    with pytest.raises(ValueError):
+        parse_rois("rect 1 2")
+    with pytest.raises(ValueError):
+        parse_rois("poly 0 0 1 1")
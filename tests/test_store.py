@@ -2,8 +2,9 @@ import pytest
 import zmq
 import numpy as np
 
-from ami.data import MsgTypes, Datagram, CollectorMessage, Deserializer
-from ami.comm import Store, ResultStore
+from ami.data import MsgTypes, Datagram, CollectorMessage, Serializer, Deserializer, Heartbeat, Stages
+from ami.comm import Store, ResultStore, ViewCache, ViewOptions, HeartbeatTracer, EventTimes, Backpressure, \
+    view_topic
 
 
 @pytest.fixture(scope='function')
@@ -186,6 +187,28 @@ def test_store_put(obj, expected, store):
         assert 'test' not in store.types
 
 
+@pytest.mark.parametrize('store', [None], indirect=True)
+def test_store_put_repeated(store, caplog):
+    # values of the same kind reuse the cached type of the entry
+    for value in (np.zeros(5), np.ones(5), np.float64(2.5), 3.5, np.zeros((2, 2)), "cat"):
+        store.put('test', value)
+        assert store.get('test') is value
+        assert store.types['test'] == Store.get_type(value)
+    # float64 and float have the same type so only the array and str changes warn
+    assert len([r for r in caplog.records if 'differs' in r.getMessage()]) == 3
+
+    store.clear()
+    store.put('test', 5)
+    assert store.types['test'] is int
+
+    # the dimensions of array subclasses are part of their type as well
+    caplog.clear()
+    for value in (np.ma.zeros(5), np.ma.zeros((2, 2))):
+        store.put('masked', value)
+        assert store.types['masked'] == (np.ma.MaskedArray, value.ndim)
+    assert len([r for r in caplog.records if 'differs' in r.getMessage()]) == 1
+
+
 @pytest.mark.parametrize('obj, expected, store',
                          [
                             ({}, {}, None),
@@ -274,6 +297,52 @@ def test_store_collect(obj, expected, store):
     collector.close()
 
 
+def test_store_backpressure(ipc_dir):
+    addr = "ipc://%s/backpressure" % ipc_dir
+    store = ResultStore(addr, hwm=1, backpressure={None: Backpressure.Drop, 'coalesced': Backpressure.Coalesce})
+    try:
+        assert store.policy('dropped') == Backpressure.Drop
+        assert store.policy('coalesced') == Backpressure.Coalesce
+        assert ResultStore(addr, store.ctx).policy('dropped') == Backpressure.Block
+
+        for name in ('dropped', 'coalesced'):
+            store.configure(name, 0)
+            store.update(name, {'count': 1})
+
+        # nothing is receiving, so fill up the queue to the collector
+        with pytest.raises(zmq.Again):
+            for i in range(1000):
+                store.collector.send(b'', zmq.NOBLOCK)
+
+        # neither contribution is sent, but the coalesced one is kept for the next heartbeat
+        assert store.collect(0, 0) == 0
+        assert store.coalesced == {'coalesced'}
+        store.clear()
+        assert not store.stores['dropped']
+        assert store.stores['coalesced'].get('count') == 1
+        assert store.shed_counts() == {'dropped': 1, 'coalesced': 1}
+        assert store.shed_counts() == {}
+
+        # once the collector catches up the contribution is sent
+        collector = store.ctx.socket(zmq.PULL)
+        collector.bind(addr)
+        collector.recv()
+        while collector.poll(100):
+            collector.recv()
+        store.remove('dropped')
+        store.collect(0, 1)
+        assert not store.coalesced
+        msg = collector.recv_serialized(Deserializer())
+        assert (msg.name, msg.heartbeat, msg.payload) == ('coalesced', 1, {'count': 1})
+        # along with the heartbeat it was kept from, which the collector builds without it
+        assert msg.shed == [(0, 0)]
+        assert not store.unsent
+        assert store.shed_counts() == {}
+    finally:
+        # anything left in the queue to the collector is dropped
+        store.ctx.destroy(linger=0)
+
+
 @pytest.mark.parametrize('obj, expected, store',
                          [
                             ({}, False, True),
@@ -328,3 +397,151 @@ def test_store_addremove(obj, expected, store):
     # check that the remove worked
     assert name not in store
     assert not store
+
+
+def test_view_cache_lru():
+    cache = ViewCache(maxsize=10)
+
+    # check that lookups of missing entries are misses
+    assert cache.get('graph', 'a') is None
+    assert cache.misses == 1
+
+    # add entries until the cache is full
+    assert cache.put('graph', 'a', ['a'], 4) == 0
+    assert cache.put('graph', 'b', ['b'], 4) == 0
+    assert cache.size == 8
+    # touch 'a' so that 'b' is the least recently used entry
+    assert cache.get('graph', 'a') == ['a']
+    assert cache.hits == 1
+
+    # exceed the cap and check that 'b' was evicted
+    assert cache.put('graph', 'c', ['c'], 4) == 1
+    assert ('graph', 'b') not in cache
+    assert ('graph', 'a') in cache
+    assert ('graph', 'c') in cache
+    assert cache.size == 8
+    assert cache.evictions == 1
+
+    # check that frames larger than the cap are not cached
+    assert cache.put('graph', 'd', ['d'], 11) == 0
+    assert ('graph', 'd') not in cache
+    assert cache.size == 8
+    assert cache.hit_rate == 0.5
+
+
+def test_view_cache_invalidate():
+    serializer = Serializer()
+    cache = ViewCache(maxsize=1 << 20)
+
+    for graph in ['graph1', 'graph2']:
+        for name in ['cspad', 'delta_t']:
+            frames = serializer(np.ones((10, 10)))
+            cache.put(graph, name, frames, serializer.sizeof(frames))
+    assert len(cache) == 4
+
+    # invalidate a single entry
+    cache.invalidate('graph1', ['cspad', 'missing'])
+    assert ('graph1', 'cspad') not in cache
+    assert ('graph1', 'delta_t') in cache
+    assert len(cache) == 3
+
+    # invalidate a whole graph
+    cache.invalidate('graph2')
+    assert ('graph2', 'cspad') not in cache
+    assert ('graph2', 'delta_t') not in cache
+    assert len(cache) == 1
+
+    cache.clear()
+    assert not len(cache)
+    assert cache.size == 0
+
+
+def test_view_options():
+    options = ViewOptions.parse("shape=2x3,rate=5")
+    assert options == ViewOptions(shape=(2, 3), rate=5.0)
+    assert options.interval == 0.2
+    assert ViewOptions.parse(str(options)) == options
+    assert ViewOptions.parse("") is None
+    with pytest.raises(ValueError):
+        ViewOptions.parse("bins=2")
+
+    assert view_topic('graph', 'cspad') == "view:graph:cspad"
+    assert view_topic('graph', 'cspad', options) == "view:graph:cspad|shape=2x3,rate=5"
+
+    # arrays that fit and non-arrays are not binned
+    data = np.arange(6).reshape(2, 3)
+    assert options.factors(data) is None
+    assert options.downsample(data) is data
+    assert options.downsample(1.0) == 1.0
+
+    # bins that go past the edge are averaged over the pixels they contain
+    data = np.arange(35, dtype=np.int16).reshape(5, 7)
+    assert options.factors(data) == (3, 3)
+    expected = np.array([[data[:3, :3].mean(), data[:3, 3:6].mean(), data[:3, 6:].mean()],
+                         [data[3:, :3].mean(), data[3:, 3:6].mean(), data[3:, 6:].mean()]])
+    binned = options.downsample(data)
+    assert binned.dtype == np.float32
+    assert np.allclose(binned, expected)
+
+
+def test_view_cache_options():
+    cache = ViewCache(maxsize=1 << 20)
+    options = ViewOptions(shape=(2, 2))
+
+    cache.put('graph', 'cspad', ['full'], 4)
+    cache.put('graph', 'cspad', ['binned'], 1, options)
+    assert cache.get('graph', 'cspad') == ['full']
+    assert cache.get('graph', 'cspad', options) == ['binned']
+    assert cache.get('graph', 'cspad', ViewOptions(rate=1)) is None
+
+    # invalidating an entry drops its reduced views
+    cache.invalidate('graph', ['cspad'])
+    assert not len(cache)
+    assert cache.size == 0
+
+
+def test_heartbeat_tracer():
+    tracer = HeartbeatTracer(depth=2)
+
+    # contributions from two workers merge into the slowest path
+    trace = Stages.merge({Stages.Source: 1.0, Stages.Worker: 2.0}, {Stages.Source: 0.5, Stages.Worker: 3.0})
+    assert trace == {Stages.Source: 0.5, Stages.Worker: 3.0}
+
+    latencies = tracer.add('graph', Heartbeat(1, 0.0), {Stages.Source: 0.0, Stages.Worker: 1.0, Stages.Manager: 3.0})
+    assert latencies == {Stages.Worker: 1.0, Stages.Manager: 2.0, 'total': 3.0}
+    tracer.add('graph', Heartbeat(2, 0.0), {Stages.Source: 0.0, Stages.Manager: 5.0})
+    tracer.add('graph', Heartbeat(3, 0.0), {Stages.Source: 0.0, Stages.Manager: 1.0})
+    tracer.add('other', Heartbeat(1, 0.0), {Stages.Source: 0.0, Stages.Manager: 1.0})
+
+    # only the slowest heartbeats are kept
+    assert [record['heartbeat'] for record in tracer.slowest('graph')] == [2, 1]
+    assert [record['heartbeat'] for record in tracer.slowest('graph', 1)] == [2]
+
+    tracer.clear('graph')
+    assert not tracer.slowest('graph')
+    assert len(tracer.slowest('other')) == 1
+
+
+def test_event_times():
+    times = EventTimes()
+    assert times.summary()['count'] == 0
+    assert EventTimes.rate(times.summary()) == 0.0
+    assert EventTimes.quantile(times.summary(), 0.5) is None
+
+    # 90 events of 2 ms and 10 of 50 ms, back to back
+    start = 100.0
+    for elapsed in [0.002]*90 + [0.05]*10:
+        times.add(start, start + elapsed)
+        start += elapsed
+
+    summary = times.summary()
+    assert summary['count'] == 100
+    assert sum(summary['counts']) == 100
+    assert len(summary['counts']) == len(EventTimes.Edges) + 1
+    assert summary['first'] == 100.0 and summary['last'] == pytest.approx(100.68)
+    assert summary['total'] == pytest.approx(0.68)
+    assert summary['max'] == pytest.approx(0.05)
+    assert EventTimes.rate(summary) == pytest.approx(100/0.68)
+    # the quantiles are the upper edges of the bins they fall in
+    assert 0.002 <= EventTimes.quantile(summary, 0.5) < 0.004
+    assert 0.05 <= EventTimes.quantile(summary, 0.99) < 0.1
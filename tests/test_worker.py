@@ -0,0 +1,227 @@
+import time
+import zmq
+import dill
+import pytest
+import threading
+from ami.data import MsgTypes, Message, Heartbeat, Source, Deserializer
+from ami.worker import Prefetcher, Worker
+
+
+class FakeSource:
+
+    def __init__(self, nevents, fail=False):
+        self.nevents = nevents
+        self.fail = fail
+        self.heartbeat = None
+        self.produced = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def events(self):
+        try:
+            for i in range(self.nevents):
+                self.heartbeat = i // 3
+                with self.cond:
+                    self.produced += 1
+                    self.cond.notify_all()
+                yield i
+            if self.fail:
+                raise RuntimeError("source failure")
+        finally:
+            self.closed = True
+
+    def wait_produced(self, count, timeout=5.0):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.produced >= count, timeout)
+
+
+def test_prefetch_order():
+    src = FakeSource(20)
+    prefetcher = Prefetcher(src, 4)
+    # the heartbeat of each message is the one of the source when it was produced
+    assert list(prefetcher) == [(i, i // 3) for i in range(20)]
+    prefetcher.close()
+
+
+def test_prefetch_bounded():
+    src = FakeSource(100)
+    prefetcher = Prefetcher(src, 4)
+    # each message is queued before the next one is read, so the fifth waits for room
+    assert src.wait_produced(5)
+    assert prefetcher.depth() == 4
+    assert src.produced == 5
+    # the source is closed by the thread, without reading any further
+    prefetcher.close()
+    assert not prefetcher.thread.is_alive()
+    assert src.closed
+    assert src.produced == 5
+
+
+def test_prefetch_error():
+    prefetcher = Prefetcher(FakeSource(3, fail=True), 2)
+    items = []
+    with pytest.raises(RuntimeError):
+        for item in prefetcher:
+            items.append(item)
+    assert items == [(0, 0), (1, 0), (2, 0)]
+    prefetcher.close()
+
+
+@pytest.fixture(scope='function')
+def src_cfg():
+    return {'type': 'static', 'hb_period': 3, 'interval': 0.01, 'init_time': 0, 'bound': 10,
+            'config': {'cspad': {'dtype': 'Image', 'pedestal': 5, 'width': 1, 'shape': [2, 2]}}}
+
+
+@pytest.fixture(scope='function')
+def worker(request, tmp_path, src_cfg):
+    graph_threads = getattr(request, 'param', 0)
+    src = Source.find_source('static')(0, 1, 3, dict(src_cfg))
+    addrs = ['ipc://%s' % (tmp_path / name) for name in ('collector', 'graph', 'msg', 'export')]
+    worker = Worker(0, src, *addrs, None, None, 'tst', None, graph_threads=graph_threads)
+    yield worker
+
+    for runner in worker.runners.values():
+        runner.close()
+    # nothing is connected to the sockets of the worker
+    for ctx in (worker.ctx, worker.graph_comm.ctx, worker.export_comm.ctx):
+        ctx.destroy(linger=0)
+
+
+def test_update_sources(worker, src_cfg):
+    src = worker.src
+
+    # a new interval is applied to the running source
+    worker.update_sources('graph', 1, {'num_workers': 1}, dict(src_cfg, interval=0.5))
+    assert worker.src is src
+    assert not worker.pending_src
+    assert src.interval == 0.5
+
+    # a new bound needs the source to be recreated once the worker stops reading it
+    worker.update_sources('graph', 2, {'num_workers': 1}, dict(src_cfg, bound=20))
+    assert worker.src is src
+    assert worker.pending_src
+
+    # a later change is not applied to the running source, but replaces the pending configuration
+    worker.update_sources('graph', 3, {'num_workers': 1}, dict(src_cfg, bound=20, interval=0.2))
+    assert worker.pending_src
+    assert src.interval == 0.5
+    assert worker.source_args['src_cfg']['interval'] == 0.2
+
+
+class FakeGraph:
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.count = 0
+
+    def __call__(self, payload, color=None):
+        if self.gate is not None:
+            self.gate.wait()
+        self.count += 1
+        return {'count': self.count}
+
+    def heartbeat_finished(self):
+        self.count = 0
+
+    def warnings(self):
+        return {}
+
+    def filter_counts(self):
+        return {}
+
+
+class FakeMetrics:
+
+    def __init__(self):
+        self.counts = {}
+
+    def shed(self, store):
+        pass
+
+    def filtered(self, graph, counts):
+        pass
+
+    def runner(self, runner):
+        self.counts[runner.name] = runner.counts()
+
+
+@pytest.mark.parametrize('worker', [2], indirect=True)
+def test_graph_threads(worker, tmp_path):
+    collector = worker.ctx.socket(zmq.PULL)
+    collector.bind('ipc://%s' % (tmp_path / 'collector'))
+    gate = threading.Event()
+    try:
+        metrics = FakeMetrics()
+        worker.num_events = 0
+        worker.graphs = {'fast': FakeGraph(), 'slow': FakeGraph(gate)}
+        for name in worker.graphs:
+            worker.store.configure(name, 0)
+        worker.update_runners()
+        fast, slow = worker.runners['fast'], worker.runners['slow']
+
+        for i in range(6):
+            for runner in (fast, slow):
+                runner.put(Message(MsgTypes.Datagram, 0, {'cspad': i}))
+            while fast.busy() or (i == 0 and slow.depth()):
+                time.sleep(0.01)
+        for runner in (fast, slow):
+            runner.heartbeat(Heartbeat(1))
+
+        # the fast graph sends its results while the slow one is still on its first event
+        worker.handle_graph_results(metrics, timeout=1.0)
+        msg = collector.recv_serialized(Deserializer())
+        assert (msg.name, msg.heartbeat, msg.payload) == ('fast', 1, {'count': 6})
+        assert metrics.counts == {'fast': (6, 0)}
+        assert slow.depth() == 3
+
+        # the slow graph skipped the events which did not fit behind it
+        gate.set()
+        worker.drain_graphs(metrics)
+        msg = collector.recv_serialized(Deserializer())
+        assert (msg.name, msg.heartbeat, msg.payload) == ('slow', 1, {'count': 3})
+        assert metrics.counts['slow'] == (3, 3)
+
+        # the runner of a purged graph is stopped
+        del worker.graphs['slow']
+        worker.update_runners()
+        assert list(worker.runners) == ['fast']
+        slow.thread.join(1.0)
+        assert not slow.thread.is_alive()
+    finally:
+        gate.set()
+
+
+@pytest.mark.parametrize('worker', [2], indirect=True)
+def test_graph_threads_update(worker, tmp_path):
+    manager = worker.ctx.socket(zmq.XPUB)
+    manager.bind('ipc://%s' % (tmp_path / 'graph'))
+    # wait for the worker to subscribe to the graph updates
+    manager.recv()
+    gate = threading.Event()
+    try:
+        metrics = FakeMetrics()
+        worker.graphs = {'slow': FakeGraph(gate)}
+        worker.store.configure('slow', 0)
+        worker.update_runners()
+        slow = worker.runners['slow']
+        slow.put(Message(MsgTypes.Datagram, 0, {'cspad': 0}))
+        while slow.depth():
+            time.sleep(0.01)
+
+        # the graph is purged while the runner is still on its event
+        manager.send_string('purge', zmq.SNDMORE)
+        manager.send_pyobj(('slow', 1, {}), zmq.SNDMORE)
+        manager.send(dill.dumps(None))
+        assert worker.graph_comm.sock.poll(5000)
+        threading.Timer(0.1, gate.set).start()
+        worker.recv_graph_updates(metrics)
+
+        # the update waited for the event, whose results went to the store of the graph before it was removed
+        assert slow.counts() == (1, 0)
+        assert worker.graph_results.empty()
+        assert 'slow' not in worker.graphs
+        assert 'slow' not in worker.store
+        assert not worker.runners
+    finally:
+        gate.set()